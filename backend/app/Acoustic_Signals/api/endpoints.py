@@ -1,14 +1,21 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from app.Acoustic_Signals.schemas.schema import GenerationInput, GeneratedSignal
-from app.Acoustic_Signals.services.generate_signal import generate_signal
-from app.Acoustic_Signals.services.extract_coef import extract_coef
+from typing import List, Literal
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from app.core import executor
+from app.core.encoding import encode_response
+from app.Acoustic_Signals.schemas.schema import AiPrediction, GenerationInput, GeneratedSignal, DetectionTimeline, DopplerEvents, SweepInput, SweepOutput
+from app.Acoustic_Signals.services.generate_signal import generate_signal, stream_signal, sweep_signals
+from app.Acoustic_Signals.services.extract_coef import extract_coef, extract_events
+from app.Acoustic_Signals.services.doppler_stream import PassByDetector, PCMDecoder
 from app.Acoustic_Signals.services.get_prediction import get_prediction
+from app.Acoustic_Signals.services.batch_prediction import stream_batch_predictions, validate_uploads
+from app.Acoustic_Signals.services.timeline import get_timeline
 
 acoustic_router = APIRouter()
 
 # 1 - Endpoint for generating doppler (Unchanged)
 @acoustic_router.post("/doppler_generation")
-def GenerateDoppler(Input: GenerationInput):
+def GenerateDoppler(Input: GenerationInput, request: Request):
     # 1. We removed 'async' because math calculations block the server.
     #    Using plain 'def' runs it in a separate thread.
     result = generate_signal(
@@ -18,7 +25,42 @@ def GenerateDoppler(Input: GenerationInput):
         Input.num_points_per_second
     )
     # 2. Return a dictionary {"signal": ...} so React can find it easily
-    return {"signal": result}
+    #    (or its binary form when the Accept header asks for one)
+    return encode_response(request, {"signal": result})
+
+
+# 1a - Every (velocity, frequency) pair of a grid in one broadcasted computation
+@acoustic_router.post("/doppler_generation/sweep", response_model=SweepOutput)
+def SweepDoppler(Input: SweepInput):
+    # Pairs already generated (by this endpoint or /doppler_generation) come from the LRU cache
+    return sweep_signals(
+        Input.velocities,
+        Input.frequencies,
+        Input.duration,
+        Input.num_points_per_second
+    )
+
+
+# 1b - Same signal streamed as audio, synthesized chunk by chunk
+@acoustic_router.get("/doppler_generation/stream")
+def StreamDoppler(
+    Input: GenerationInput = Depends(),
+    format: Literal["wav", "raw"] = Query("wav", description="'wav' (16-bit mono PCM) or 'raw' little-endian int16"),
+):
+    """
+    GET so an <audio> element can point straight at it and start playing while
+    the rest is still being generated. Memory use does not depend on duration.
+    """
+    body = stream_signal(
+        Input.velocity,
+        Input.frequency,
+        Input.duration,
+        Input.num_points_per_second,
+        fmt=format,
+    )
+    media_type = "audio/wav" if format == "wav" else "application/octet-stream"
+    headers = {"X-Sample-Rate": str(Input.num_points_per_second)}
+    return StreamingResponse(body, media_type=media_type, headers=headers)
 
 
 # 2 - Endpoint for extracting velocity and frequency (Corrected)
@@ -31,11 +73,95 @@ def ExtractCoef(file: UploadFile = File(...)):
     return extract_coef(file)
 
 
+# 2b - Every pass-by in a long recording, decoded and analysed block by block
+@acoustic_router.post("/extract_coef/events", response_model=DopplerEvents)
+def ExtractCoefEvents(
+    file: UploadFile = File(...),
+    block_seconds: float = Query(10.0, gt=0, description="Audio decoded per block; bounds memory use"),
+    min_separation: float = Query(1.0, gt=0, description="Minimum seconds between two pass-by peaks"),
+    prominence: float = Query(1.5, gt=1, description="Peak energy relative to the median background energy"),
+):
+    return extract_events(file, block_seconds=block_seconds, min_separation=min_separation, prominence=prominence)
+
+
+# 2c - Live velocity estimation from microphone PCM frames
+@acoustic_router.websocket("/ws/doppler")
+async def LiveDoppler(
+    websocket: WebSocket,
+    sample_rate: int = Query(44100, gt=0),
+    encoding: Literal["int16", "float32"] = Query("int16"),
+    min_separation: float = Query(0.5, gt=0),
+    prominence: float = Query(1.5, gt=1),
+):
+    """
+    Client sends binary PCM frames (mono, `encoding`, `sample_rate`) and the
+    text message "end" when done. The server replies with one JSON message per
+    pass-by as soon as it is confirmed, i.e. `min_separation` seconds after the
+    energy peak, then {"type": "done"} after "end".
+
+    Each frame only advances an incremental STFT and a fixed-size history, so
+    the cost per message does not grow with how long the session has run.
+    """
+    await websocket.accept()
+    detector = PassByDetector(sample_rate, min_separation=min_separation, prominence=prominence)
+    decoder = PCMDecoder(encoding)
+
+    async def send(events):
+        for event in events:
+            await websocket.send_json({"type": "pass_by", **event})
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes"):
+                await send(detector.push(decoder.decode(message["bytes"])))
+            elif message.get("text") == "end":
+                await send(detector.flush())
+                await websocket.send_json({"type": "done"})
+                await websocket.close()
+                return
+    except WebSocketDisconnect:
+        return
+
+
 # 3 - Endpoint for the AI models (Unchanged structure)
 @acoustic_router.post("/submarine_detection")
-async def GetPrediction(file: UploadFile = File(...)):
+async def GetPrediction(request: Request, file: UploadFile = File(...)):
+    """
+    Kept as async def per instructions; decoding and both models run in an
+    acoustic worker process, so the event loop only awaits the result.
+    """
+    return encode_response(request, await executor.run("acoustic", get_prediction, file), AiPrediction)
+
+
+# 4 - Batch detection over many clips (multi-file upload or a .zip/.tar archive)
+@acoustic_router.post("/submarine_detection/batch")
+def GetBatchPrediction(
+    files: List[UploadFile] = File(..., description="wav/mp3 clips, or .zip/.tar archives of them"),
+    batch_size: int = Query(32, ge=1, le=256, description="Clips per ONNX/RF inference batch"),
+):
+    """
+    Streams one JSON line per clip (application/x-ndjson) as each inference
+    batch finishes, so large survey archives do not wait for the whole upload
+    to be scored.
+    """
+    validate_uploads(files)
+    return StreamingResponse(stream_batch_predictions(files, batch_size), media_type="application/x-ndjson")
+
+
+# 5 - Sliding-window detection over a long recording
+@acoustic_router.post("/submarine_detection/timeline", response_model=DetectionTimeline)
+def GetDetectionTimeline(
+    file: UploadFile = File(...),
+    hop_seconds: float = Query(2.0, gt=0, description="Step between consecutive 4 s windows"),
+    block_seconds: float = Query(30.0, gt=0, description="Audio decoded per block; bounds memory use"),
+    batch_size: int = Query(32, ge=1, le=256, description="Windows per ONNX/RF inference batch"),
+    threshold: float = Query(0.5, gt=0, lt=1, description="Mixed probability above which a window counts as a detection"),
+):
     """
-    Kept as async def per instructions. 
-    Removed 'await' if get_prediction returns a non-awaitable object.
+    Scores every 4 s window of the recording instead of only the first one,
+    and merges consecutive detections into event intervals (seconds).
     """
-    return get_prediction(file)
\ No newline at end of file
+    return get_timeline(file, hop_seconds=hop_seconds, block_seconds=block_seconds, batch_size=batch_size, threshold=threshold)
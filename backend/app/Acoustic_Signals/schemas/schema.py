@@ -1,4 +1,5 @@
 from pydantic import BaseModel, Field
+from typing import List, Optional
 
 class GenerationInput(BaseModel):
     velocity: float = Field(..., description="Velocity of the source (m/s)")
@@ -11,11 +12,39 @@ class GeneratedSignal(BaseModel):
     Signal : list
     Time : list
 
+class SweepInput(BaseModel):
+    velocities: List[float] = Field(..., description="Source velocities to simulate (m/s)")
+    frequencies: List[float] = Field(..., description="Source frequencies to simulate (Hz)")
+    duration: float = Field(..., gt=0, description="Signal duration (seconds)")
+    num_points_per_second: int = Field(default=4000, gt=0)
+
+class SweepSignal(BaseModel):
+    velocity : float
+    frequency : float
+    Signal : list
+
+class SweepOutput(BaseModel):
+    # Time is shared by every signal of the sweep
+    Time : list
+    signals : List[SweepSignal]
+
 class Coef(BaseModel):
     velocity : float
     frequency : float 
     signal : list
 
+class DopplerEvent(BaseModel):
+    time : float  # seconds from the start of the recording
+    velocity : float  # km/h, same unit as Coef.velocity
+    frequency : float
+    f_approach : float
+    f_recede : float
+
+class DopplerEvents(BaseModel):
+    duration : float
+    sample_rate : int
+    events : List[DopplerEvent]
+
 class AiPrediction(BaseModel):
     signal : list 
     ml_prediction : float
@@ -23,3 +52,34 @@ class AiPrediction(BaseModel):
     mixed_approach : float
     label : str
 
+class ClipPrediction(BaseModel):
+    # One NDJSON line of /submarine_detection/batch; `error` is set instead of the scores when a clip fails
+    index : int
+    filename : str
+    ml_prediction : Optional[float] = None
+    dl_prediction : Optional[float] = None
+    mixed_approach : Optional[float] = None
+    label : Optional[str] = None
+    error : Optional[str] = None
+
+class WindowScore(BaseModel):
+    start : float
+    end : float
+    ml_prediction : float
+    dl_prediction : float
+    mixed_approach : float
+    label : str
+
+class DetectionEvent(BaseModel):
+    start : float
+    end : float
+    peak_confidence : float
+    mean_confidence : float
+    num_windows : int
+
+class DetectionTimeline(BaseModel):
+    duration : float
+    window_seconds : float
+    hop_seconds : float
+    windows : List[WindowScore]
+    events : List[DetectionEvent]
@@ -0,0 +1,127 @@
+from functools import lru_cache
+
+import librosa
+import numpy as np
+import soundfile as sf
+import soxr
+
+from app.core.metrics import timed
+
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+N_MFCC = 13
+AMIN = 1e-10
+TOP_DB = 80.0
+
+
+def resample(y, orig_sr, target_sr):
+    # soxr's multi-stage polyphase filter; the same engine librosa.load(sr=...) uses by default
+    if orig_sr == target_sr:
+        return y
+    return soxr.resample(y, orig_sr, target_sr, quality="HQ")
+
+
+@timed("acoustic", "decode")
+def decode_audio(source, target_sr=None):
+    """Decodes any wav/mp3 source to mono float32, resampled to target_sr when given."""
+    y, sr = librosa.load(source, sr=None, mono=True)
+    if target_sr is not None and sr != target_sr:
+        y = resample(y, sr, target_sr)
+        sr = target_sr
+    return y, sr
+
+
+def _iter_blocks(audio, block_seconds, target_sr):
+    sr = audio.samplerate
+    resampler = soxr.ResampleStream(sr, target_sr, 1, dtype="float32", quality="HQ") if sr != target_sr else None
+    block_frames = max(1, int(block_seconds * sr))
+    try:
+        while True:
+            block = audio.read(block_frames, dtype="float32", always_2d=True)
+            last = len(block) < block_frames
+            mono = block.mean(axis=1)
+            if resampler is not None:
+                mono = resampler.resample_chunk(mono, last=last)
+            if len(mono):
+                yield mono
+            if last:
+                break
+    finally:
+        audio.close()
+
+
+def stream_audio(fileobj, block_seconds, target_sr=None):
+    """
+    Opens a file for block-wise decoding and returns (sr, blocks). Blocks are
+    mono float32 and only one is held in memory at a time. With target_sr they
+    go through a stateful soxr stream: no artifacts at block edges, identical
+    to resampling the whole file.
+    """
+    audio = sf.SoundFile(fileobj)
+    sr = target_sr or audio.samplerate
+    return sr, _iter_blocks(audio, block_seconds, sr)
+
+
+@lru_cache(maxsize=8)
+def mel_filterbank(sr, n_fft=N_FFT, n_mels=N_MELS):
+    return librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels)
+
+
+@lru_cache(maxsize=8)
+def dct_matrix(n_mfcc=N_MFCC, n_mels=N_MELS):
+    import scipy.fft
+
+    # Rows of the orthonormal DCT-II, so mfcc = dct_matrix @ log_mel (same as librosa.feature.mfcc)
+    return scipy.fft.dct(np.eye(n_mels, dtype=np.float32), type=2, norm="ortho", axis=0)[:n_mfcc]
+
+
+@lru_cache(maxsize=8)
+def fft_frequencies(sr, n_fft=N_FFT):
+    return librosa.fft_frequencies(sr=sr, n_fft=n_fft)
+
+
+class ClipSpectrum:
+    """
+    A single STFT of one clip. The ML features (MFCC, centroid, rolloff) and the
+    DL mel input are all derived from it instead of each running their own STFT.
+    Outputs match the per-feature librosa calls to float32 rounding.
+    """
+
+    def __init__(self, y, sr):
+        self.y = y
+        self.sr = sr
+        self.magnitude = np.abs(librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH))
+        self._log_mel = None
+
+    @property
+    def log_mel(self):
+        # power_to_db(melspectrogram(y), ref=1.0, top_db=80), computed once and shared
+        if self._log_mel is None:
+            mel = mel_filterbank(self.sr) @ (self.magnitude ** 2)
+            log_mel = 10.0 * np.log10(np.maximum(AMIN, mel))
+            self._log_mel = np.maximum(log_mel, log_mel.max() - TOP_DB)
+        return self._log_mel
+
+    def mfcc(self):
+        return dct_matrix() @ self.log_mel
+
+    def spectral_centroid(self):
+        total = self.magnitude.sum(axis=0)
+        weighted = fft_frequencies(self.sr) @ self.magnitude
+        return np.divide(weighted, total, out=np.zeros_like(weighted), where=total > 0)
+
+    def spectral_rolloff(self, roll_percent=0.85):
+        cumulative = np.cumsum(self.magnitude, axis=0)
+        threshold = roll_percent * cumulative[-1]
+        # First bin whose cumulative energy reaches the threshold
+        index = np.sum(cumulative < threshold, axis=0)
+        return fft_frequencies(self.sr)[index]
+
+    def zero_crossing_rate(self):
+        return librosa.feature.zero_crossing_rate(self.y, frame_length=N_FFT, hop_length=HOP_LENGTH)[0]
+
+    def normalized_mel_db(self):
+        # power_to_db(ref=np.max) only shifts log_mel by a constant, which min-max scaling removes
+        log_mel = self.log_mel
+        return (log_mel - log_mel.min()) / (log_mel.max() - log_mel.min() + 1e-6)
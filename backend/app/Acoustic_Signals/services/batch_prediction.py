@@ -0,0 +1,133 @@
+import io
+import json
+import os
+import tarfile
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+from fastapi import HTTPException, UploadFile, status
+from fastapi.encoders import jsonable_encoder
+
+from app.Acoustic_Signals.schemas.schema import ClipPrediction
+from app.Acoustic_Signals.services.audio_features import decode_audio
+from app.Acoustic_Signals.services.get_prediction import SAMPLE_RATE, require_detector
+
+AUDIO_EXTENSIONS = (".wav", ".mp3")
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz")
+DECODE_WORKERS = min(8, os.cpu_count() or 1)
+
+
+def _iter_archive(upload: UploadFile):
+    """Yields (name, bytes) for every audio member, reading one member at a time."""
+    upload.file.seek(0)
+    if upload.filename.lower().endswith(".zip"):
+        with zipfile.ZipFile(upload.file) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(AUDIO_EXTENSIONS):
+                    yield info.filename, archive.read(info)
+    else:
+        with tarfile.open(fileobj=upload.file, mode="r:*") as archive:
+            for member in archive:
+                if member.isfile() and member.name.lower().endswith(AUDIO_EXTENSIONS):
+                    yield member.name, archive.extractfile(member).read()
+
+
+def iter_clips(files: list[UploadFile]):
+    for upload in files:
+        name = upload.filename or ""
+        if name.lower().endswith(ARCHIVE_EXTENSIONS):
+            yield from _iter_archive(upload)
+        elif name.lower().endswith(AUDIO_EXTENSIONS):
+            upload.file.seek(0)
+            yield name, upload.file.read()
+
+
+def _is_tarfile(fileobj):
+    try:
+        with tarfile.open(fileobj=fileobj, mode="r:*"):
+            return True
+    except tarfile.TarError:
+        return False
+
+
+def validate_uploads(files: list[UploadFile]):
+    # Reject bad input before the streaming response starts, while we can still send a 4xx/503
+    require_detector()
+    for upload in files:
+        name = (upload.filename or "").lower()
+        if not name.endswith(AUDIO_EXTENSIONS + ARCHIVE_EXTENSIONS):
+            raise HTTPException(
+                status_code=status.HTTP_406_NOT_ACCEPTABLE,
+                detail=f"Unsupported file '{upload.filename}': expected .wav/.mp3 or a .zip/.tar archive of them",
+            )
+        if name.endswith(ARCHIVE_EXTENSIONS):
+            upload.file.seek(0)
+            readable = zipfile.is_zipfile(upload.file) if name.endswith(".zip") else _is_tarfile(upload.file)
+            if not readable:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Could not open archive '{upload.filename}'")
+
+
+def _featurize_clip(detector, data):
+    signal, sr = decode_audio(io.BytesIO(data), target_sr=SAMPLE_RATE)
+    return detector.featurize(detector.fit_clip(signal), sr)
+
+
+def _line(payload: ClipPrediction):
+    return json.dumps(jsonable_encoder(payload), ensure_ascii=False) + "\n"
+
+
+def stream_batch_predictions(files: list[UploadFile], batch_size: int = 32):
+    """
+    Decodes and featurizes clips on a thread pool, then scores whatever has
+    finished in batches of up to `batch_size` (one ONNX run + one RF call per
+    batch). Yields one NDJSON line per clip as soon as its batch is scored.
+    """
+    detector = require_detector()
+    clips = enumerate(iter_clips(files))
+    pending = {}
+    ready = []
+
+    def flush():
+        ml_p, dl_p, avg_p, labels = detector.score_features(
+            np.vstack([features[0] for _, _, features in ready]),
+            np.concatenate([features[1] for _, _, features in ready]),
+        )
+        for (index, name, _), ml, dl, avg, label in zip(ready, ml_p, dl_p, avg_p, labels):
+            yield _line(ClipPrediction(
+                index=index,
+                filename=name,
+                ml_prediction=round(float(ml) * 100, 2),
+                dl_prediction=round(float(dl) * 100, 2),
+                mixed_approach=round(float(avg) * 100, 2),
+                label=label,
+            ))
+        ready.clear()
+
+    with ThreadPoolExecutor(max_workers=DECODE_WORKERS) as pool:
+        exhausted = False
+        while pending or not exhausted:
+            # Keep a bounded number of clips in flight so archives never sit fully in memory
+            while not exhausted and len(pending) < 2 * batch_size:
+                try:
+                    index, (name, data) = next(clips)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[pool.submit(_featurize_clip, detector, data)] = (index, name)
+
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, name = pending.pop(future)
+                try:
+                    ready.append((index, name, future.result()))
+                except Exception as error:
+                    yield _line(ClipPrediction(index=index, filename=name, error=f"Could not decode clip: {error}"))
+
+            if len(ready) >= batch_size or (exhausted and not pending and ready):
+                yield from flush()
+
+        if ready:
+            yield from flush()
@@ -0,0 +1,180 @@
+import numpy as np
+
+C = 343  # speed of sound (m/s)
+BAND = (100, 1000)  # car engine frequency band (Hz)
+WINDOW_SIZE = 10  # frames averaged on each side of a peak, as in extract_coef
+
+
+def estimate_from_shift(f_approach, f_recede):
+    """Returns (velocity m/s, source frequency Hz) from the approach/recede frequencies."""
+    if (f_approach + f_recede) == 0:
+        return 0.0, 0.0
+
+    # Absolute value to avoid negative due to direction
+    v = abs(C * (f_approach - f_recede) / (f_approach + f_recede))
+    f_source = f_approach * (C - v) / C
+
+    # Sanity check
+    if v > C:
+        v = 0.0
+    return float(v), float(f_source)
+
+
+class StreamingSTFT:
+    """
+    Incremental STFT giving the same frames as
+    scipy.signal.stft(x, fs=sr, nperseg=nperseg) on the whole signal
+    (hann window, 50% overlap, zero boundary padding, 'spectrum' scaling),
+    while only keeping one frame of samples between calls.
+    """
+
+    def __init__(self, sr, nperseg=2048):
+        self.sr = sr
+        self.nperseg = nperseg
+        self.hop = nperseg // 2
+        from scipy.signal import get_window
+        self.window = get_window("hann", nperseg)
+        self.scale = 1.0 / self.window.sum()
+        self.freqs = np.fft.rfftfreq(nperseg, 1 / sr)
+        self.num_samples = 0
+        # boundary='zeros' pads nperseg // 2 zeros in front of the signal
+        self._buffer = np.zeros(nperseg // 2, dtype=np.float64)
+
+    def push(self, samples):
+        """Returns the magnitude frames (n_frames, n_bins) completed by `samples`."""
+        self.num_samples += len(samples)
+        return self._frames(samples)
+
+    def _frames(self, samples):
+        buffer = np.concatenate([self._buffer, np.asarray(samples, dtype=np.float64)])
+        n_frames = (len(buffer) - self.nperseg) // self.hop + 1 if len(buffer) >= self.nperseg else 0
+        if n_frames <= 0:
+            self._buffer = buffer
+            return np.zeros((0, len(self.freqs)))
+
+        starts = np.arange(n_frames) * self.hop
+        frames = buffer[starts[:, None] + np.arange(self.nperseg)] * self.window
+        self._buffer = buffer[n_frames * self.hop:]
+        return np.abs(np.fft.rfft(frames, axis=1)) * self.scale
+
+    def flush(self):
+        # Trailing boundary zeros plus scipy's padding up to a whole number of frames
+        return self._frames(np.zeros(self.nperseg // 2 + (-self.num_samples) % self.hop))
+
+
+class PassByDetector:
+    """
+    Online pass-by detection. Each STFT frame is reduced to its dominant
+    frequency and RMS energy in BAND; a frame is a pass-by when its energy is
+    the maximum within +/- `min_separation` seconds and at least `prominence`
+    times the median energy of the recent history. Velocity and source
+    frequency then come from the dominant frequency WINDOW_SIZE frames before
+    and after the peak, exactly as extract_coef does for its single peak.
+
+    Only a fixed ring of `history_seconds` of per-frame values is kept, so
+    memory does not grow with the length of the stream. Frames are checked as
+    soon as their look-ahead arrives and the median covers the
+    `history_seconds` ending there, so the events do not depend on how the
+    samples are split between push() calls.
+    """
+
+    def __init__(self, sr, nperseg=2048, min_separation=1.0, prominence=1.5, history_seconds=15.0):
+        self.stft = StreamingSTFT(sr, nperseg)
+        self.band_mask = (self.stft.freqs > BAND[0]) & (self.stft.freqs < BAND[1])
+        self.band_freqs = self.stft.freqs[self.band_mask]
+        self.frame_seconds = self.stft.hop / sr
+        self.separation = max(WINDOW_SIZE, int(round(min_separation / self.frame_seconds)))
+        self.prominence = prominence
+        self.size = max(int(history_seconds / self.frame_seconds), 2 * self.separation + 1)
+        self._freq = np.zeros(self.size)
+        self._energy = np.zeros(self.size)
+        self.num_frames = 0
+        self._next_candidate = 0
+        self._last_event = -self.separation - 1
+
+    def _range(self, start, stop):
+        return np.arange(start, stop) % self.size
+
+    def _add_frames(self, magnitudes):
+        band = magnitudes[:, self.band_mask]
+        events = []
+        for freq, energy in zip(self.band_freqs[np.argmax(band, axis=1)], np.sqrt(np.mean(band ** 2, axis=1))):
+            slot = self.num_frames % self.size
+            self._freq[slot] = freq
+            self._energy[slot] = energy
+            self.num_frames += 1
+            # Check before the ring wraps over the frames the candidate still needs
+            events.extend(self._scan())
+        return events
+
+    def _check(self, k):
+        """Returns an event dict if frame k is a pass-by peak, given the frames seen so far."""
+        right = min(self.num_frames, k + self.separation + 1)
+        if k == 0 or k >= self.num_frames - 1 or k - self._last_event <= self.separation:
+            return None
+
+        left = max(0, k - self.separation)
+        energy = self._energy[k % self.size]
+        before = self._energy[self._range(left, k)]
+        after = self._energy[self._range(k + 1, right)]
+        # Strictly above earlier frames, at least the later ones: plateaus report their first frame
+        if (len(before) and energy <= before.max()) or (len(after) and energy < after.max()):
+            return None
+
+        # History ending with k's look-ahead, whatever has been pushed since
+        history = self._energy[self._range(max(0, right - self.size), right)]
+        if energy < self.prominence * np.median(history):
+            return None
+
+        f_approach = np.mean(self._freq[self._range(max(0, k - WINDOW_SIZE), k)])
+        f_recede = np.mean(self._freq[self._range(k, min(self.num_frames, k + WINDOW_SIZE))])
+        v, f_source = estimate_from_shift(f_approach, f_recede)
+        self._last_event = k
+        return {
+            "time": k * self.frame_seconds,
+            "velocity": v * 3.6,
+            "frequency": f_source,
+            "f_approach": float(f_approach),
+            "f_recede": float(f_recede),
+        }
+
+    def _scan(self, final=False):
+        # A candidate needs `separation` frames of look-ahead unless the stream has ended
+        lookahead = 0 if final else self.separation
+        events = []
+        while self._next_candidate < self.num_frames - lookahead:
+            event = self._check(self._next_candidate)
+            if event is not None:
+                events.append(event)
+            self._next_candidate += 1
+        return events
+
+    def push(self, samples):
+        """Feeds raw samples; returns the pass-by events confirmed so far."""
+        return self._add_frames(self.stft.push(samples))
+
+    def flush(self):
+        return self._add_frames(self.stft.flush()) + self._scan(final=True)
+
+
+class PCMDecoder:
+    """
+    Turns binary messages of little-endian int16 or float32 PCM into float
+    samples. Messages need not align with sample boundaries: a trailing
+    partial sample is kept for the next message.
+    """
+
+    DTYPES = {"int16": np.dtype("<i2"), "float32": np.dtype("<f4")}
+
+    def __init__(self, encoding="int16"):
+        self.dtype = self.DTYPES[encoding]
+        self._pending = b""
+
+    def decode(self, data):
+        data = self._pending + data
+        usable = len(data) - len(data) % self.dtype.itemsize
+        self._pending = data[usable:]
+        samples = np.frombuffer(data[:usable], dtype=self.dtype).astype(np.float32)
+        if self.dtype.kind == "i":
+            samples /= 32768.0
+        return samples
@@ -1,22 +1,24 @@
 import numpy as np
-import librosa as lb
-import scipy.signal as signal
+import soundfile as sf
 from fastapi import UploadFile, File, HTTPException, status
-from app.Acoustic_Signals.schemas.schema import Coef
+from app.Acoustic_Signals.schemas.schema import Coef, DopplerEvent, DopplerEvents
+from app.Acoustic_Signals.services.audio_features import decode_audio, stream_audio
+from app.Acoustic_Signals.services.doppler_stream import PassByDetector, estimate_from_shift
+from app.core.metrics import stage
 
 def extract_coef(file: UploadFile = File(...)):
-    c = 343  # speed of sound (m/s)
-
     file_name = file.filename
     if not (file_name.endswith(".mp3") or file_name.endswith(".wav")):
         raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE)
 
     file.file.seek(0)
-    sig_arr, sr = lb.load(file.file, sr=None, mono=True)
+    sig_arr, sr = decode_audio(file.file)
 
-    # STFT
-    f, t, Zxx = signal.stft(sig_arr, fs=sr, nperseg=2048)
-    magn = np.abs(Zxx)
+    # STFT (scipy.signal is imported on first use: it dominates the app's import time)
+    import scipy.signal as signal
+    with stage("acoustic", "stft"):
+        f, t, Zxx = signal.stft(sig_arr, fs=sr, nperseg=2048)
+        magn = np.abs(Zxx)
 
     # Restrict to car engine frequency band
     band_mask = (f > 100) & (f < 1000)
@@ -38,20 +40,38 @@ def extract_coef(file: UploadFile = File(...)):
     f_approach = np.mean(dominant_freq[max(0, peak_index - window_size):peak_index])
     f_recede = np.mean(dominant_freq[peak_index:min(len(dominant_freq), peak_index + window_size)])
 
-    # Compute velocity (absolute value to avoid negative due to direction)
-    if (f_approach + f_recede) == 0:
-        v = 0.0
-        f_source = 0.0
-    else:
-        v = abs(c * (f_approach - f_recede) / (f_approach + f_recede))
-        f_source = f_approach * (c - v) / c
-
-    # Sanity check
-    if v > c:
-        v = 0.0
+    v, f_source = estimate_from_shift(f_approach, f_recede)
 
     return Coef(
         velocity=float(v)*3.6,
         frequency=float(f_source),
         signal=sig_arr.tolist()[::20]
     )
+
+
+def extract_events(file: UploadFile, block_seconds=10.0, min_separation=1.0, prominence=1.5):
+    """
+    Streaming counterpart of extract_coef for long recordings: decodes block by
+    block and reports every pass-by instead of only the global energy peak.
+    """
+    file_name = file.filename
+    if not (file_name.endswith(".mp3") or file_name.endswith(".wav")):
+        raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE)
+
+    file.file.seek(0)
+    try:
+        sr, blocks = stream_audio(file.file, block_seconds)
+    except sf.LibsndfileError as error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Could not decode audio: {error}")
+
+    detector = PassByDetector(sr, min_separation=min_separation, prominence=prominence)
+    events = []
+    for block in blocks:
+        events.extend(detector.push(block))
+    events.extend(detector.flush())
+
+    return DopplerEvents(
+        duration=detector.stft.num_samples / sr,
+        sample_rate=sr,
+        events=[DopplerEvent(**event) for event in events],
+    )
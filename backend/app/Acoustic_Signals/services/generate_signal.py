@@ -1,30 +1,209 @@
-import numpy as np 
-from app.Acoustic_Signals.schemas.schema import GeneratedSignal
+import struct
+import threading
+from collections import OrderedDict
 
+import numpy as np
+from fastapi import HTTPException, status
+from app.Acoustic_Signals.schemas.schema import GeneratedSignal, SweepSignal, SweepOutput
+from app.core.metrics import timed
+
+C = 343   # sound velocity    m/sec
+X_OFFSET = 2
+MAX_SWEEP_SAMPLES = 10_000_000  # velocities * frequencies * samples per sweep request
+
+
+class SignalCache:
+    """
+    Thread-safe LRU of int16 signals keyed by the GenerationInput parameters
+    (velocity, frequency, duration, num_points_per_second). Bounded by total
+    bytes rather than entry count, since one long simulation can outweigh
+    hundreds of short ones.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(v, fs, duration, num_points_per_second):
+        return float(v), float(fs), float(duration), int(num_points_per_second)
+
+    def get(self, key):
+        with self._lock:
+            signal = self._items.get(key)
+            if signal is not None:
+                self._items.move_to_end(key)
+            return signal
+
+    def put(self, key, signal):
+        if signal.nbytes > self.max_bytes:
+            return
+        signal.flags.writeable = False  # shared between requests
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return
+            self._items[key] = signal
+            self._bytes += signal.nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+
+signal_cache = SignalCache()
 
-def generate_signal(v, fs, duration, num_points_per_second):
-    c = 343   # sound velocity    m/sec
-    x_offset = 2 
-    t_math = np.linspace(- duration / 2 , duration / 2,int( num_points_per_second * duration))
 
+def _synthesize(t_math, v, fs, num_points_per_second, phase_offset=0.0, peak=None):
     x = v * t_math
 
-    r = np.sqrt(x**2 + x_offset**2)
+    r = np.sqrt(x**2 + X_OFFSET**2)
 
     v_radial = v * ( x / r )
 
-    f_instant = fs * (c / (c + v_radial))
+    f_instant = fs * (C / (C + v_radial))
 
 
-    phase = 2 * np.pi * np.cumsum(f_instant) / num_points_per_second
+    phase = 2 * np.pi * np.cumsum(f_instant) / num_points_per_second + phase_offset
     signal = .5 * np.sin(phase)
 
     intensity_relation = 1 / (r**0.3+ 1)
 
-    signal *= (intensity_relation/ np.max(intensity_relation))
-    
-    signal_int = np.int16(signal * 32767)
-    
+    signal *= (intensity_relation/ (np.max(intensity_relation) if peak is None else peak))
+
+    return signal, phase[-1]
+
+
+@timed("acoustic", "generate")
+def generate_signal(v, fs, duration, num_points_per_second):
+    key = SignalCache.key(v, fs, duration, num_points_per_second)
+    signal_int = signal_cache.get(key)
+    if signal_int is None:
+        t_math = np.linspace(- duration / 2 , duration / 2,int( num_points_per_second * duration))
+
+        signal, _ = _synthesize(t_math, v, fs, num_points_per_second)
+
+        signal_int = np.int16(signal * 32767)
+        signal_cache.put(key, signal_int)
+
     t_frontend = np.linspace(0, duration, int(num_points_per_second * duration))
 
     return GeneratedSignal(Signal = signal_int.tolist(), Time = t_frontend.tolist() )
+
+
+def _synthesize_grid(velocities, frequencies, duration, num_points_per_second):
+    """
+    Broadcasted _synthesize over a velocity x frequency grid: (V, F, N) int16.
+    Geometry and amplitude depend on velocity only and are computed once per
+    velocity; the element-wise operations and their order match _synthesize,
+    so every slice equals generate_signal for that pair.
+    """
+    t_math = np.linspace(- duration / 2 , duration / 2,int( num_points_per_second * duration))
+    v = np.asarray(velocities, dtype=np.float64)[:, None]
+    fs = np.asarray(frequencies, dtype=np.float64)[None, :, None]
+
+    x = v * t_math
+    r = np.sqrt(x**2 + X_OFFSET**2)
+    v_radial = v * ( x / r )
+
+    f_instant = fs * (C / (C + v_radial))[:, None, :]
+    phase = 2 * np.pi * np.cumsum(f_instant, axis=-1) / num_points_per_second
+    signal = .5 * np.sin(phase)
+
+    intensity_relation = 1 / (r**0.3+ 1)
+    signal *= (intensity_relation / np.max(intensity_relation, axis=1, keepdims=True))[:, None, :]
+
+    return np.int16(signal * 32767)
+
+
+@timed("acoustic", "sweep")
+def sweep_signals(velocities, frequencies, duration, num_points_per_second):
+    if not velocities or not frequencies:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="At least one velocity and one frequency are required")
+    if any(f <= 0 for f in frequencies):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Frequencies must be positive")
+    n = int(num_points_per_second * duration)
+    if len(velocities) * len(frequencies) * n > MAX_SWEEP_SAMPLES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Sweep too large: velocities x frequencies x samples must stay under {MAX_SWEEP_SAMPLES}",
+        )
+
+    keys = {(v, f): SignalCache.key(v, f, duration, num_points_per_second) for v in velocities for f in frequencies}
+    signals = {pair: signal_cache.get(key) for pair, key in keys.items()}
+
+    # Only velocities with at least one uncached pair are synthesized, still as one grid
+    missing_v = list(dict.fromkeys(v for (v, f), signal in signals.items() if signal is None))
+    if missing_v:
+        grid = _synthesize_grid(missing_v, frequencies, duration, num_points_per_second)
+        for i, v in enumerate(missing_v):
+            for j, f in enumerate(frequencies):
+                if signals[(v, f)] is None:
+                    signals[(v, f)] = grid[i, j].copy()
+                    signal_cache.put(keys[(v, f)], signals[(v, f)])
+
+    t_frontend = np.linspace(0, duration, n)
+    return SweepOutput(
+        Time=t_frontend.tolist(),
+        signals=[
+            SweepSignal(velocity=v, frequency=f, Signal=signals[(v, f)].tolist())
+            for v in velocities for f in frequencies
+        ],
+    )
+
+
+def iter_signal_chunks(v, fs, duration, num_points_per_second, chunk_size=None):
+    """
+    Same samples as generate_signal, produced `chunk_size` samples at a time as
+    int16 arrays. The phase accumulator is carried across chunks and the
+    amplitude peak (closest grid point to t = 0) is computed up front, so
+    memory stays constant whatever the duration.
+    """
+    n = int(num_points_per_second * duration)
+    if n == 0:
+        return
+    chunk_size = chunk_size or num_points_per_second
+    step = duration / (n - 1) if n > 1 else 0.0
+
+    # Grid point of np.linspace(-d/2, d/2, n) nearest to the closest approach
+    nearest = min(n - 1, max(0, round((duration / 2) / step))) if step else 0
+    r_min = np.sqrt((v * (-duration / 2 + nearest * step)) ** 2 + X_OFFSET**2)
+    peak = 1 / (r_min**0.3 + 1)
+
+    phase = 0.0
+    for start in range(0, n, chunk_size):
+        t_math = -duration / 2 + np.arange(start, min(n, start + chunk_size)) * step
+        if start + len(t_math) == n and n > 1:
+            t_math[-1] = duration / 2  # linspace pins the endpoint exactly
+        signal, phase = _synthesize(t_math, v, fs, num_points_per_second, phase, peak)
+        yield np.int16(signal * 32767)
+
+
+def wav_header(num_samples, sample_rate):
+    """44-byte RIFF header for mono 16-bit PCM with a known sample count."""
+    data_size = num_samples * 2
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_size, b"WAVE",
+        b"fmt ", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16,
+        b"data", data_size,
+    )
+
+
+def _iter_bytes(v, fs, duration, num_points_per_second, fmt):
+    if fmt == "wav":
+        yield wav_header(int(num_points_per_second * duration), num_points_per_second)
+    for chunk in iter_signal_chunks(v, fs, duration, num_points_per_second):
+        yield chunk.astype("<i2").tobytes()
+
+
+def stream_signal(v, fs, duration, num_points_per_second, fmt="wav"):
+    """Returns a byte iterator of the signal as WAV (header first) or raw little-endian int16."""
+    # A RIFF data chunk is limited to 4 GiB; check before any byte is sent
+    if fmt == "wav" and 36 + 2 * int(num_points_per_second * duration) >= 2**32:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Signal too long for a WAV file; use format=raw",
+        )
+    return _iter_bytes(v, fs, duration, num_points_per_second, fmt)
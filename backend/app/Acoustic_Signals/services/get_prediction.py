@@ -1,14 +1,19 @@
 from fastapi import UploadFile, File, HTTPException, status
 from app.Acoustic_Signals.schemas.schema import AiPrediction
+from app.Acoustic_Signals.services.audio_features import ClipSpectrum, decode_audio
+from app.core.metrics import count_model_call, stage, timed
+from app.core.models import model_registry
 import onnxruntime as ort
 import joblib
-import librosa
 import numpy as np
 import os
 import warnings
 
 warnings.filterwarnings("ignore")
 
+SAMPLE_RATE = 16000
+CLIP_SAMPLES = SAMPLE_RATE * 4
+
 class UnifiedSubmarineDetector:
     def __init__(self):
         # Determine paths relative to this file
@@ -16,55 +21,117 @@ class UnifiedSubmarineDetector:
         onnx_path = os.path.join(base_path, 'notebook', 'submarine_model.onnx')
         ml_path = os.path.join(base_path, 'notebook', 'submarine_rf_model.pkl')
         
-        # 1. Load ONNX Session
+        # 1. Load ONNX Session (input name resolved once, not per request)
         self.ort_session = ort.InferenceSession(onnx_path)
+        self.input_name = self.ort_session.get_inputs()[0].name
+        batch_dim = self.ort_session.get_inputs()[0].shape[0]
+        self.fixed_batch = isinstance(batch_dim, int) and batch_dim == 1
         
         # 2. Load Machine Learning Model
         self.ml_model = joblib.load(ml_path)
         print("✅ Ensemble (ONNX + ML) ready.")
 
-    def _extract_ml_features(self, y, sr):
-        mfcc = np.mean(librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13).T, axis=0)
-        centroid = np.mean(librosa.feature.spectral_centroid(y=y, sr=sr).T, axis=0)
-        zcr = np.mean(librosa.feature.zero_crossing_rate(y).T, axis=0)
-        rolloff = np.mean(librosa.feature.spectral_rolloff(y=y, sr=sr).T, axis=0)
+    def _extract_ml_features(self, spectrum):
+        mfcc = np.mean(spectrum.mfcc(), axis=1)
+        centroid = np.mean(spectrum.spectral_centroid())
+        zcr = np.mean(spectrum.zero_crossing_rate())
+        rolloff = np.mean(spectrum.spectral_rolloff())
         return np.hstack([mfcc, centroid, zcr, rolloff])
 
-    def _extract_dl_spectrogram(self, y, sr):
-        spec = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=128)
-        spec_db = librosa.power_to_db(spec, ref=np.max)
-        spec_db = (spec_db - spec_db.min()) / (spec_db.max() - spec_db.min() + 1e-6)
+    def _extract_dl_spectrogram(self, spectrum):
+        spec_db = spectrum.normalized_mel_db()
         # Reshape to (Batch, Channel, Height, Width) for ONNX
         return spec_db.astype(np.float32)[np.newaxis, np.newaxis, :, :]
 
+    @timed("acoustic", "features")
+    def featurize(self, y, sr):
+        """Returns (ml_features, dl_spectrogram) for one 4 s clip from a single STFT."""
+        spectrum = ClipSpectrum(y, sr)
+        return self._extract_ml_features(spectrum), self._extract_dl_spectrogram(spectrum)
+
+    @timed("acoustic", "cnn")
+    def _run_dl(self, dl_batch):
+        if self.fixed_batch:
+            # Model exported with batch size 1: feed clips one by one
+            outs = [self.ort_session.run(None, {self.input_name: x[np.newaxis]})[0] for x in dl_batch]
+            count_model_call("submarine_cnn", len(dl_batch))
+            return np.concatenate(outs)[:, 0]
+        count_model_call("submarine_cnn")
+        return self.ort_session.run(None, {self.input_name: dl_batch})[0][:, 0]
+
+    def score_features(self, ml_features, dl_batch):
+        """
+        Scores N clips at once: one ONNX run over the stacked (N, 1, 128, 126)
+        spectrograms and one predict_proba over the (N, 16) feature matrix.
+        """
+        # 1. DL Prediction (ONNX)
+        logits = self._run_dl(dl_batch)
+        dl_probs = 1 / (1 + np.exp(-logits)) # Sigmoid
+
+        # 2. ML Prediction (Random Forest)
+        with stage("acoustic", "random_forest"):
+            ml_probs = self.ml_model.predict_proba(ml_features)[:, 1]
+        count_model_call("submarine_rf")
+
+        # 3. Ensemble
+        avg_probs = (dl_probs + ml_probs) / 2
+        labels = ["🚨 SUBMARINE" if p > 0.5 else "✅ NO SUBMARINE" for p in avg_probs]
+
+        return ml_probs, dl_probs, avg_probs, labels
+
+    def _score(self, y, sr):
+        ml_features, dl_spectrogram = self.featurize(y, sr)
+        ml_probs, dl_probs, avg_probs, labels = self.score_features(ml_features[np.newaxis], dl_spectrogram)
+        return ml_probs[0], dl_probs[0], avg_probs[0], labels[0]
+
+    def warmup(self):
+        """Runs one dummy clip through both models so the first real request is not the slow one."""
+        self._score(np.zeros(CLIP_SAMPLES, dtype=np.float32), SAMPLE_RATE)
+
+    @staticmethod
+    def fit_clip(signal, max_len=CLIP_SAMPLES):
+        # Ensure 4s duration
+        return np.pad(signal, (0, max_len - len(signal))) if len(signal) < max_len else signal[:max_len]
+
     def predict(self, audio_file):
         # 1. Load audio
-        signal, sr = librosa.load(audio_file, sr=16000)
-        
-        # Ensure 4s duration
-        max_len = 16000 * 4
-        y = np.pad(signal, (0, max_len - len(signal))) if len(signal) < max_len else signal[:max_len]
+        signal, sr = decode_audio(audio_file, target_sr=SAMPLE_RATE)
+        y = self.fit_clip(signal)
 
-        # 2. DL Prediction (ONNX)
-        input_name = self.ort_session.get_inputs()[0].name
-        ort_outs = self.ort_session.run(None, {input_name: self._extract_dl_spectrogram(y, sr)})
-        logits = ort_outs[0][0][0]
-        dl_prob = 1 / (1 + np.exp(-logits)) # Sigmoid
+        ml_prob, dl_prob, avg_prob, label = self._score(y, sr)
+        return signal, ml_prob, dl_prob, avg_prob, label
 
-        # 3. ML Prediction (Random Forest)
-        ml_prob = self.ml_model.predict_proba([self._extract_ml_features(y, sr)])[0][1]
 
-        # 4. Ensemble
-        avg_prob = (dl_prob + ml_prob) / 2
-        label = "🚨 SUBMARINE" if avg_prob > 0.5 else "✅ NO SUBMARINE"
-        
-        return signal, ml_prob, dl_prob, avg_prob, label
+def _load_detector():
+    detector = UnifiedSubmarineDetector()
+    detector.warmup()
+    return detector
+
+
+# One detector per process: ONNX sessions and sklearn forests are safe to call
+# concurrently, so only construction needs the registry's lock.
+detector_model = model_registry.register("submarine_detector", _load_detector)
+
+
+def get_detector():
+    return detector_model.get()
+
+
+def require_detector():
+    try:
+        return get_detector()
+    except Exception as error:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Submarine detector is unavailable: {error}",
+        )
+
 
 def get_prediction(file: UploadFile = File(...)):
     if not (file.filename.endswith(".mp3") or file.filename.endswith(".wav")):
         raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE)
 
-    detector = UnifiedSubmarineDetector()
+    detector = require_detector()
     signal, ml_p, dl_p, avg_p, label = detector.predict(file.file)
     
     return AiPrediction(
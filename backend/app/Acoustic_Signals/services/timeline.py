@@ -0,0 +1,120 @@
+import numpy as np
+import soundfile as sf
+from fastapi import UploadFile, HTTPException, status
+
+from app.Acoustic_Signals.schemas.schema import DetectionEvent, DetectionTimeline, WindowScore
+from app.Acoustic_Signals.services.audio_features import stream_audio
+from app.Acoustic_Signals.services.get_prediction import CLIP_SAMPLES, SAMPLE_RATE, require_detector
+
+
+def iter_windows(blocks, window=CLIP_SAMPLES, hop=CLIP_SAMPLES):
+    """
+    Slides `window`-sample frames with step `hop` over a stream of blocks and
+    yields (start_sample, frame). A trailing stretch not covered by a full
+    window is zero-padded, matching how single clips are padded to 4 s.
+    """
+    buffer = np.zeros(0, dtype=np.float32)
+    offset = 0  # absolute sample index of buffer[0]
+    next_start = 0
+    last_end = 0
+    for block in blocks:
+        buffer = np.concatenate([buffer, block])
+        while next_start + window <= offset + len(buffer):
+            i = next_start - offset
+            yield next_start, buffer[i:i + window]
+            last_end = next_start + window
+            next_start += hop
+        drop = min(next_start - offset, len(buffer))
+        buffer = buffer[drop:]
+        offset += drop
+
+    total = offset + len(buffer)
+    if next_start < total and last_end < total:
+        tail = buffer[next_start - offset:]
+        yield next_start, np.pad(tail, (0, window - len(tail)))
+
+
+def merge_events(windows, threshold):
+    """Merges overlapping or touching windows above `threshold` into event intervals."""
+    events = []
+    for window in windows:
+        if window.mixed_approach <= threshold:
+            continue
+        if events and window.start <= events[-1]["end"]:
+            event = events[-1]
+            event["end"] = max(event["end"], window.end)
+            event["scores"].append(window.mixed_approach)
+        else:
+            events.append({"start": window.start, "end": window.end, "scores": [window.mixed_approach]})
+
+    return [
+        DetectionEvent(
+            start=event["start"],
+            end=event["end"],
+            peak_confidence=max(event["scores"]),
+            mean_confidence=round(float(np.mean(event["scores"])), 2),
+            num_windows=len(event["scores"]),
+        )
+        for event in events
+    ]
+
+
+def get_timeline(file: UploadFile, hop_seconds=2.0, block_seconds=30.0, batch_size=32, threshold=0.5):
+    if not (file.filename.endswith(".mp3") or file.filename.endswith(".wav")):
+        raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE)
+
+    detector = require_detector()
+    hop = max(1, int(hop_seconds * SAMPLE_RATE))
+    window_seconds = CLIP_SAMPLES / SAMPLE_RATE
+
+    scores = []
+    batch = []
+    total_samples = 0
+
+    def flush():
+        ml_p, dl_p, avg_p, labels = detector.score_features(
+            np.vstack([features[0] for _, features in batch]),
+            np.concatenate([features[1] for _, features in batch]),
+        )
+        for (start, _), ml, dl, avg, label in zip(batch, ml_p, dl_p, avg_p, labels):
+            start_time = start / SAMPLE_RATE
+            scores.append(WindowScore(
+                start=round(start_time, 3),
+                end=round(start_time + window_seconds, 3),
+                ml_prediction=round(float(ml) * 100, 2),
+                dl_prediction=round(float(dl) * 100, 2),
+                mixed_approach=round(float(avg) * 100, 2),
+                label=label,
+            ))
+        batch.clear()
+
+    def counted(blocks):
+        nonlocal total_samples
+        for block in blocks:
+            total_samples += len(block)
+            yield block
+
+    file.file.seek(0)
+    try:
+        _, blocks = stream_audio(file.file, block_seconds, target_sr=SAMPLE_RATE)
+        for start, frame in iter_windows(counted(blocks), hop=hop):
+            batch.append((start, detector.featurize(frame, SAMPLE_RATE)))
+            if len(batch) >= batch_size:
+                flush()
+    except sf.LibsndfileError as error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Could not decode audio: {error}")
+    if batch:
+        flush()
+
+    duration = round(total_samples / SAMPLE_RATE, 3)
+    for score in scores:
+        # The zero-padded tail window ends at the end of the recording, not 4 s later
+        score.end = min(score.end, duration)
+
+    return DetectionTimeline(
+        duration=duration,
+        window_seconds=window_seconds,
+        hop_seconds=hop / SAMPLE_RATE,
+        windows=scores,
+        events=merge_events(scores, threshold * 100),
+    )
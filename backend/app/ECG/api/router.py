@@ -1,18 +1,21 @@
-from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+from fastapi import APIRouter, File, Form, HTTPException, Request, UploadFile
 
+from app.core import executor
+from app.core.encoding import encode_response
 from app.ECG.schemas.schema import ECGResponse, PredictionResponse
 from app.ECG.services.service import (
     is_pretrained_available,
     parse_ecg,
-    predict_ecg,
+    predict_upload,
 )
 
 router = APIRouter(prefix="/ecg")
 
 
 @router.post("/upload", response_model=ECGResponse)
-async def upload_ecg(file: UploadFile = File(...)):
-    return await parse_ecg(file)
+async def upload_ecg(request: Request, file: UploadFile = File(...)):
+    # JSON by default; Arrow / MessagePack / base64 float32 when the Accept header asks for it
+    return encode_response(request, await parse_ecg(file), ECGResponse)
 
 
 @router.post("/predict", response_model=PredictionResponse)
@@ -27,6 +30,5 @@ async def predict(file: UploadFile = File(...), model: str = Form(...)):
             detail="Pretrained ECG model is unavailable (missing ONNX artifacts).",
         )
 
-    data = await parse_ecg(file)
-    preds = await predict_ecg(data, model_type=model)
-    return preds
+    # Parsing and inference run in an ECG worker process, off the event loop
+    return await executor.run("ecg", predict_upload, file, model_type=model)
@@ -5,30 +5,33 @@ import joblib
 import numpy as np
 import onnxruntime as ort
 import pandas as pd
-from scipy import stats
-from scipy.special import softmax
 
+from app.core.models import model_registry
+from app.core.metrics import count_model_call, stage, timed
 
+
+@timed("ecg", "parse")
 async def parse_ecg(file):
     contents = await file.read()
     df = pd.read_csv(io.StringIO(contents.decode("utf-8")))
     df.columns = [column.lower() for column in df.columns]
 
+    # NumPy arrays all the way to the response encoder
     if "time" in df.columns:
-        time = df["time"].tolist()
+        time = df["time"].to_numpy()
         channels = [column for column in df.columns if column != "time"]
     else:
         sampling_rate = 360
-        time = [index / sampling_rate for index in range(len(df))]
+        time = np.arange(len(df)) / sampling_rate
         channels = df.columns.tolist()
 
-    signals = {channel: df[channel].astype(float).tolist() for channel in channels}
+    signals = {channel: df[channel].to_numpy(dtype=float) for channel in channels}
 
     return {
         "num_channels": len(channels),
         "channels": channels,
         "num_samples": len(df),
-        "duration": float(time[-1]) if time else None,
+        "duration": float(time[-1]) if len(time) else None,
         "time": time,
         "signals": signals,
     }
@@ -38,46 +41,31 @@ base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 onnx_path = os.path.join(base_path, "notebook", "light_ecg_cnn_balanced.onnx")
 classic_model_path = os.path.join(base_path, "notebook", "balanced_rf_ecg.pkl")
 
-ai_session = None
-input_name = None
-
-try:
-    ai_session = ort.InferenceSession(str(onnx_path))
-    input_name = ai_session.get_inputs()[0].name
-    print("Light ECG CNN model loaded successfully")
-except Exception as error:
-    print(f"Failed to load AI model: {error}")
 
-classic_model = None
-classic_model_load_error = None
+def _load_cnn():
+    session = ort.InferenceSession(str(onnx_path))
+    return session, session.get_inputs()[0].name
 
 
-def _load_classical_model():
-    global classic_model
-    global classic_model_load_error
+# Both models load on first use (or during the startup warm-up), not on import
+cnn_model = model_registry.register("ecg_cnn", _load_cnn)
+classical_model = model_registry.register("ecg_classical", lambda: joblib.load(classic_model_path))
 
-    if classic_model is not None:
-        return True
 
+def _loaded(model):
     try:
-        classic_model = joblib.load(classic_model_path)
-        classic_model_load_error = None
-        print("Classical Random Forest model loaded")
-        return True
-    except Exception as error:
-        classic_model_load_error = str(error)
-        print(f"Failed to load classical model: {error}")
-        return False
-
-_load_classical_model()
+        return model.get()
+    except Exception:
+        return None
 
 
 def is_pretrained_available():
-    return ai_session is not None
+    # Only checks the artifact: the session is loaded where predictions run (an ECG worker), not on the event loop
+    return os.path.exists(onnx_path)
 
 
 def is_classical_available():
-    return _load_classical_model()
+    return _loaded(classical_model) is not None
 
 
 def _normalized_prediction(values_by_label):
@@ -108,6 +96,8 @@ def _vector_to_prediction(vector):
     values = np.asarray(vector, dtype=np.float32).reshape(-1)
     if values.size == 0:
         return _normalized_prediction({})
+    from scipy.special import softmax
+
     if np.any(values < 0) or np.any(values > 1) or not np.isclose(np.sum(values), 1.0, atol=1e-2):
         probs = softmax(values)
     else:
@@ -128,6 +118,8 @@ def _label_to_class_name(label):
 
 
 def extract_features(signal):
+    from scipy import stats  # only the classical model needs it; keeps the router import light
+
     signal = np.asarray(signal, dtype=np.float32)
     q25 = np.percentile(signal, 25)
     q75 = np.percentile(signal, 75)
@@ -154,6 +146,11 @@ def extract_features(signal):
     return np.nan_to_num(features, nan=0.0, posinf=0.0, neginf=0.0).tolist()
 
 
+async def predict_upload(file, model_type="pretrained"):
+    """parse_ecg then predict_ecg, as one task for an ECG worker process."""
+    return await predict_ecg(await parse_ecg(file), model_type=model_type)
+
+
 async def predict_ecg(parsed_data, model_type="pretrained"):
     default_prediction = {
         "prediction": {
@@ -173,8 +170,10 @@ async def predict_ecg(parsed_data, model_type="pretrained"):
     signal = np.array(parsed_data["signals"][channels[0]])
 
     if model_type == "pretrained":
-        if ai_session is None:
+        loaded = _loaded(cnn_model)
+        if loaded is None:
             return default_prediction
+        ai_session, input_name = loaded
 
         if len(signal) > 200:
             signal = signal[:200]
@@ -183,23 +182,31 @@ async def predict_ecg(parsed_data, model_type="pretrained"):
         signal = signal.astype(np.float32)
 
         try:
-            raw_outputs = _run_onnx_with_flexible_shape(signal, ai_session, input_name)
+            with stage("ecg", "cnn"):
+                raw_outputs = _run_onnx_with_flexible_shape(signal, ai_session, input_name)
+            count_model_call("ecg_cnn")
             return _vector_to_prediction(raw_outputs[0] if np.asarray(raw_outputs).ndim > 1 else raw_outputs)
         except Exception as error:
             print(f"ONNX Inference Error: {error}")
             return default_prediction
 
     if model_type == "classical":
-        if not _load_classical_model():
+        classic_model = _loaded(classical_model)
+        if classic_model is None:
             return default_prediction
 
-        features = extract_features(signal)
+        with stage("ecg", "features"):
+            features = extract_features(signal)
 
         try:
-            pred = classic_model.predict([features])[0]
+            with stage("ecg", "random_forest"):
+                pred = classic_model.predict([features])[0]
+            count_model_call("ecg_classical")
 
             if hasattr(classic_model, "predict_proba"):
-                probs = classic_model.predict_proba([features])[0]
+                with stage("ecg", "random_forest"):
+                    probs = classic_model.predict_proba([features])[0]
+                count_model_call("ecg_classical")
                 if hasattr(classic_model, "classes_"):
                     mapped = {}
                     for cls, prob in zip(classic_model.classes_, probs):
@@ -1,8 +1,10 @@
-from fastapi import APIRouter,File,UploadFile,HTTPException,status, Query
+from fastapi import APIRouter,File,UploadFile,HTTPException,status, Query, Request
+from app.core.encoding import encode_response
 from app.EEG.schemas.schema import AnalysisResponse , PaginatedSignalResponse
 from app.EEG.services.extract_info import FeatureExtractor
-from app.EEG.services.predictions import AiPredictor
-from io import BytesIO
+from app.core import executor
+from app.core.metrics import stage
+from app.core.models import model_registry
 import pandas as pd
 import uuid
 import json
@@ -10,30 +12,30 @@ import os
 
 EEG_Router = APIRouter()
 extractor = FeatureExtractor()
-predictor = AiPredictor()
 
-TEMP_DIR = "temp_signal_data"
-os.makedirs(TEMP_DIR, exist_ok=True)
 
+def _load_predictor():
+    # torch, torchvision and xgboost are only imported here, off the import path of app.main
+    from app.EEG.services.predictions import AiPredictor
+    return AiPredictor()
 
-# 1 - endpoint for data extraction and ai predictions 
-@EEG_Router.post('/EEG', response_model=AnalysisResponse)
-async def get_info(file: UploadFile = File(...)):
 
-    if not (file.filename.endswith(".csv") or file.filename.endswith(".parquet")):
-        raise HTTPException(
-            status_code=status.HTTP_406_NOT_ACCEPTABLE,
-            detail="Only CSV or Parquet files allowed"
-        )
+predictor_model = model_registry.register("eeg_predictor", _load_predictor)
+
+TEMP_DIR = "temp_signal_data"
+os.makedirs(TEMP_DIR, exist_ok=True)
+
 
+def analyze_upload(file):
+    """Parse, features, predictions and the saved signal of one upload; runs in an EEG worker process."""
     try:
-        contents = await file.read()
-        if file.filename.endswith(".csv"):
-            # contents = await file.read()
-            df = pd.read_csv(BytesIO(contents))
-        else:
-            # contents = await file.read()
-            df = pd.read_parquet(BytesIO(contents))
+        with stage("eeg", "parse"):
+            # Parsed straight from the (shared memory) upload, without a bytes copy first
+            file.file.seek(0)
+            if file.filename.endswith(".csv"):
+                df = pd.read_csv(file.file)
+            else:
+                df = pd.read_parquet(file.file)
 
     except Exception as e:
         print("ERROR:", e)   # 🔥 helps debugging
@@ -48,6 +50,14 @@ async def get_info(file: UploadFile = File(...)):
             detail="Uploaded file is empty"
         )
         
+    try:
+        predictor = predictor_model.get()
+    except Exception as error:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"EEG models are unavailable: {error}"
+        )
+
     metadata, time_array, signals_dict = extractor.extract(df)
     predictions = predictor.predict(df)
     
@@ -58,7 +68,7 @@ async def get_info(file: UploadFile = File(...)):
     # features = extractor.extract(df)
     # predictions = predictor.predict(df)
 
-    with open(filepath, "w") as f:
+    with stage("eeg", "save"), open(filepath, "w") as f:
         json.dump({"time": time_array, "signals": signals_dict}, f)
         
         
@@ -67,9 +77,24 @@ async def get_info(file: UploadFile = File(...)):
         "features": metadata,
         "predictions": predictions
     }
+
+
+# 1 - endpoint for data extraction and ai predictions 
+@EEG_Router.post('/EEG', response_model=AnalysisResponse)
+async def get_info(file: UploadFile = File(...)):
+
+    if not (file.filename.endswith(".csv") or file.filename.endswith(".parquet")):
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail="Only CSV or Parquet files allowed"
+        )
+
+    # Filtering and both models hold the GIL for seconds: keep them off the event loop
+    return await executor.run("eeg", analyze_upload, file)
     
 @EEG_Router.get('/EEG/data/{file_id}', response_model=PaginatedSignalResponse)
 async def get_eeg_data(
+    request: Request,
     file_id: str, 
     page: int = Query(1, ge=1, description="Page number"),
     limit: int = Query(1000, ge=1, le=5000, description="Data points per page")
@@ -81,7 +106,7 @@ async def get_eeg_data(
         raise HTTPException(status_code=404, detail="Data file not found. You must analyze a file first.")
 
     # Load the massive data from the disk
-    with open(filepath, "r") as f:
+    with stage("eeg", "load_page"), open(filepath, "r") as f:
         data = json.load(f)
 
     # Calculate start and end indices for pagination
@@ -93,8 +118,8 @@ async def get_eeg_data(
     chunk_time = data["time"][start_index:end_index]
     chunk_signals = {ch: vals[start_index:end_index] for ch, vals in data["signals"].items()}
 
-    return {
+    return encode_response(request, {
         "time": chunk_time,
         "signals": chunk_signals,
         "total_samples": total_samples
-    }
\ No newline at end of file
+    }, PaginatedSignalResponse)
\ No newline at end of file
@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
-from scipy.signal import butter, filtfilt, iirnotch
+
+from app.core.metrics import timed
 
 class FeatureExtractor:
     
@@ -15,6 +16,7 @@ class FeatureExtractor:
         self.downsample_factor = downsample_factor
 
     # ---------------- CLEANING ----------------
+    @timed("eeg", "clean")
     def _clean(self, df):
         df = df.dropna(how='all')
         df = df.interpolate(method="linear")
@@ -37,14 +39,17 @@ class FeatureExtractor:
 
     # ---------------- FILTERS ----------------
     def _bandpass_filter(self, data, low=0.5, high=40, order=4):
+        from scipy.signal import butter, filtfilt  # imported on first use, not with the router
         nyq = 0.5 * self.fs
         b, a = butter(order, [low / nyq, high / nyq], btype='band')
         return filtfilt(b, a, data)
 
     def _notch_filter(self, data, Q=30):
+        from scipy.signal import filtfilt, iirnotch
         b, a = iirnotch(self.notch_freq, Q, self.fs)
         return filtfilt(b, a, data)
 
+    @timed("eeg", "filters")
     def _apply_filters(self, df):
         for col in df.columns:
             signal = df[col].values
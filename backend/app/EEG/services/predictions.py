@@ -5,6 +5,7 @@ import torch
 import torch.nn.functional as F
 from torchvision.models import efficientnet_v2_s
 
+from app.core.metrics import count_model_call, stage
 from app.EEG.services.ml_feature_logic import preprocess_uploaded_eeg
 from app.EEG.services.dl_feature_logic import preprocess_eeg_for_dl
 
@@ -64,15 +65,18 @@ class AiPredictor:
         # --- ML PREDICTION ---
         if self.ml_models:
             try:
-                ml_input = preprocess_uploaded_eeg(df)
+                with stage("eeg", "ml_features"):
+                    ml_input = preprocess_uploaded_eeg(df)
                 ml_preds = np.zeros((1, 6))
-                for model in self.ml_models:
+                with stage("eeg", "xgboost"):
                     for model in self.ml_models:
-                    # Adding .values prevents feature_name mismatch errors
-                        pred = model.predict(ml_input.values) 
-                        pred = np.clip(pred, 1e-15, 1.0)
-                    pred = pred / np.sum(pred, axis=1, keepdims=True)
-                    ml_preds += pred
+                        for model in self.ml_models:
+                        # Adding .values prevents feature_name mismatch errors
+                            pred = model.predict(ml_input.values) 
+                            count_model_call("eeg_xgboost")
+                            pred = np.clip(pred, 1e-15, 1.0)
+                        pred = pred / np.sum(pred, axis=1, keepdims=True)
+                        ml_preds += pred
                 
                 ml_final = ml_preds / len(self.ml_models)
                 ml_results = dict(zip(self.classes, np.round(ml_final[0], 4).tolist()))
@@ -82,12 +86,14 @@ class AiPredictor:
         # --- DL PREDICTION ---
         if self.dl_model:
             try:
-                tensor_input = preprocess_eeg_for_dl(df)
-                tensor_input = tensor_input.to(self.device)
+                with stage("eeg", "spectrogram"):
+                    tensor_input = preprocess_eeg_for_dl(df)
+                    tensor_input = tensor_input.to(self.device)
 
-                with torch.no_grad():
+                with stage("eeg", "efficientnet"), torch.no_grad():
                     logits = self.dl_model(tensor_input)
                     probabilities = F.softmax(logits, dim=1).cpu().numpy()[0]
+                count_model_call("eeg_efficientnet")
 
                 raw_dl_dict = dict(zip(self.dl_training_classes, probabilities))
 
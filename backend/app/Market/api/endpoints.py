@@ -1,8 +1,13 @@
-from fastapi import APIRouter, UploadFile, File, Query
+from typing import List, Literal
+from fastapi import APIRouter, UploadFile, File, Query, Request
+from app.core import executor
+from app.core.encoding import encode_response
 # Import your classes and schemas
 from app.Market.services.analyzer import MarketAnalyzer
+from app.Market.services.backtest import backtest
 from app.Market.services.compare import Compare2Comapnies
-from app.Market.schemas.schema import AnalysisOutput, ComparisonOutput
+from app.Market.services.indicators import append_bars, seed_instrument, sweep_indicators
+from app.Market.schemas.schema import AnalysisOutput, AppendInput, BacktestOutput, BatchForecastOutput, ComparisonOutput, IndicatorSweep, IndicatorTail, MultiComparisonOutput
 
 # Initialize the Router and your classes
 market_router = APIRouter()
@@ -12,12 +17,60 @@ comparator = Compare2Comapnies()
 # 1 - Endpoint for single asset analysis and predicting future behavior
 @market_router.post('/analysis', response_model=AnalysisOutput)
 async def get_market(
+    request: Request,
     file: UploadFile = File(...),
     ma_window: int = Query(20, description="Moving Average window size (e.g., 20)"),
-    pred_steps: int = Query(30, description="Number of days to forecast into the future")
+    pred_steps: int = Query(30, description="Number of days to forecast into the future"),
+    ticker: str = Query("AAPL", description="Scaler to use for the forecast (e.g., AAPL, GC=F, EURUSD=X)"),
+    mode: Literal["recursive", "stateful"] = Query("recursive", description="Forecast rollout: re-run the window per step, or carry LSTM state")
 ):
-    results = analyzer.do_analysis(file, ma_window=ma_window, pred_steps=pred_steps)
-    return results
+    results = await executor.run("market", analyzer.do_analysis, file, ma_window=ma_window, pred_steps=pred_steps, ticker=ticker, mode=mode)
+    return encode_response(request, results, AnalysisOutput)
+
+# 1b - Endpoint for forecasting a whole watchlist in one batched model run
+@market_router.post('/analysis/batch', response_model=BatchForecastOutput)
+def forecast_markets(
+    files: List[UploadFile] = File(..., description="One CSV per asset"),
+    tickers: List[str] = Query(["AAPL"], description="One scaler for all files, or one per file in upload order"),
+    pred_steps: int = Query(30, ge=1, description="Number of days to forecast into the future"),
+    mode: Literal["recursive", "stateful"] = Query("recursive", description="Forecast rollout: re-run the window per step, or carry LSTM state")
+):
+    return analyzer.batch_forecast(files, tickers=tickers, steps=pred_steps, mode=mode)
+
+# 1c - Rolling-origin backtest of the forecaster over the uploaded history
+@market_router.post('/analysis/backtest', response_model=BacktestOutput)
+def backtest_market(
+    file: UploadFile = File(...),
+    ticker: str = Query("AAPL", description="Scaler to use for the forecast (e.g., AAPL, GC=F, EURUSD=X)"),
+    horizon: int = Query(5, ge=1, le=60, description="Days forecast from every origin"),
+    stride: int = Query(1, ge=1, description="Bars between consecutive origins"),
+    batch_size: int = Query(1024, ge=1, le=8192, description="Origin windows per model batch"),
+    mode: Literal["recursive", "stateful"] = Query("recursive", description="Forecast rollout: re-run the window per step, or carry LSTM state")
+):
+    df = analyzer._clean(file)
+    return backtest(analyzer, df['Close'], ticker=ticker, horizon=horizon, stride=stride, batch_size=batch_size, mode=mode)
+
+# 1d - Live indicators: seed once from history, then append new bars
+@market_router.post('/indicators/seed', response_model=IndicatorTail)
+def seed_indicators(
+    file: UploadFile = File(...),
+    ma_window: int = Query(20, ge=1, description="Moving Average window size (e.g., 20)")
+):
+    df = analyzer._clean(file)
+    return seed_instrument(df['Close'], window=ma_window)
+
+@market_router.post('/indicators/{instrument_id}/append', response_model=IndicatorTail)
+def append_indicators(instrument_id: str, payload: AppendInput):
+    return append_bars(instrument_id, payload.bars)
+
+# 1e - Every moving average / rolling std for a list of window sizes in one pass
+@market_router.post('/indicators/sweep', response_model=IndicatorSweep)
+def sweep_market_indicators(
+    file: UploadFile = File(...),
+    windows: List[int] = Query(..., description="Window sizes to evaluate (e.g., 5, 20, 50, 200)")
+):
+    df = analyzer._clean(file)
+    return sweep_indicators(df['Close'], windows)
 
 # 2 - Endpoint for comparing two companies
 @market_router.post('/compare', response_model=ComparisonOutput)
@@ -30,5 +83,15 @@ async def compare_markets(
     season_period: int = Query(30, description="Seasonality period (e.g., 30 for monthly)")
 ):
     files = [file1, file2]
-    results = comparator.compare(files, ma_short=ma_short, ma_long=ma_long, season_period=season_period)
-    return results
\ No newline at end of file
+    results = await executor.run("market", comparator.compare, files, ma_short=ma_short, ma_long=ma_long, season_period=season_period)
+    return results
+
+# 3 - Endpoint for comparing any number of assets on their common dates
+@market_router.post('/compare/multi', response_model=MultiComparisonOutput)
+def compare_many_markets(
+    files: List[UploadFile] = File(..., description="Two or more company CSVs"),
+    ma_short: int = Query(50, ge=1, description="Short Moving Average (e.g., 50)"),
+    ma_long: int = Query(200, ge=1, description="Long Moving Average (e.g., 200)"),
+    season_period: int = Query(30, ge=2, description="Seasonality period (e.g., 30 for monthly)")
+):
+    return comparator.compare_many(files, ma_short=ma_short, ma_long=ma_long, season_period=season_period)
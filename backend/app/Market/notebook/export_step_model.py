@@ -0,0 +1,126 @@
+"""
+Builds universal_lstm_step.onnx from universal_lstm.onnx.
+
+The tf2onnx export hides both LSTM layers inside Loop ops that always start
+from a zero state, so every forecast step has to replay the whole 60-step
+window. This script pulls the Keras weights out of that graph and rebuilds
+the same network (LSTM(64) -> LSTM(64) -> Dense(32, relu) -> Dense(1)) with
+ONNX LSTM ops whose hidden and cell states are graph inputs and outputs:
+
+    input  (B, T, 1)    h  (2, B, 64)    c  (2, B, 64)
+    output (B, 1)       h_out (2, B, 64) c_out (2, B, 64)
+
+Run from the backend folder:
+    python -m app.Market.notebook.export_step_model
+"""
+import os
+
+import numpy as np
+import onnx
+from onnx import TensorProto, helper, numpy_helper
+
+NOTEBOOK_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE = os.path.join(NOTEBOOK_DIR, "universal_lstm.onnx")
+TARGET = os.path.join(NOTEBOOK_DIR, "universal_lstm_step.onnx")
+PREFIX = "functional_12_1/sequential_2_1/"
+
+
+def _keras_to_onnx_gates(weights, hidden):
+    # Keras packs gates as (i, f, c, o) along the last axis, ONNX LSTM expects (i, o, f, c)
+    i, f, c, o = (weights[..., k * hidden:(k + 1) * hidden] for k in range(4))
+    return np.concatenate([i, o, f, c], axis=-1)
+
+
+def _lstm_initializers(weights, layer, name):
+    kernel = weights[f"{PREFIX}{layer}/lstm_cell_1/Cast/ReadVariableOp/resource:0"]
+    recurrent = weights[f"{PREFIX}{layer}/lstm_cell_1/Cast_1/ReadVariableOp/resource:0"]
+    bias = weights[f"{PREFIX}{layer}/lstm_cell_1/add_1/ReadVariableOp/resource:0"]
+    hidden = recurrent.shape[0]
+
+    W = _keras_to_onnx_gates(kernel, hidden).T[None]  # (1, 4H, input)
+    R = _keras_to_onnx_gates(recurrent, hidden).T[None]  # (1, 4H, H)
+    B = np.concatenate([_keras_to_onnx_gates(bias, hidden), np.zeros(4 * hidden, dtype=bias.dtype)])[None]
+    return hidden, [
+        numpy_helper.from_array(W.astype(np.float32), f"{name}_W"),
+        numpy_helper.from_array(R.astype(np.float32), f"{name}_R"),
+        numpy_helper.from_array(B.astype(np.float32), f"{name}_B"),
+    ]
+
+
+def build_step_model(source=SOURCE):
+    source_model = onnx.load(source)
+    weights = {init.name: numpy_helper.to_array(init) for init in source_model.graph.initializer}
+
+    hidden, initializers = _lstm_initializers(weights, "lstm_4_1", "lstm1")
+    _, lstm2 = _lstm_initializers(weights, "lstm_5_1", "lstm2")
+    initializers += lstm2
+    for name, key in [
+        ("dense1_W", "dense_4_1/Cast/ReadVariableOp:0"),
+        ("dense1_B", "dense_4_1/BiasAdd/ReadVariableOp:0"),
+        ("dense2_W", "dense_5_1/Cast/ReadVariableOp:0"),
+        ("dense2_B", "dense_5_1/Add/ReadVariableOp:0"),
+    ]:
+        initializers.append(numpy_helper.from_array(weights[PREFIX + key].astype(np.float32), name))
+    initializers.append(numpy_helper.from_array(np.array([1], dtype=np.int64), "axis1"))
+    initializers.append(numpy_helper.from_array(np.array([0], dtype=np.int64), "axis0"))
+
+    lstm_attrs = dict(hidden_size=hidden, activations=["Sigmoid", "Tanh", "Tanh"])
+    nodes = [
+        helper.make_node("Transpose", ["input"], ["x_tb"], perm=[1, 0, 2]),
+        helper.make_node("Split", ["h"], ["h1", "h2"], axis=0),
+        helper.make_node("Split", ["c"], ["c1", "c2"], axis=0),
+        helper.make_node("LSTM", ["x_tb", "lstm1_W", "lstm1_R", "lstm1_B", "", "h1", "c1"],
+                         ["y1", "h1_out", "c1_out"], **lstm_attrs),
+        helper.make_node("Squeeze", ["y1", "axis1"], ["y1_seq"]),
+        helper.make_node("LSTM", ["y1_seq", "lstm2_W", "lstm2_R", "lstm2_B", "", "h2", "c2"],
+                         ["", "h2_out", "c2_out"], **lstm_attrs),
+        helper.make_node("Squeeze", ["h2_out", "axis0"], ["last"]),
+        helper.make_node("MatMul", ["last", "dense1_W"], ["d1"]),
+        helper.make_node("Add", ["d1", "dense1_B"], ["d1_b"]),
+        helper.make_node("Relu", ["d1_b"], ["d1_relu"]),
+        helper.make_node("MatMul", ["d1_relu", "dense2_W"], ["d2"]),
+        helper.make_node("Add", ["d2", "dense2_B"], ["output"]),
+        helper.make_node("Concat", ["h1_out", "h2_out"], ["h_out"], axis=0),
+        helper.make_node("Concat", ["c1_out", "c2_out"], ["c_out"], axis=0),
+    ]
+
+    state = ["layers", "batch", hidden]
+    graph = helper.make_graph(
+        nodes,
+        "universal_lstm_step",
+        inputs=[
+            helper.make_tensor_value_info("input", TensorProto.FLOAT, ["batch", "time", 1]),
+            helper.make_tensor_value_info("h", TensorProto.FLOAT, state),
+            helper.make_tensor_value_info("c", TensorProto.FLOAT, state),
+        ],
+        outputs=[
+            helper.make_tensor_value_info("output", TensorProto.FLOAT, ["batch", 1]),
+            helper.make_tensor_value_info("h_out", TensorProto.FLOAT, state),
+            helper.make_tensor_value_info("c_out", TensorProto.FLOAT, state),
+        ],
+        initializer=initializers,
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 15)], producer_name="export_step_model")
+    model.ir_version = source_model.ir_version  # stay loadable by the same onnxruntime
+    onnx.checker.check_model(model)
+    return model
+
+
+def main():
+    import onnxruntime as rt
+
+    onnx.save(build_step_model(), TARGET)
+
+    # Zero-state pass over a window must reproduce the original model
+    windows = np.random.default_rng(0).random((16, 60, 1), dtype=np.float32)
+    original = rt.InferenceSession(SOURCE)
+    step = rt.InferenceSession(TARGET)
+    expected = original.run(None, {original.get_inputs()[0].name: windows})[0]
+    zeros = np.zeros((2, len(windows), 64), dtype=np.float32)
+    actual = step.run(["output"], {"input": windows, "h": zeros, "c": zeros})[0]
+    print(f"Saved {TARGET}")
+    print(f"max |step - original| over 16 random windows: {np.max(np.abs(actual - expected)):.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,57 @@ class AnalysisOutput(BaseModel):
     prediction_dates: List[str]
     prediction_values: List[Optional[float]]
 
+class TickerForecast(BaseModel):
+    filename: str
+    ticker: str
+    prediction_dates: List[str]
+    prediction_values: List[Optional[float]]
+
+class BatchForecastOutput(BaseModel):
+    forecasts: List[TickerForecast]
+
+class BacktestStep(BaseModel):
+    step: int
+    mae: float
+    rmse: float
+    mape: Optional[float]
+    directional_accuracy: float
+    naive_mae: float
+
+class BacktestOutput(BaseModel):
+    ticker: str
+    mode: str
+    horizon: int
+    num_origins: int
+    first_origin: str
+    last_origin: str
+    inference_seconds: float
+    per_horizon: List[BacktestStep]
+
+class Bar(BaseModel):
+    date: str
+    close: float
+    open: Optional[float] = None
+    high: Optional[float] = None
+    low: Optional[float] = None
+
+class AppendInput(BaseModel):
+    bars: List[Bar]
+
+class IndicatorTail(BaseModel):
+    instrument_id: str
+    time_axis: List[str]
+    close: List[float]
+    MA_overlay: List[Optional[float]]
+    Bollinger_Bands: dict
+    volatility: List[Optional[float]]
+
+class IndicatorSweep(BaseModel):
+    time_axis: List[str]
+    windows: List[int]
+    moving_average: List[List[Optional[float]]]
+    rolling_std: List[List[Optional[float]]]
+
 class MACrossData(BaseModel):
     ma_short: List[Optional[float]]
     ma_long: List[Optional[float]]
@@ -26,4 +77,14 @@ class AssetComparisonData(BaseModel):
 
 class ComparisonOutput(BaseModel):
     asset_1: AssetComparisonData
-    asset_2: AssetComparisonData
\ No newline at end of file
+    asset_2: AssetComparisonData
+
+class AssetSeriesData(BaseModel):
+    filename: str
+    pct_comparison: List[Optional[float]]
+    ma_cross: MACrossData
+    seasonality: List[Optional[float]]
+
+class MultiComparisonOutput(BaseModel):
+    time_axis: List[str]
+    assets: List[AssetSeriesData]
@@ -2,16 +2,67 @@ import os
 import joblib
 import numpy as np
 import pandas as pd
-from fastapi import HTTPException, status
 import onnxruntime as rt
 from fastapi import HTTPException, status, UploadFile
 
-class MarketAnalyzer:
-    def __init__(self):
-        base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        self.scaler = os.path.join(base_path, 'notebook', 'universal_scalers.save')
-        self.lstm_model = os.path.join(base_path, 'notebook', 'universal_lstm.onnx')
+from app.core.metrics import count_model_call, timed
+from app.core.models import model_registry
+
+LOOKBACK = 60
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCALER_PATH = os.path.join(BASE_PATH, 'notebook', 'universal_scalers.save')
+LSTM_PATH = os.path.join(BASE_PATH, 'notebook', 'universal_lstm.onnx')
+# Same weights with LSTM state as inputs/outputs, see notebook/export_step_model.py
+STEP_PATH = os.path.join(BASE_PATH, 'notebook', 'universal_lstm_step.onnx')
+
+
+def _load_lstm():
+    if not os.path.exists(SCALER_PATH) or not os.path.exists(LSTM_PATH):
+        raise FileNotFoundError("Model or scaler file not found")
+    scalers = joblib.load(SCALER_PATH)
+    session = rt.InferenceSession(LSTM_PATH)
+    return scalers, session, session.get_inputs()[0].name
+
+
+def _load_step():
+    if not os.path.exists(STEP_PATH):
+        raise FileNotFoundError("Step model not exported; stateful forecasts fall back to recursive")
+    return rt.InferenceSession(STEP_PATH)
 
+
+# Loaded once (on first use or by the warm-up) and shared by every analyzer and request
+lstm_model = model_registry.register("market_lstm", _load_lstm)
+step_model = model_registry.register("market_lstm_step", _load_step)
+
+
+class MarketAnalyzer:
+    def _load_models(self):
+        try:
+            return lstm_model.get()
+        except Exception as error:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=str(error)
+            )
+
+    def _load_step_model(self):
+        # Optional: without the exported step model, forecasts stay recursive
+        try:
+            return step_model.get()
+        except Exception:
+            return None
+
+    def get_scaler(self, ticker: str):
+        scalers, _, _ = self._load_models()
+        if ticker not in scalers:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown ticker '{ticker}'. Available scalers: {', '.join(scalers)}"
+            )
+        return scalers[ticker]
+
+    @timed("market", "clean")
     def _clean(self, file: UploadFile):
         if not (file.filename.endswith(".csv") or file.filename.endswith(".tsv")):
             raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE, detail="Only CSV or TSV files allowed")
@@ -41,8 +92,9 @@ class MarketAnalyzer:
         ma = close_price.rolling(window=window).mean()
         return self._replace_nan(ma)
         
-    def get_Bollinger_Bands(self, close_price, window):
-        da = close_price.rolling(window=window).mean() 
+    def get_Bollinger_Bands(self, close_price, window, ma=None):
+        # Reuse the moving average when the caller already has it
+        da = close_price.rolling(window=window).mean() if ma is None else ma
         std = close_price.rolling(window=window).std()
         upper = da + 2 * std
         lower = da - 2 * std
@@ -58,64 +110,128 @@ class MarketAnalyzer:
         Annualized_Volatility = std_20 * np.sqrt(252)
         return self._replace_nan(Annualized_Volatility)
         
-    def get_prediction(self, close_price: pd.Series, steps: int):
-            LOOKBACK = 60
-
-            if not os.path.exists(self.scaler) or not os.path.exists(self.lstm_model):
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Model or scaler file not found"
-                )
-
-            scaler = joblib.load(self.scaler)["AAPL"]
-            close_series = close_price.dropna().values.reshape(-1, 1)
-
-            if len(close_series) < LOOKBACK:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Not enough data. Minimum required: {LOOKBACK}"
-                )
-
-            scaled_data = scaler.transform(close_series)
-
-            # Take last window
-            current_sequence = scaled_data[-LOOKBACK:].reshape(1, LOOKBACK, 1)
+    @timed("market", "indicators")
+    def get_indicators(self, close_price: pd.Series, ma_window: int):
+        """Moving average overlay, Bollinger bands and annualized volatility of one close series."""
+        ma = close_price.rolling(window=ma_window).mean()
+        return {
+            "MA_overlay": self._replace_nan(ma),
+            "Bollinger_Bands": self.get_Bollinger_Bands(close_price, window=ma_window, ma=ma),
+            "volatility": self.get_volatility(close_price.copy()),
+        }
 
-            # Load ONNX model
-            sess = rt.InferenceSession(self.lstm_model)
-            input_name = sess.get_inputs()[0].name
+    def _scaled_window(self, close_price: pd.Series, scaler):
+        close_series = close_price.dropna().values.reshape(-1, 1)
+
+        if len(close_series) < LOOKBACK:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Not enough data. Minimum required: {LOOKBACK}"
+            )
+
+        # Only the last window is fed to the model
+        return scaler.transform(close_series[-LOOKBACK:])
+
+    @timed("market", "forecast")
+    def forecast(self, windows: np.ndarray, steps: int, mode: str = "recursive"):
+        """
+        Forecast for a batch of scaled windows (B, LOOKBACK, 1); returns (B, steps).
+
+        "recursive" slides the window and re-runs the full model for every
+        step. "stateful" runs the lookback once and then feeds each prediction
+        back as a single LSTM step, carrying the hidden/cell state forward.
+        """
+        if mode == "stateful":
+            step_sess = self._load_step_model()
+            if step_sess is not None:
+                return self._forecast_stateful(step_sess, windows, steps)
+
+        _, sess, input_name = self._load_models()
+        current_sequence = windows.astype(np.float32)
+        predictions = np.empty((len(windows), steps), dtype=np.float32)
+
+        for i in range(steps):
+            next_pred = sess.run(None, {input_name: current_sequence})[0]
+            predictions[:, i] = next_pred[:, 0]
+
+            current_sequence = np.concatenate(
+                (current_sequence[:, 1:, :], next_pred.reshape(-1, 1, 1)),
+                axis=1
+            )
+
+        count_model_call("market_lstm", steps)
+        return predictions
+
+    @staticmethod
+    def _forecast_stateful(step_sess, windows: np.ndarray, steps: int):
+        hidden = step_sess.get_inputs()[1].shape[-1]
+        state = np.zeros((2, len(windows), hidden), dtype=np.float32)
+        feed = {"input": windows.astype(np.float32), "h": state, "c": state}
+        predictions = np.empty((len(windows), steps), dtype=np.float32)
+
+        for i in range(steps):
+            next_pred, h, c = step_sess.run(None, feed)
+            predictions[:, i] = next_pred[:, 0]
+            feed = {"input": next_pred.reshape(-1, 1, 1), "h": h, "c": c}
+
+        count_model_call("market_lstm_step", steps)
+        return predictions
+
+    @staticmethod
+    def _future_dates(close_price: pd.Series, steps: int):
+        last_date = close_price.index[-1]
+        return [
+            (last_date + pd.Timedelta(days=i)).strftime('%Y-%m-%d')
+            for i in range(1, steps + 1)
+        ]
+
+    def get_prediction(self, close_price: pd.Series, steps: int, ticker: str = "AAPL", mode: str = "recursive"):
+            scaler = self.get_scaler(ticker)
+            window = self._scaled_window(close_price, scaler)
+
+            predictions = self.forecast(window.reshape(1, LOOKBACK, 1), steps, mode).reshape(-1, 1)
+            predictions_real = scaler.inverse_transform(predictions).flatten()
 
-            predictions = []
+            return self._future_dates(close_price, steps), predictions_real.tolist()
 
-            # Recursive prediction
-            for _ in range(steps):
-                next_pred = sess.run(None, {input_name: current_sequence.astype(np.float32)})[0]
-                predictions.append(next_pred[0][0])
+    def batch_forecast(self, files: list[UploadFile], tickers: list[str], steps: int, mode: str = "recursive"):
+        """Forecasts a whole watchlist: every file's window is stacked on the batch axis."""
+        if len(tickers) == 1:
+            tickers = tickers * len(files)
+        if len(tickers) != len(files):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Pass one ticker for all files or one ticker per file"
+            )
 
-                next_pred_reshaped = next_pred.reshape(1, 1, 1)
-                current_sequence = np.concatenate(
-                    (current_sequence[:, 1:, :], next_pred_reshaped),
-                    axis=1
-                )
+        closes, scalers, windows = [], [], []
+        for file, ticker in zip(files, tickers):
+            close_price = self._clean(file)['Close']
+            scaler = self.get_scaler(ticker)
+            closes.append(close_price)
+            scalers.append(scaler)
+            windows.append(self._scaled_window(close_price, scaler))
 
-            predictions = np.array(predictions).reshape(-1, 1)
-            predictions_real = scaler.inverse_transform(predictions).flatten()
+        predictions = self.forecast(np.stack(windows), steps, mode)
 
-            last_date = close_price.index[-1]
-            future_dates = [
-                (last_date + pd.Timedelta(days=i)).strftime('%Y-%m-%d')
-                for i in range(1, steps + 1)
+        return {
+            "forecasts": [
+                {
+                    "filename": file.filename,
+                    "ticker": ticker,
+                    "prediction_dates": self._future_dates(close_price, steps),
+                    "prediction_values": scaler.inverse_transform(row.reshape(-1, 1)).flatten().tolist(),
+                }
+                for file, ticker, close_price, scaler, row in zip(files, tickers, closes, scalers, predictions)
             ]
+        }
 
-            return future_dates, predictions_real.tolist()
-    def do_analysis(self, file: UploadFile, ma_window: int, pred_steps: int):
+    def do_analysis(self, file: UploadFile, ma_window: int, pred_steps: int, ticker: str = "AAPL", mode: str = "recursive"):
         df = self._clean(file)
         time_axis = df.index.strftime('%Y-%m-%d').tolist()
         
-        ma_overlay = self.get_MA(df['Close'].copy(), window=ma_window)
-        bol_bands = self.get_Bollinger_Bands(df['Close'].copy(), window=ma_window)
-        volatility = self.get_volatility(df['Close'].copy())
-        pred_dates, pred_values = self.get_prediction(df['Close'].copy(), steps=pred_steps)
+        indicators = self.get_indicators(df['Close'], ma_window)
+        pred_dates, pred_values = self.get_prediction(df['Close'].copy(), steps=pred_steps, ticker=ticker, mode=mode)
 
         # We return a dictionary here; the Router will convert it to the Pydantic schema
         return {
@@ -124,9 +240,7 @@ class MarketAnalyzer:
             "high": df['High'].tolist(),
             "low": df['Low'].tolist(), 
             "close": df['Close'].tolist(),
-            "MA_overlay": ma_overlay,
-            "Bollinger_Bands": bol_bands,
-            "volatility": volatility,
+            **indicators,
             "prediction_dates": pred_dates,       
             "prediction_values": pred_values       
         }
@@ -0,0 +1,125 @@
+"""
+Rolling-origin backtest of the Market LSTM.
+
+Every bar with LOOKBACK bars of history and `horizon` bars of future becomes a
+forecast origin. All origin windows are stacked and forecast in batches with
+the analyzer's cached session and scaler, then compared with what actually
+happened, horizon by horizon.
+
+CLI, run from the backend folder:
+    python -m app.Market.services.backtest app/Market/test_data/Stocks_Apple.csv --ticker AAPL --horizon 5
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException, UploadFile, status
+
+from app.Market.services.analyzer import LOOKBACK, MarketAnalyzer
+
+MAX_BACKTEST_WINDOWS = 200_000
+
+
+def _metrics(pred, actual, last):
+    """Error metrics per horizon for (origins, horizon) forecasts."""
+    error = pred - actual
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ape = np.abs(error) / np.abs(actual)
+    valid = np.isfinite(ape)  # actual prices of 0 have no percentage error
+    count = valid.sum(axis=0)
+    same_direction = np.sign(pred - last[:, None]) == np.sign(actual - last[:, None])
+    return {
+        "mae": np.mean(np.abs(error), axis=0),
+        "rmse": np.sqrt(np.mean(error ** 2, axis=0)),
+        # NaN (reported as null) for a horizon without a single valid actual price
+        "mape": np.divide(np.where(valid, ape, 0.0).sum(axis=0), count,
+                          out=np.full(count.shape, np.nan), where=count > 0) * 100,
+        "directional_accuracy": np.mean(same_direction, axis=0) * 100,
+        # Persistence forecast (tomorrow = today) as the bar to beat
+        "naive_mae": np.mean(np.abs(actual - last[:, None]), axis=0),
+    }
+
+
+def _number(value):
+    return None if np.isnan(value) else float(value)
+
+
+def backtest(analyzer: MarketAnalyzer, close_price: pd.Series, ticker: str = "AAPL", horizon: int = 5,
+             stride: int = 1, batch_size: int = 1024, mode: str = "recursive"):
+    scaler = analyzer.get_scaler(ticker)
+    close = close_price.dropna()
+    values = close.to_numpy(dtype=np.float64)
+
+    origins = np.arange(LOOKBACK, len(values) - horizon + 1, stride)
+    if len(origins) == 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Not enough data. Minimum required: {LOOKBACK + horizon}"
+        )
+    if len(origins) > MAX_BACKTEST_WINDOWS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Backtest too large: more than {MAX_BACKTEST_WINDOWS} origins, increase stride"
+        )
+
+    scaled = scaler.transform(values.reshape(-1, 1)).astype(np.float32).ravel()
+    # (n_origins, LOOKBACK) views into the scaled series, no copies until batching
+    windows = np.lib.stride_tricks.sliding_window_view(scaled, LOOKBACK)[origins - LOOKBACK]
+    targets = np.lib.stride_tricks.sliding_window_view(values, horizon)[origins]
+
+    start = time.perf_counter()
+    scaled_pred = np.concatenate([
+        analyzer.forecast(windows[i:i + batch_size, :, None], horizon, mode)
+        for i in range(0, len(windows), batch_size)
+    ])
+    elapsed = time.perf_counter() - start
+    pred = scaler.inverse_transform(scaled_pred.reshape(-1, 1)).reshape(scaled_pred.shape)
+
+    per_horizon = _metrics(pred, targets, values[origins - 1])
+    return {
+        "ticker": ticker,
+        "mode": mode,
+        "horizon": horizon,
+        "num_origins": len(origins),
+        "first_origin": close.index[origins[0]].strftime('%Y-%m-%d'),
+        "last_origin": close.index[origins[-1]].strftime('%Y-%m-%d'),
+        "inference_seconds": round(elapsed, 4),
+        "per_horizon": [
+            {"step": step + 1, **{name: _number(metric[step]) for name, metric in per_horizon.items()}}
+            for step in range(horizon)
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv", help="Market CSV in the same format as /analysis uploads")
+    parser.add_argument("--ticker", default="AAPL")
+    parser.add_argument("--horizon", type=int, default=5)
+    parser.add_argument("--stride", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--mode", choices=["recursive", "stateful"], default="recursive")
+    parser.add_argument("--json", action="store_true", help="Print the raw result as JSON")
+    args = parser.parse_args()
+
+    analyzer = MarketAnalyzer()
+    with open(args.csv, "rb") as f:
+        close = analyzer._clean(UploadFile(file=f, filename=args.csv))['Close']
+    result = backtest(analyzer, close, args.ticker, args.horizon, args.stride, args.batch_size, args.mode)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"{result['ticker']} ({result['mode']}): {result['num_origins']} origins "
+          f"{result['first_origin']} .. {result['last_origin']}, inference {result['inference_seconds']:.2f}s")
+    print(f"{'step':>4} {'MAE':>10} {'RMSE':>10} {'MAPE %':>8} {'dir acc %':>10} {'naive MAE':>10}")
+    for row in result["per_horizon"]:
+        mape = "n/a" if row["mape"] is None else f"{row['mape']:.2f}"
+        print(f"{row['step']:>4} {row['mae']:>10.4f} {row['rmse']:>10.4f} {mape:>8} "
+              f"{row['directional_accuracy']:>10.1f} {row['naive_mae']:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,26 @@
 import pandas as pd 
 import numpy as np 
-from statsmodels.tsa.seasonal import seasonal_decompose
 import warnings
 from fastapi import HTTPException, status, UploadFile
 
+from app.core import executor
+from app.core.metrics import timed
+
 warnings.filterwarnings("ignore")
 
+# One decomposition of ten years of daily closes takes about a millisecond, so
+# smaller comparisons are decomposed in-process rather than paying for IPC
+SEASON_POOL_MIN_POINTS = 100_000
+
+
+def _seasonal_columns(values, period):
+    """Additive seasonal component of every column of a (T, N) block."""
+    # statsmodels (and the scipy.signal it pulls in) is imported on first use, not with the router
+    from statsmodels.tsa.seasonal import seasonal_decompose
+    return seasonal_decompose(values, model='additive', period=period).seasonal
+
 class Compare2Comapnies:
+    @timed("market", "clean")
     def _clean(self, file: UploadFile):
         if not (file.filename.endswith(".csv") or file.filename.endswith(".tsv")):
             raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE, detail="Only CSV or TSV files allowed")
@@ -53,16 +67,77 @@ class Compare2Comapnies:
             "ma_long": self._replace_nan(ma_long)
         }
 
+    @timed("market", "seasonality")
     def get_seasonality(self, close_price, period):
         clean_close = close_price.dropna()
         if len(clean_close) < period * 2: 
             empty_series = pd.Series(index=close_price.index, dtype=float)
             return self._replace_nan(empty_series)
             
+        from statsmodels.tsa.seasonal import seasonal_decompose
         decompose_result = seasonal_decompose(clean_close, model='additive', period=period)
         seasonality = decompose_result.seasonal.reindex(close_price.index)
         return self._replace_nan(seasonality)
 
+    def align_closes(self, files: list[UploadFile]):
+        if len(files) < 2:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="At least two files are required for comparison.")
+
+        closes = pd.concat([self._clean(file)['Close'] for file in files], axis=1, join='inner')
+        closes.columns = range(len(files))
+        if closes.empty:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The files share no common dates.")
+        return closes.sort_index()
+
+    @timed("market", "seasonality")
+    def get_seasonality_matrix(self, closes: pd.DataFrame, period):
+        """
+        Seasonal component of every column, split into one column block per
+        worker so a large comparison costs about one block's decomposition.
+        """
+        values = closes.to_numpy(dtype=float)
+        if len(values) < period * 2:
+            return np.full(values.shape, np.nan)
+        if values.size < SEASON_POOL_MIN_POINTS or values.shape[1] == 1:
+            return _seasonal_columns(values, period)
+
+        blocks = np.array_split(values, min(max(executor.workers("season"), 1), values.shape[1]), axis=1)
+        return np.hstack(executor.map_blocking("season", _seasonal_columns, blocks, [period] * len(blocks)))
+
+    @staticmethod
+    def _columns(frame):
+        values = frame.to_numpy(dtype=float) if isinstance(frame, pd.DataFrame) else frame
+        columns = values.T.astype(object)
+        columns[np.isnan(values.T)] = None
+        return columns.tolist()
+
+    def compare_many(self, files: list[UploadFile], ma_short: int, ma_long: int, season_period: int):
+        closes = self.align_closes(files)
+
+        pct_comp = ((closes / closes.iloc[0]) - 1) * 100
+        ma_short_values = closes.rolling(window=ma_short).mean()
+        ma_long_values = closes.rolling(window=ma_long).mean()
+        seasonality = self.get_seasonality_matrix(closes, season_period)
+
+        return {
+            "time_axis": closes.index.strftime('%Y-%m-%d').tolist(),
+            "assets": [
+                {
+                    "filename": file.filename,
+                    "pct_comparison": pct,
+                    "ma_cross": {"ma_short": short, "ma_long": long},
+                    "seasonality": season,
+                }
+                for file, pct, short, long, season in zip(
+                    files,
+                    self._columns(pct_comp),
+                    self._columns(ma_short_values),
+                    self._columns(ma_long_values),
+                    self._columns(seasonality),
+                )
+            ]
+        }
+
     def compare(self, files: list[UploadFile], ma_short: int, ma_long: int, season_period: int):
         df1, df2 = self.clean_2_files(files)
         
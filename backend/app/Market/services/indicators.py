@@ -0,0 +1,254 @@
+import math
+import threading
+import uuid
+from collections import OrderedDict, deque
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException, status
+
+VOL_WINDOW = 20  # same as MarketAnalyzer.get_volatility
+TRADING_DAYS = 252
+MAX_SWEEP_POINTS = 5_000_000  # windows * bars per sweep request
+
+
+class RollingWindow:
+    """
+    Mean and sample std (ddof=1, like pandas rolling) of the last `size`
+    values, kept as running sums so each push is O(1). Sums are taken around
+    a shift close to the data to avoid cancellation on large prices, and are
+    recomputed exactly every `size` pushes so rounding errors cannot build up.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.values = deque(maxlen=size)
+        self.shift = 0.0
+        self.sum = 0.0
+        self.sumsq = 0.0
+        self._pushes = 0
+
+    def push(self, x):
+        if not self.values:
+            self.shift = x
+        if len(self.values) == self.size:
+            old = self.values[0] - self.shift
+            self.sum -= old
+            self.sumsq -= old * old
+        self.values.append(x)
+        d = x - self.shift
+        self.sum += d
+        self.sumsq += d * d
+
+        self._pushes += 1
+        if self._pushes >= self.size:
+            self._resync()
+
+    def _resync(self):
+        n = len(self.values)
+        self.shift = math.fsum(self.values) / n
+        self.sum = math.fsum(v - self.shift for v in self.values)
+        self.sumsq = math.fsum((v - self.shift) ** 2 for v in self.values)
+        self._pushes = 0
+
+    @property
+    def full(self):
+        return len(self.values) == self.size
+
+    def mean(self):
+        return self.shift + self.sum / self.size if self.full else None
+
+    def std(self):
+        if not self.full or self.size < 2:
+            return None
+        var = (self.sumsq - self.sum * self.sum / self.size) / (self.size - 1)
+        return math.sqrt(max(var, 0.0))
+
+
+class IndicatorEngine:
+    """
+    Rolling state of one instrument: the last `window` closes for MA and
+    Bollinger bands and the last VOL_WINDOW daily returns for volatility.
+    Each new bar updates all three in O(1) and yields the same values as
+    MarketAnalyzer's pandas rolling computations over the full history.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.prices = RollingWindow(window)
+        self.returns = RollingWindow(VOL_WINDOW)
+        self.last_close = None
+        self.last_date = None
+        self.lock = threading.Lock()
+
+    def push(self, date, close):
+        # seed() and append() only let positive closes through, so the return is always defined
+        if self.last_close is not None:
+            self.returns.push(close / self.last_close - 1)
+        self.prices.push(close)
+        self.last_close = close
+        self.last_date = date
+
+        ma = self.prices.mean()
+        std = self.prices.std()
+        vol = self.returns.std()
+        return {
+            "date": date.strftime('%Y-%m-%d'),
+            "close": close,
+            "ma": ma,
+            "upper": None if std is None else ma + 2 * std,
+            "lower": None if std is None else ma - 2 * std,
+            "volatility": None if vol is None else vol * math.sqrt(TRADING_DAYS),
+        }
+
+    def seed(self, close_price: pd.Series):
+        """Only the tail that can still affect a future bar is replayed."""
+        tail = close_price.iloc[-(max(self.window, VOL_WINDOW + 1)):]
+        if tail.empty or not (np.isfinite(tail.to_numpy()) & (tail.to_numpy() > 0)).all():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="The last closes must be positive numbers to follow the instrument live"
+            )
+        row = None
+        for date, close in tail.items():
+            row = self.push(date, float(close))
+        return [row]
+
+    def _parse(self, bars):
+        """Dates and closes of `bars`, all validated before the first one is pushed."""
+        parsed = []
+        last_date = self.last_date
+        for bar in bars:
+            try:
+                date = pd.Timestamp(bar.date)
+            except (ValueError, OverflowError):
+                date = pd.NaT
+            if pd.isna(date):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Bar date {bar.date!r} is not a valid date")
+            if date.tzinfo is not None:
+                date = date.tz_convert(None)  # seeded dates are naive: compare in UTC
+            if not (math.isfinite(bar.close) and bar.close > 0):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Bar {bar.date} must have a positive close")
+            if date <= last_date:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Bar {bar.date} is not newer than the previous bar {last_date.strftime('%Y-%m-%d')}"
+                )
+            parsed.append((date, float(bar.close)))
+            last_date = date
+        return parsed
+
+    def append(self, bars):
+        """Pushes every bar or, if any of them is invalid, none (400)."""
+        with self.lock:
+            return [self.push(date, close) for date, close in self._parse(bars)]
+
+
+class IndicatorStore:
+    """Thread-safe LRU of live instruments, keyed by the id handed out at seed time."""
+
+    def __init__(self, max_instruments=1024):
+        self.max_instruments = max_instruments
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, engine):
+        instrument_id = str(uuid.uuid4())
+        with self._lock:
+            self._items[instrument_id] = engine
+            while len(self._items) > self.max_instruments:
+                self._items.popitem(last=False)
+        return instrument_id
+
+    def get(self, instrument_id):
+        with self._lock:
+            engine = self._items.get(instrument_id)
+            if engine is not None:
+                self._items.move_to_end(instrument_id)
+        if engine is None:
+            raise HTTPException(status_code=404, detail="Instrument not found. You must seed it first.")
+        return engine
+
+
+indicator_store = IndicatorStore()
+
+
+def _tail(instrument_id, rows):
+    return {
+        "instrument_id": instrument_id,
+        "time_axis": [row["date"] for row in rows],
+        "close": [row["close"] for row in rows],
+        "MA_overlay": [row["ma"] for row in rows],
+        "Bollinger_Bands": {
+            "Moving average": [row["ma"] for row in rows],
+            "upper": [row["upper"] for row in rows],
+            "lower": [row["lower"] for row in rows],
+        },
+        "volatility": [row["volatility"] for row in rows],
+    }
+
+
+def seed_instrument(close_price: pd.Series, window: int):
+    engine = IndicatorEngine(window)
+    rows = engine.seed(close_price)
+    return _tail(indicator_store.add(engine), rows)
+
+
+def append_bars(instrument_id: str, bars):
+    return _tail(instrument_id, indicator_store.get(instrument_id).append(bars))
+
+
+def rolling_sweep(values: np.ndarray, windows):
+    """
+    Rolling mean and sample std (ddof=1) for every window size at once, as
+    (len(windows), len(values)) matrices with NaN where the window is not yet
+    full. Everything comes from one cumulative sum and one cumulative sum of
+    squares; values are centred on their mean first so the squared sums do
+    not cancel on large prices. A cumulative count of price changes marks
+    constant windows, whose std is exactly 0 as in pandas rather than the
+    square root of rounding noise.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    shift = values.mean()
+    centred = values - shift
+    csum = np.concatenate([[0.0], np.cumsum(centred)])
+    csum_sq = np.concatenate([[0.0], np.cumsum(centred * centred)])
+    changes = np.concatenate([[0], np.cumsum(values[1:] != values[:-1])])
+
+    w = np.asarray(windows, dtype=np.int64)[:, None]
+    end = np.arange(1, len(values) + 1)[None, :]
+    start = np.maximum(end - w, 0)
+    full = end >= w
+
+    s1 = csum[end] - csum[start]
+    s2 = csum_sq[end] - csum_sq[start]
+    mean = np.where(full, shift + s1 / w, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        var = (s2 - s1 * s1 / w) / (w - 1)
+    var[changes[end - 1] == changes[np.minimum(start, len(values) - 1)]] = 0.0
+    std = np.where(full & (w > 1), np.sqrt(np.maximum(var, 0.0)), np.nan)
+    return mean, std
+
+
+def _matrix(values):
+    rows = values.astype(object)
+    rows[np.isnan(values)] = None
+    return rows.tolist()
+
+
+def sweep_indicators(close_price: pd.Series, windows: list[int]):
+    if not windows or any(w < 1 for w in windows):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Windows must be positive integers")
+    if len(windows) * len(close_price) > MAX_SWEEP_POINTS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Sweep too large: windows x bars must stay under {MAX_SWEEP_POINTS}"
+        )
+
+    mean, std = rolling_sweep(close_price.to_numpy(), windows)
+    return {
+        "time_axis": close_price.index.strftime('%Y-%m-%d').tolist(),
+        "windows": windows,
+        "moving_average": _matrix(mean),
+        "rolling_std": _matrix(std),
+    }
@@ -1,5 +1,13 @@
-from fastapi import FastAPI, APIRouter, UploadFile, File
-from app.MicroBiome.services.profiling import GetProfile
+from fastapi import FastAPI, APIRouter, UploadFile, File, BackgroundTasks, Header, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from typing import Literal, Optional
+from app.core import executor
+from app.MicroBiome.schemas.schema import BetaDiversityOutput, EmbeddingInfo, ProfileAppendOutput, ProfilingOutput
+from app.MicroBiome.services.profiling import GetProfile, bacteria_columns_of, read_table
+from app.MicroBiome.services.cohort import stream_cohort_profiles
+from app.MicroBiome.services.diversity import beta_diversity
+from app.MicroBiome.services.profile_store import append_weeks, get_stored_profile, seed_profile
+from app.MicroBiome.services.embedding import REFRESH_ENABLED, get_reference_embedding, refresh_authorized, refresh_reference_embedding
 
 
 
@@ -8,4 +16,66 @@ microbiome_rouuter = APIRouter()
 
 @microbiome_rouuter.post('/microbiome')
 async def analyze(file : UploadFile = File(...)):
-    return await GetProfile(file)
\ No newline at end of file
+    return await executor.run("microbiome", GetProfile, file)
+
+
+@microbiome_rouuter.post('/microbiome/cohort')
+def analyze_cohort(file : UploadFile = File(...)):
+    # One NDJSON line per participant, each shaped like the /microbiome response
+    return StreamingResponse(stream_cohort_profiles(file), media_type="application/x-ndjson")
+
+
+@microbiome_rouuter.post('/microbiome/profiles', response_model=ProfilingOutput)
+def store_profile(file : UploadFile = File(...)):
+    # Same response as /microbiome, and the profile is kept server-side for appends
+    return seed_profile(file)
+
+
+@microbiome_rouuter.post('/microbiome/profiles/{participant_id}/append', response_model=ProfileAppendOutput)
+def append_profile(participant_id: str, file : UploadFile = File(...)):
+    return append_weeks(participant_id, file)
+
+
+@microbiome_rouuter.get('/microbiome/profiles/{participant_id}', response_model=ProfilingOutput)
+def stored_profile(participant_id: str):
+    return get_stored_profile(participant_id)
+
+
+@microbiome_rouuter.post('/microbiome/diversity', response_model=BetaDiversityOutput)
+def analyze_diversity(
+    file : UploadFile = File(...),
+    metric: Literal["braycurtis", "aitchison"] = "braycurtis",
+    level: Literal["samples", "participants"] = "samples",
+    workers: int = Query(1, ge=1, le=8),
+):
+    # samples: every time point (of one participant or a whole cohort); participants: mean profiles
+    return beta_diversity(file, metric, level, workers)
+
+
+@microbiome_rouuter.get('/microbiome/embedding', response_model=EmbeddingInfo)
+def embedding_info():
+    embedding = get_reference_embedding()
+    if embedding is None:
+        raise HTTPException(status_code=404, detail="No reference embedding loaded; PCA is fit per upload.")
+    return embedding.info()
+
+
+@microbiome_rouuter.post('/microbiome/embedding/refresh', status_code=status.HTTP_202_ACCEPTED)
+def refresh_embedding(
+    background_tasks: BackgroundTasks,
+    file : UploadFile = File(...),
+    x_refresh_token: Optional[str] = Header(None),
+):
+    # Changes what every later upload is projected onto: without MICROBIOME_REFRESH_TOKEN the endpoint does not exist
+    if not REFRESH_ENABLED:
+        raise HTTPException(status_code=404, detail="Embedding refresh is disabled")
+    if not refresh_authorized(x_refresh_token):
+        raise HTTPException(status_code=403, detail="Invalid refresh token")
+    # Parsed now so bad uploads fail fast; the refit itself runs after the response
+    df = read_table(file)
+    abundances = df[bacteria_columns_of(df)].fillna(0.0)
+    if len(abundances) < 2:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="At least two samples are needed to refresh the embedding")
+    background_tasks.add_task(refresh_reference_embedding, abundances)
+    embedding = get_reference_embedding()
+    return {"status": "refresh scheduled", "current_version": embedding.version if embedding else None}
@@ -14,3 +14,24 @@ class ProfilingOutput(BaseModel):
     pca_y: List[float]
     protective_bacteria : Dict[str, List[float]]
     opportunistic_bacteria : Dict[str, List[float]]
+
+
+class ProfileAppendOutput(ProfilingOutput):
+    # Series cover only the appended rows; top5 values follow the updated top taxa
+    total_weeks: int
+    top5_changed: bool
+
+
+class EmbeddingInfo(BaseModel):
+    version: int
+    n_samples_seen: int
+    n_taxa: int
+    explained_variance_ratio: List[float]
+
+
+class BetaDiversityOutput(BaseModel):
+    metric: str
+    level: str
+    labels: List[str]
+    # Upper triangle row by row: d(0,1), d(0,2), ..., d(1,2), ... (scipy squareform order)
+    condensed: List[float]
@@ -0,0 +1,126 @@
+import json
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException, UploadFile, status
+from fastapi.encoders import jsonable_encoder
+
+from app.MicroBiome.schemas.schema import ProfilingOutput
+from app.MicroBiome.services.abundance import SparseAbundances, fit_pca_coordinates
+from app.MicroBiome.services.embedding import get_reference_embedding
+from app.MicroBiome.services.profiling import BAD_BUGS, GOOD_BUGS, bacteria_columns_of, read_table
+
+PARTICIPANT = 'Participant ID'
+
+
+def _fill_missing(df, codes, columns):
+    # Same filling as PatientProfile.profile, but with each participant's own means
+    numeric = df[columns].select_dtypes('number').columns
+    df[numeric] = df[numeric].fillna(df[numeric].groupby(codes).transform('mean'))
+    df[columns] = df[columns].fillna(0.0)
+    return df
+
+
+class CohortMetrics:
+    """
+    Every PatientProfile metric for a table holding many participants,
+    computed once over the whole sparse (rows x taxa) matrix. Per-participant
+    reductions (mean abundances for the top taxa) are one grouped sum
+    instead of one pandas pass per participant. PCA coordinates come
+    from the reference embedding, or from one PCA over the whole cohort when
+    none is loaded, so they are comparable across participants.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        if PARTICIPANT not in df.columns:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Cohort tables need a '{PARTICIPANT}' column")
+
+        participants = df[PARTICIPANT].fillna("Unknown").astype(str)
+        self.codes, self.participants = pd.factorize(participants, sort=False)
+        self.bacteria_columns = bacteria_columns_of(df)
+        taxa = set(self.bacteria_columns)
+        other_columns = [col for col in df.columns if col not in taxa]
+        # Shallow copy: only the few metadata columns are replaced, the taxa block is shared
+        self.df = _fill_missing(df.copy(deep=False), self.codes, other_columns)
+        self.abundances = SparseAbundances.from_frame(self.df, self.bacteria_columns, self.codes)
+        self.good = [c for c in GOOD_BUGS if c in self.df.columns]
+        self.bad = [c for c in BAD_BUGS if c in self.df.columns]
+
+        # Row indices of every participant, in upload order
+        order = np.argsort(self.codes, kind='stable')
+        counts = np.bincount(self.codes, minlength=len(self.participants))
+        self.rows = np.split(order, np.cumsum(counts)[:-1])
+        self.counts = counts
+
+    def shannon_index(self):
+        return self.abundances.shannon_index()
+
+    def health_index(self):
+        return self.abundances.health_index(GOOD_BUGS, BAD_BUGS)
+
+    def top_taxa(self, k=4):
+        """(participants, k) column indices of the largest mean abundances, ties to the first column."""
+        means = self.abundances.group_means(self.codes, len(self.participants))
+        return self.abundances.top_k(means, k)
+
+    def pca_coordinates(self):
+        embedding = get_reference_embedding()
+        if embedding is not None:
+            return embedding.project_abundances(self.abundances)
+        return fit_pca_coordinates(self.abundances.clr_dense())
+
+    def echoed_columns(self):
+        """Exact uploaded values (participant-mean filled) of the taxa sent back as-is."""
+        top_columns = {self.bacteria_columns[i] for i in np.unique(self.top)}
+        echoed = top_columns.union(self.good, self.bad)
+        columns = [col for col in self.bacteria_columns if col in echoed]
+        return _fill_missing(self.df[columns].copy(), self.codes, columns)
+
+    def compute(self):
+        self.shannon = self.shannon_index()
+        self.health = self.health_index()
+        self.top = self.top_taxa()
+        self.pcs = self.pca_coordinates()
+        self.echoed = self.echoed_columns()
+        return self
+
+    def profiles(self):
+        shannon, health, top, pcs, echoed = self.shannon, self.health, self.top, self.pcs, self.echoed
+        total = self.abundances.row_totals()
+
+        weeks = self.df['week_num'].to_numpy() if 'week_num' in self.df.columns else None
+        fecalcal = self.df['fecalcal'].to_numpy() if 'fecalcal' in self.df.columns else None
+
+        for index, rows in enumerate(self.rows):
+            top_idx = top[index]
+            top_names = [self.bacteria_columns[i] for i in top_idx]
+            top5 = {name: echoed[name].to_numpy()[rows].tolist() for name in top_names}
+            top5['others'] = (total[rows] - self.abundances.columns_dense(top_idx, rows).sum(axis=1)).tolist()
+
+            yield ProfilingOutput(
+                participant_id=self.participants[index],
+                weeks=weeks[rows].tolist() if weeks is not None else list(range(len(rows))),
+                fecalcal=fecalcal[rows].tolist() if fecalcal is not None else [],
+                top5_bacteria=top5,
+                top5_names=top_names + ['others'],
+                healthy_index=health[rows].tolist(),
+                shannon_index=shannon[rows].tolist(),
+                pca_x=pcs[rows, 0].tolist(),
+                pca_y=pcs[rows, 1].tolist(),
+                protective_bacteria={col: echoed[col].to_numpy()[rows].tolist() for col in self.good},
+                opportunistic_bacteria={col: echoed[col].to_numpy()[rows].tolist() for col in self.bad},
+            )
+
+
+def _line(payload: ProfilingOutput):
+    return json.dumps(jsonable_encoder(payload), ensure_ascii=False) + "\n"
+
+
+def stream_cohort_profiles(file: UploadFile):
+    """
+    Parses and computes everything before the response starts (so bad input
+    still gets a 4xx), then returns a generator of one NDJSON line per
+    participant.
+    """
+    metrics = CohortMetrics(read_table(file)).compute()
+    return (_line(profile) for profile in metrics.profiles())
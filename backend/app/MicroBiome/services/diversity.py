@@ -0,0 +1,195 @@
+"""
+Beta diversity: pairwise Bray-Curtis and Aitchison distances between
+microbiome samples, returned as a condensed matrix (the upper triangle, row
+by row, as scipy.spatial.distance.squareform expects).
+
+Samples are split into row blocks sized from a memory budget and every block
+pair is one vectorized kernel call, so the full n x n matrix never exists;
+block pairs can run on several threads.
+
+For cohorts too large for an HTTP response, from the backend folder:
+    python -m app.MicroBiome.services.diversity cohort.csv --metric aitchison --out distances.npy
+"""
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from fastapi import HTTPException, UploadFile, status
+
+from app.core.metrics import timed
+from app.MicroBiome.services.abundance import SparseAbundances
+from app.MicroBiome.services.profiling import bacteria_columns_of, read_table
+
+PARTICIPANT = 'Participant ID'
+METRICS = ('braycurtis', 'aitchison')
+MEMORY_BUDGET = 256 * 1024 ** 2  # bytes of block temporaries across all workers
+MIN_BLOCK_ROWS = 64
+MAX_RESPONSE_PAIRS = 5_000_000  # condensed entries sent back as JSON
+
+
+def block_rows_for(n_samples, n_taxa, workers=1, memory_budget=MEMORY_BUDGET):
+    """
+    Largest row block b whose temporaries fit the per-worker budget: two dense
+    (b, taxa) float64 blocks plus two (b, b) ones (distances and a scratch).
+    """
+    budget = memory_budget / max(workers, 1) / 8
+    b = (-2 * n_taxa + math.sqrt(4 * n_taxa ** 2 + 8 * budget)) / 4
+    return int(min(n_samples, max(MIN_BLOCK_ROWS, b)))
+
+
+def condensed_index(n, row):
+    """Offset of pair (row, row + 1) in the condensed matrix of n samples."""
+    return n * row - row * (row + 1) // 2
+
+
+class PairwiseDistances:
+    """
+    Blocked pairwise distances between the rows of a SparseAbundances matrix.
+
+    braycurtis: sum|u - v| / sum(u + v), with scipy's cdist on dense blocks
+    restricted to the taxa present in either block.
+    aitchison: Euclidean distance between CLR rows. With S = log1p(x / pc)
+    and m its row mean, clr = S - m, so
+        d(a, b)^2 = |Sa|^2 + |Sb|^2 - 2 Sa.Sb - taxa * (ma - mb)^2
+    and each block is one sparse x dense product; the dense CLR is never built.
+    """
+
+    def __init__(self, abundances: SparseAbundances, metric='braycurtis'):
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric {metric}, expected one of {METRICS}")
+        self.metric = metric
+        self.n, self.n_taxa = abundances.shape
+        if metric == 'braycurtis':
+            self.X = abundances.X.astype(np.float64)
+        else:
+            self.X = abundances.log_ratio()
+            self.sq_norms = np.asarray(self.X.multiply(self.X).sum(axis=1)).ravel()
+            self.row_means = np.asarray(self.X.sum(axis=1)).ravel() / self.n_taxa
+
+    def block(self, rows, cols):
+        if self.metric == 'braycurtis':
+            from scipy.spatial.distance import cdist
+
+            A, B = self.X[rows], self.X[cols]
+            taxa = np.union1d(A.indices, B.indices)
+            D = cdist(A[:, taxa].toarray(), B[:, taxa].toarray(), 'braycurtis')
+            return np.nan_to_num(D, copy=False, nan=0.0)  # two empty samples are identical
+
+        # In place from here on: one (b, b) result plus one scratch block
+        D = self.X[rows] @ self.X[cols].toarray().T  # sparse x dense lands straight in a dense block
+        D *= -2
+        D += self.sq_norms[rows, None]
+        D += self.sq_norms[None, cols]
+        scratch = np.subtract.outer(self.row_means[rows], self.row_means[cols])
+        np.square(scratch, out=scratch)
+        scratch *= self.n_taxa
+        D -= scratch
+        np.maximum(D, 0.0, out=D)
+        return np.sqrt(D, out=D)
+
+    @timed("microbiome", "beta_diversity")
+    def condensed(self, workers=1, memory_budget=MEMORY_BUDGET, out=None, dtype=np.float64):
+        """
+        Fills `out` (allocated if None, may be a np.memmap) with the condensed
+        distances. Block pairs write disjoint slices, so workers need no lock.
+        """
+        n = self.n
+        size = n * (n - 1) // 2
+        if out is None:
+            out = np.empty(size, dtype=dtype)
+        elif len(out) != size:
+            raise ValueError(f"out must hold {size} distances, got {len(out)}")
+
+        b = block_rows_for(n, self.n_taxa, workers, memory_budget)
+        starts = range(0, n, b)
+        pairs = [(i, j) for i in starts for j in starts if j >= i]
+
+        def run(pair):
+            i, j = pair
+            rows = np.arange(i, min(i + b, n))
+            cols = np.arange(j, min(j + b, n))
+            D = self.block(rows, cols)
+            for k, row in enumerate(rows):
+                first = max(j, row + 1)  # only pairs above the diagonal
+                if first >= cols[-1] + 1:
+                    continue
+                offset = condensed_index(n, row) + (first - row - 1)
+                out[offset:offset + cols[-1] + 1 - first] = D[k, first - j:]
+
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(run, pairs))
+        else:
+            for pair in pairs:
+                run(pair)
+        return out
+
+
+def _samples(df: pd.DataFrame, level):
+    """SparseAbundances of the rows to compare and their labels."""
+    participants = df[PARTICIPANT].fillna("Unknown").astype(str) if PARTICIPANT in df.columns \
+        else pd.Series("Unknown", index=df.index)
+    codes, names = pd.factorize(participants, sort=False)
+    columns = bacteria_columns_of(df)
+    abundances = SparseAbundances.from_frame(df, columns, codes)
+
+    if level == 'participants':
+        # Each participant's mean profile across its time points
+        means = abundances.group_means(codes, len(names))
+        return SparseAbundances(sp.csr_matrix(means.astype(np.float32)), columns), list(names)
+
+    if 'External ID' in df.columns:
+        labels = df['External ID'].astype(str).tolist()
+    elif 'week_num' in df.columns:
+        labels = [f"{p} week {w}" for p, w in zip(participants, df['week_num'])]
+    else:
+        labels = [str(i) for i in range(len(df))]
+    return abundances, labels
+
+
+def beta_diversity(file: UploadFile, metric='braycurtis', level='samples', workers=1):
+    df = read_table(file)
+    abundances, labels = _samples(df, level)
+    n = len(labels)
+    if n < 2:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Need at least 2 samples to compare")
+    if n * (n - 1) // 2 > MAX_RESPONSE_PAIRS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Too many pairs for one response (over {MAX_RESPONSE_PAIRS}); use level=participants or the CLI"
+        )
+
+    condensed = PairwiseDistances(abundances, metric).condensed(workers=workers)
+    return {
+        "metric": metric,
+        "level": level,
+        "labels": labels,
+        "condensed": condensed.tolist(),
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("table", help="Cohort CSV file")
+    parser.add_argument("--metric", choices=METRICS, default="braycurtis")
+    parser.add_argument("--level", choices=["samples", "participants"], default="samples")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--memory-mb", type=int, default=MEMORY_BUDGET // 1024 ** 2)
+    parser.add_argument("--out", required=True, help="Output .npy file (float32 condensed distances)")
+    args = parser.parse_args()
+
+    abundances, labels = _samples(pd.read_csv(args.table), args.level)
+    n = len(labels)
+    out = np.lib.format.open_memmap(args.out, mode='w+', dtype=np.float32, shape=(n * (n - 1) // 2,))
+    PairwiseDistances(abundances, args.metric).condensed(args.workers, args.memory_mb * 1024 ** 2, out)
+    out.flush()
+    print(f"Saved {len(out)} {args.metric} distances between {n} samples to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
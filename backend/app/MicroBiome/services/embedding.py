@@ -0,0 +1,220 @@
+"""
+Reference PCA embedding for microbiome CLR profiles.
+
+The embedding is fit once (incrementally, so it can keep absorbing new cohort
+data) and persisted next to the other model artifacts. Profiling then only
+projects samples onto its fixed axes, so coordinates are comparable across
+patients and uploads and cost one matrix multiply.
+
+Build or rebuild it from the backend folder:
+    python -m app.MicroBiome.services.embedding app/MicroBiome/test_patients/*.csv
+
+Refreshes at runtime (POST /microbiome/embedding/refresh, behind
+MICROBIOME_REFRESH_TOKEN) never touch that built file: each new version is
+written to MICROBIOME_EMBEDDING_DIR, and the latest version found there is
+the one loaded.
+"""
+import copy
+import hmac
+import os
+import re
+import threading
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from app.core import executor
+from app.core.metrics import count_model_call, timed
+from app.core.models import model_registry
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EMBEDDING_PATH = os.path.join(BASE_PATH, 'notebook', 'reference_pca.joblib')
+BACKEND_DIR = os.path.dirname(os.path.dirname(BASE_PATH))
+RUNTIME_DIR = os.environ.get("MICROBIOME_EMBEDDING_DIR") or os.path.join(BACKEND_DIR, "temp_microbiome_embeddings")
+KEEP_VERSIONS = 5  # older refreshed versions are deleted
+REFRESH_TOKEN = os.environ.get("MICROBIOME_REFRESH_TOKEN") or None
+REFRESH_ENABLED = REFRESH_TOKEN is not None
+PSEUDOCOUNT = 1e-6
+N_COMPONENTS = 2
+FIT_BATCH = 512
+
+
+def clr(X):
+    """Centred log-ratio of a (samples, taxa) abundance matrix, as in PatientProfile."""
+    X_log = np.log(np.asarray(X, dtype=np.float64) + PSEUDOCOUNT)
+    return X_log - X_log.mean(axis=1, keepdims=True)
+
+
+def _batches(X):
+    # partial_fit needs at least N_COMPONENTS rows per batch: fold a short tail into the previous batch
+    starts = list(range(0, len(X), FIT_BATCH))
+    if len(starts) > 1 and len(X) - starts[-1] < N_COMPONENTS:
+        starts.pop()
+    bounds = starts[1:] + [len(X)]
+    return [X[start:end] for start, end in zip(starts, bounds)]
+
+
+class ReferenceEmbedding:
+    """
+    Fixed CLR -> 2-D projection over a fixed list of taxa. Uploads are aligned
+    to `taxa` (missing taxa count as zero abundance, unknown ones are ignored)
+    so every sample lands in the same space.
+    """
+
+    def __init__(self, taxa, model, version=1, signs=None):
+        self.taxa = list(taxa)
+        self._taxa_index = {name: j for j, name in enumerate(self.taxa)}
+        self.model = model
+        self.version = version
+        # Refits may flip component signs; keep each axis pointing the same way across versions
+        self.signs = np.ones(N_COMPONENTS) if signs is None else signs
+        self.mean = model.mean_.copy()
+        self.components = model.components_ * self.signs[:, None]
+
+    @classmethod
+    def fit(cls, abundances: pd.DataFrame):
+        if len(abundances) < N_COMPONENTS:
+            raise ValueError(f"Need at least {N_COMPONENTS} samples to fit the embedding")
+        from sklearn.decomposition import IncrementalPCA
+
+        model = IncrementalPCA(n_components=N_COMPONENTS)
+        for batch in _batches(clr(abundances.to_numpy(dtype=np.float64))):
+            model.partial_fit(batch)
+        return cls(abundances.columns, model)
+
+    def clr_matrix(self, df: pd.DataFrame):
+        return clr(df.reindex(columns=self.taxa, fill_value=0.0).fillna(0.0).to_numpy(dtype=np.float64))
+
+    def project(self, X_clr):
+        return (X_clr - self.mean) @ self.components.T
+
+    @timed("microbiome", "pca_projection")
+    def project_abundances(self, abundances):
+        """
+        Same as project(clr_matrix(df)) straight from SparseAbundances: with
+        S = log1p(X / pc) (zero wherever X is), clr(X) = S - rowmean(S), so
+        the projection is one sparse product plus rank-one corrections.
+        """
+        shared = [name for name in abundances.columns if name in self._taxa_index]
+        up_idx = [abundances.index[name] for name in shared]
+        ref_idx = [self._taxa_index[name] for name in shared]
+
+        S = abundances.log_ratio()[:, up_idx]
+        row_mean = np.asarray(S.sum(axis=1)).ravel() / len(self.taxa)
+        projected = S @ self.components[:, ref_idx].T
+        count_model_call("microbiome_embedding")
+        return projected - row_mean[:, None] * self.components.sum(axis=1) - self.mean @ self.components.T
+
+    def updated(self, df: pd.DataFrame):
+        """A new version that has also seen the rows of `df`; this one is left untouched."""
+        X_clr = self.clr_matrix(df)
+        if len(X_clr) < N_COMPONENTS:
+            raise ValueError(f"Need at least {N_COMPONENTS} samples to update the embedding")
+        model = copy.deepcopy(self.model)
+        for batch in _batches(X_clr):
+            model.partial_fit(batch)
+        signs = np.where(np.sum(model.components_ * self.components, axis=1) < 0, -1.0, 1.0)
+        return ReferenceEmbedding(self.taxa, model, self.version + 1, signs)
+
+    def info(self):
+        return {
+            "version": self.version,
+            "n_samples_seen": int(self.model.n_samples_seen_),
+            "n_taxa": len(self.taxa),
+            "explained_variance_ratio": self.model.explained_variance_ratio_.tolist(),
+        }
+
+    def save(self, path=EMBEDDING_PATH):
+        tmp = path + ".tmp"
+        joblib.dump({"taxa": self.taxa, "model": self.model, "version": self.version, "signs": self.signs}, tmp)
+        os.replace(tmp, path)  # readers never see a half-written file
+
+    @classmethod
+    def load(cls, path=EMBEDDING_PATH):
+        state = joblib.load(path)
+        return cls(state["taxa"], state["model"], state["version"], state["signs"])
+
+
+def refresh_authorized(token):
+    return REFRESH_ENABLED and token is not None and hmac.compare_digest(token.encode(), REFRESH_TOKEN.encode())
+
+
+def _runtime_versions():
+    """Refreshed versions saved in RUNTIME_DIR, as (version, path), oldest first."""
+    if not os.path.isdir(RUNTIME_DIR):
+        return []
+    versions = []
+    for entry in os.scandir(RUNTIME_DIR):
+        match = re.fullmatch(r"reference_pca_v(\d+)\.joblib", entry.name)
+        if match:
+            versions.append((int(match.group(1)), entry.path))
+    return sorted(versions)
+
+
+def _save_runtime_version(embedding):
+    os.makedirs(RUNTIME_DIR, exist_ok=True)
+    embedding.save(os.path.join(RUNTIME_DIR, f"reference_pca_v{embedding.version}.joblib"))
+    for _, path in _runtime_versions()[:-KEEP_VERSIONS]:
+        os.remove(path)
+
+
+def _load_embedding():
+    versions = _runtime_versions()
+    if versions:
+        return ReferenceEmbedding.load(versions[-1][1])
+    if not os.path.exists(EMBEDDING_PATH):
+        raise FileNotFoundError("Reference embedding not built; PCA is fit per upload")
+    return ReferenceEmbedding.load()
+
+
+# Loaded on first use or by the startup warm-up; profiling falls back to per-upload PCA without it
+embedding_model = model_registry.register("microbiome_embedding", _load_embedding)
+_refresh_lock = threading.Lock()
+
+
+def get_reference_embedding():
+    try:
+        return embedding_model.get()
+    except Exception:
+        return None
+
+
+def refresh_reference_embedding(abundances: pd.DataFrame):
+    """
+    Folds new cohort rows into the embedding, saves it as a new runtime
+    version and swaps it in, here and in the /microbiome worker processes.
+    Meant for a background task: requests keep projecting with the previous
+    version until the swap, and refreshes run one at a time.
+    """
+    with _refresh_lock:
+        current = get_reference_embedding()
+        try:
+            updated = current.updated(abundances) if current is not None else ReferenceEmbedding.fit(abundances)
+            _save_runtime_version(updated)
+        except Exception as error:
+            print(f"❌ Microbiome embedding refresh failed: {error}")
+            return
+        embedding_model.set(updated)
+        # Workers loaded the previous version at start: new ones load the version just saved
+        executor.restart("microbiome")
+        print(f"✅ Microbiome reference embedding refreshed to v{updated.version}.")
+
+
+def main():
+    import argparse
+    from app.MicroBiome.services.profiling import bacteria_columns_of
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("tables", nargs="+", help="Cohort CSV files")
+    args = parser.parse_args()
+
+    df = pd.concat([pd.read_csv(path) for path in args.tables], ignore_index=True)
+    abundances = df[bacteria_columns_of(df)].fillna(0.0)
+    embedding = ReferenceEmbedding.fit(abundances)
+    embedding.save()
+    print(f"Saved {EMBEDDING_PATH}: {embedding.info()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""
+Server-side microbiome profiles that grow week by week.
+
+A participant's profile is seeded once from their history and then extended
+with new stool samples: indices and PCA coordinates are computed for the new
+rows only, and running column sums keep the top taxa selection up to date,
+so an append costs O(new rows).
+
+Live profiles sit in an LRU in memory. Every batch of rows is also appended
+to a per-participant NDJSON log in PROFILE_DIR (MICROBIOME_PROFILE_DIR), and
+an evicted (or, after a restart, forgotten) profile is rebuilt by replaying
+its log. PCA coordinates of one profile always come from a single version of
+the reference embedding: once it is refreshed, a profile is re-projected by
+replaying its log before it is read or extended.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from fastapi import HTTPException, UploadFile, status
+
+from app.core.metrics import timed
+from app.MicroBiome.schemas.schema import ProfilingOutput
+from app.MicroBiome.services.abundance import SparseAbundances
+from app.MicroBiome.services.embedding import BACKEND_DIR, get_reference_embedding
+from app.MicroBiome.services.profiling import BAD_BUGS, GOOD_BUGS, bacteria_columns_of, read_table
+
+PROFILE_DIR = os.environ.get("MICROBIOME_PROFILE_DIR") or os.path.join(BACKEND_DIR, "temp_microbiome_profiles")
+PARTICIPANT = 'Participant ID'
+TRACKED_METADATA = ['fecalcal']  # filled with the running mean when a batch lacks it
+APPEND_ATTEMPTS = 3  # embedding refreshes an append may run into before it answers 409
+
+
+class ParticipantProfile:
+    """
+    Running state of one participant. New rows get their missing values from
+    the mean over every row seen so far (as if the whole history had been
+    uploaded again); rows already stored are never revisited.
+    """
+
+    def __init__(self, participant_id):
+        self.participant_id = participant_id
+        self.lock = threading.Lock()
+        self.embedding_version = None  # of every PCA coordinate stored so far
+        self.n_rows = 0
+        self.taxa = []
+        self.taxa_index = {}
+        self.sums = np.zeros(0)  # per-taxon sums of the stored (filled) abundances
+        self.observed_sum = pd.Series(dtype=np.float64)  # non-missing values per numeric column
+        self.observed_count = pd.Series(dtype=np.float64)
+        self.history = []  # float64 CSR chunks, one per batch, over the taxa known at the time
+        self.top = []
+        self.series = {key: [] for key in ('weeks', 'healthy_index', 'shannon_index', 'pca_x', 'pca_y')}
+        self.protective = {}
+        self.opportunistic = {}
+
+    def _fill(self, df):
+        """Filled copy of a new batch plus the running column statistics that include it."""
+        for col in TRACKED_METADATA:
+            if col in self.observed_count.index and col not in df.columns:
+                df[col] = np.nan
+        numeric = df.select_dtypes('number').columns
+        observed_sum = self.observed_sum.add(df[numeric].sum(), fill_value=0.0)
+        observed_count = self.observed_count.add(df[numeric].count(), fill_value=0.0)
+        means = (observed_sum / observed_count).where(observed_count > 0)
+        df[numeric] = df[numeric].fillna(means[numeric]).fillna(0.0)
+        return df, observed_sum, observed_count
+
+    def _taxa_indices(self, columns):
+        for name in columns:
+            if name not in self.taxa_index:
+                self.taxa_index[name] = len(self.taxa)
+                self.taxa.append(name)
+        if len(self.sums) < len(self.taxa):
+            self.sums = np.concatenate([self.sums, np.zeros(len(self.taxa) - len(self.sums))])
+        return np.array([self.taxa_index[name] for name in columns], dtype=np.int64)
+
+    def _extend(self, store, name, values):
+        # A column that shows up for the first time was absent (zero) in the earlier rows
+        store.setdefault(name, [0.0] * self.n_rows).extend(values)
+
+    @timed("microbiome", "profile_append")
+    def append(self, df: pd.DataFrame, embedding):
+        if self.n_rows and embedding.version != self.embedding_version:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="The reference embedding was refreshed during the request; please retry"
+            )
+        if 'week_num' in df.columns and self.series['weeks'] and df['week_num'].min() < self.series['weeks'][-1]:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"New rows must not be older than week {self.series['weeks'][-1]}"
+            )
+
+        columns = bacteria_columns_of(df)
+        df, observed_sum, observed_count = self._fill(df.copy())
+        X = sp.csr_matrix(df[columns].to_numpy(dtype=np.float64))
+        abundances = SparseAbundances(X.astype(np.float32), columns)
+        pcs = embedding.project_abundances(abundances)
+
+        # Nothing below can fail: commit the batch to the running state
+        self.embedding_version = embedding.version
+        self.observed_sum, self.observed_count = observed_sum, observed_count
+        idx = self._taxa_indices(columns)
+        chunk = sp.csr_matrix((X.data, idx[X.indices], X.indptr), shape=(X.shape[0], len(self.taxa)))
+        self.history.append(chunk)
+        np.add.at(self.sums, chunk.indices, chunk.data)
+
+        n_new = len(df)
+        weeks = df['week_num'].tolist() if 'week_num' in df.columns else list(range(self.n_rows, self.n_rows + n_new))
+        self.series['weeks'].extend(weeks)
+        if 'fecalcal' in df.columns:
+            self._extend(self.series, 'fecalcal', df['fecalcal'].tolist())
+        self.series['healthy_index'].extend(abundances.health_index(GOOD_BUGS, BAD_BUGS).tolist())
+        self.series['shannon_index'].extend(abundances.shannon_index().tolist())
+        self.series['pca_x'].extend(pcs[:, 0].tolist())
+        self.series['pca_y'].extend(pcs[:, 1].tolist())
+        for store, bugs in ((self.protective, GOOD_BUGS), (self.opportunistic, BAD_BUGS)):
+            for col in bugs:
+                if col in df.columns:
+                    self._extend(store, col, df[col].tolist())
+                elif col in store:
+                    store[col].extend([0.0] * n_new)
+        self.n_rows += n_new
+
+        previous_top = self.top
+        self.top = abundances.top_k(self.sums / self.n_rows)[0].tolist()
+        tail = self._output(slice(self.n_rows - n_new, self.n_rows), [chunk])
+        return {**tail.model_dump(), "total_weeks": self.n_rows, "top5_changed": self.top != previous_top}
+
+    def _top5(self, chunks):
+        chunks = [chunk.copy() for chunk in chunks]
+        for chunk in chunks:
+            chunk.resize((chunk.shape[0], len(self.taxa)))
+        H = sp.vstack(chunks, format='csr')
+        top_values = H[:, self.top].toarray()
+        names = [self.taxa[i] for i in self.top]
+        top5 = {name: top_values[:, j].tolist() for j, name in enumerate(names)}
+        top5['others'] = (np.asarray(H.sum(axis=1)).ravel() - top_values.sum(axis=1)).tolist()
+        return top5, names + ['others']
+
+    def _output(self, rows, chunks):
+        top5, names = self._top5(chunks)
+        return ProfilingOutput(
+            participant_id=self.participant_id,
+            weeks=self.series['weeks'][rows],
+            fecalcal=self.series.get('fecalcal', [])[rows],
+            top5_bacteria=top5,
+            top5_names=names,
+            healthy_index=self.series['healthy_index'][rows],
+            shannon_index=self.series['shannon_index'][rows],
+            pca_x=self.series['pca_x'][rows],
+            pca_y=self.series['pca_y'][rows],
+            protective_bacteria={col: values[rows] for col, values in self.protective.items()},
+            opportunistic_bacteria={col: values[rows] for col, values in self.opportunistic.items()},
+        )
+
+    def profile(self):
+        return self._output(slice(None), self.history)
+
+
+class ProfileStore:
+    """Thread-safe LRU of live profiles keyed by participant ID, backed by one NDJSON log each."""
+
+    def __init__(self, directory=PROFILE_DIR, max_profiles=1024):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _log_path(self, participant_id):
+        # Participant IDs are user input: never use them as file names directly
+        name = hashlib.sha1(participant_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{name}.ndjson")
+
+    def _log(self, participant_id, df, embedding, mode):
+        record = json.loads(df.to_json(orient='split', index=False))
+        record["embedding_version"] = embedding.version
+        os.makedirs(self.directory, exist_ok=True)  # on first write, not at import (worker processes import this too)
+        with open(self._log_path(participant_id), mode, encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def _put(self, profile):
+        with self._lock:
+            profile = self._items.setdefault(profile.participant_id, profile)
+            self._items.move_to_end(profile.participant_id)
+            while len(self._items) > self.max_profiles:
+                self._items.popitem(last=False)
+        return profile
+
+    def _replay(self, participant_id, embedding):
+        # Batches logged under another embedding version are re-projected onto `embedding`, like the others
+        profile = ParticipantProfile(participant_id)
+        with open(self._log_path(participant_id), encoding="utf-8") as f:
+            for line in f:
+                batch = json.loads(line)
+                profile.append(pd.DataFrame(batch["data"], columns=batch["columns"]), embedding)
+        return profile
+
+    def _live(self, participant_id, profile):
+        with self._lock:
+            return self._items.get(participant_id) is profile
+
+    def get(self, participant_id, embedding):
+        """Live profile of `participant_id`, projected with `embedding` (replayed from its log if needed)."""
+        with self._lock:
+            stale = self._items.get(participant_id)
+            if stale is not None:
+                self._items.move_to_end(participant_id)
+                if stale.embedding_version == embedding.version:
+                    return stale
+        if not os.path.exists(self._log_path(participant_id)):
+            raise HTTPException(status_code=404, detail="Profile not found. You must seed it first.")
+        # Holding the stale profile's lock keeps its appends from reaching the log halfway through the replay
+        with stale.lock if stale is not None else contextlib.nullcontext():
+            profile = self._replay(participant_id, embedding)
+            with self._lock:
+                current = self._items.get(participant_id)
+                if current is not None and current is not stale and current.embedding_version == embedding.version:
+                    return current  # a concurrent request replayed it first, and may have appended since
+                self._items[participant_id] = profile
+                self._items.move_to_end(participant_id)
+                while len(self._items) > self.max_profiles:
+                    self._items.popitem(last=False)
+        return profile
+
+    def seed(self, participant_id, df, embedding):
+        """Starts (or restarts) a participant's profile from their full history."""
+        profile = ParticipantProfile(participant_id)
+        profile.append(df, embedding)
+        with self._lock:
+            previous = self._items.get(participant_id)
+        # Appends still running on the previous profile land before the log is restarted, not after
+        with previous.lock if previous is not None else contextlib.nullcontext():
+            self._log(participant_id, df, embedding, "w")
+            with self._lock:
+                self._items.pop(participant_id, None)
+            return self._put(profile).profile()
+
+    def append(self, participant_id, df):
+        """
+        Appends with the current reference embedding. A refresh (or a replay
+        by another request) that lands between fetching the profile and
+        locking it sends the append round again on the re-projected profile.
+        """
+        for _ in range(APPEND_ATTEMPTS):
+            embedding = _reference_embedding()
+            profile = self.get(participant_id, embedding)
+            with profile.lock:
+                if get_reference_embedding() is not embedding or not self._live(participant_id, profile):
+                    continue
+                tail = profile.append(df, embedding)
+                self._log(participant_id, df, embedding, "a")
+                return tail
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="The reference embedding kept changing during the request; please retry"
+        )
+
+
+profile_store = ProfileStore()
+
+
+def _reference_embedding():
+    embedding = get_reference_embedding()
+    if embedding is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Stored profiles need the reference embedding for PCA coordinates"
+        )
+    return embedding
+
+
+def _participant_of(df):
+    if PARTICIPANT not in df.columns:
+        return None
+    ids = df[PARTICIPANT].dropna().astype(str).unique()
+    if len(ids) > 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A stored profile holds one participant; use /microbiome/cohort for several"
+        )
+    return ids[0] if len(ids) else None
+
+
+def seed_profile(file: UploadFile):
+    df = read_table(file)
+    participant_id = _participant_of(df)
+    if participant_id is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Stored profiles need a '{PARTICIPANT}' column")
+    return profile_store.seed(participant_id, df, _reference_embedding())
+
+
+def append_weeks(participant_id: str, file: UploadFile):
+    df = read_table(file)
+    if _participant_of(df) not in (None, participant_id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Rows belong to another participant than {participant_id}")
+    return profile_store.append(participant_id, df)
+
+
+def get_stored_profile(participant_id: str):
+    profile = profile_store.get(participant_id, _reference_embedding())
+    with profile.lock:
+        return profile.profile()
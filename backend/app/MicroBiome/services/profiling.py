@@ -1,73 +1,76 @@
 import numpy as np
 import pandas as pd
 from fastapi import UploadFile, File, HTTPException, status
-from sklearn.decomposition import PCA
+from app.core.metrics import timed
 from app.MicroBiome.schemas.schema import ProfilingOutput
+from app.MicroBiome.services.abundance import SparseAbundances, fit_pca_coordinates
+from app.MicroBiome.services.embedding import get_reference_embedding
+
+METADATA_COLUMNS = ['External ID', 'Participant ID', 'week_num']
+CLINICAL_COLUMNS = ['diagnosis', 'fecalcal']
+GOOD_BUGS = ['Faecalibacterium prausnitzii', 'Akkermansia muciniphila', 'Roseburia hominis', 'Bifidobacterium longum', 'Eubacterium rectale']
+BAD_BUGS = ['Escherichia coli', 'Clostridioides difficile', 'Fusobacterium nucleatum', 'Klebsiella pneumoniae', 'Ruminococcus gnavus']
+
+
+def bacteria_columns_of(df):
+    non_taxa = set(METADATA_COLUMNS + CLINICAL_COLUMNS)
+    return [col for col in df.columns if col not in non_taxa]
+
+
+def _filled(df, col):
+    # The few columns echoed back to the frontend keep their exact uploaded values
+    return df[col].fillna(df[col].mean()).fillna(0.0).tolist()
+
 
 class PatientProfile:
-    def get_top5(self, df, bacteria_columns):
-        X = df[bacteria_columns]
+    def get_top5(self, df, abundances):
         # Get top 4 species by mean abundance
-        top4_names = X.mean(axis=0).nlargest(4).index.tolist()
-        top5_df = X[top4_names].copy()
+        means = np.asarray(abundances.X.sum(axis=0, dtype=np.float64)).ravel() / abundances.shape[0]
+        top4_idx = abundances.top_k(means)[0]
+        top4_names = [abundances.columns[i] for i in top4_idx]
         # Sum everything else into 'others'
-        top5_df['others'] = X.drop(columns=top4_names).sum(axis=1)
-        
+        others = abundances.row_totals() - abundances.columns_dense(top4_idx).sum(axis=1)
+
         # Format for frontend: { "SpeciesName": [values_across_time], ... }
-        bacteria_data = {col: top5_df[col].tolist() for col in top5_df.columns}
+        bacteria_data = {col: _filled(df, col) for col in top4_names}
+        bacteria_data['others'] = others.tolist()
         return bacteria_data, top4_names + ['others']
-    
-    def get_health_index(self, df, good_bugs, bad_bugs):
-        # Filter only bugs present in the uploaded file to avoid KeyErrors
-        available_good = [b for b in good_bugs if b in df.columns]
-        available_bad = [b for b in bad_bugs if b in df.columns]
-        
-        sum_good = df[available_good].fillna(0).sum(axis=1)
-        sum_bad = df[available_bad].fillna(0).sum(axis=1)
-        epsilon = 1e-5 
-        healthy_index = np.log10((sum_good + epsilon) / (sum_bad + epsilon))
-        return healthy_index.tolist()
-
-    def get_shannon_index(self, X):
-        epsilon = 1e-5
-        # Assuming X is relative abundance (0-100)
-        proportions = X / 100.0
-        # Replace 0 with epsilon to avoid log(0)
-        H = - (proportions * np.log(proportions + epsilon)).sum(axis=1)
-        return H.tolist()
-
-    def get_pca_coordinates(self, df, bacteria_columns):
-        X_raw = df[bacteria_columns].values
-        pseudocount = 1e-6
-        X_pseudo = X_raw + pseudocount      
-        X_log = np.log(X_pseudo)
-        X_clr = X_log - X_log.mean(axis=1, keepdims=True)
-                
-        pca_model = PCA(n_components=2)
-        pcs = pca_model.fit_transform(X_clr)
-        
+
+    def get_health_index(self, abundances, good_bugs, bad_bugs):
+        # Bugs missing from the uploaded file simply count as zero
+        return abundances.health_index(good_bugs, bad_bugs).tolist()
+
+    def get_shannon_index(self, abundances):
+        # Assuming abundances are relative (0-100); zeros are never stored, so never logged
+        return abundances.shannon_index().tolist()
+
+    def get_pca_coordinates(self, abundances):
+        # Project onto the shared reference axes when available, so patients are comparable
+        embedding = get_reference_embedding()
+        if embedding is not None:
+            pcs = embedding.project_abundances(abundances)
+        else:
+            pcs = fit_pca_coordinates(abundances.clr_dense())
         return pcs[:, 0].tolist(), pcs[:, 1].tolist()
 
     def profile(self, df):
-        df = df.fillna(df.mean(numeric_only=True))
-        df = df.fillna(0.0)
         # 1. Column Identification
-        metadata_columns = ['External ID', 'Participant ID', 'week_num']
-        clinical_columns = ['diagnosis', 'fecalcal']
-        bacteria_columns = [col for col in df.columns if col not in metadata_columns + clinical_columns]
-        
+        bacteria_columns = bacteria_columns_of(df)
+        taxa = set(bacteria_columns)
+        other_columns = [col for col in df.columns if col not in taxa]
+        df[other_columns] = df[other_columns].fillna(df[other_columns].mean(numeric_only=True)).fillna(0.0)
+        # Taxa stay sparse; missing abundances are filled with their column mean inside
+        abundances = SparseAbundances.from_frame(df, bacteria_columns)
+
         # 2. Compute Metrics
-        top5_data, top5_names = self.get_top5(df, bacteria_columns)
-        
-        good_bugs = ['Faecalibacterium prausnitzii', 'Akkermansia muciniphila', 'Roseburia hominis', 'Bifidobacterium longum', 'Eubacterium rectale']    
-        bad_bugs = ['Escherichia coli', 'Clostridioides difficile', 'Fusobacterium nucleatum', 'Klebsiella pneumoniae', 'Ruminococcus gnavus']
+        top5_data, top5_names = self.get_top5(df, abundances)
 
-        protective_dict = {col: df[col].tolist() for col in good_bugs if col in df.columns}
-        opportunistic_dict = {col: df[col].tolist() for col in bad_bugs if col in df.columns}
+        protective_dict = {col: _filled(df, col) for col in GOOD_BUGS if col in df.columns}
+        opportunistic_dict = {col: _filled(df, col) for col in BAD_BUGS if col in df.columns}
 
-        h_index = self.get_health_index(df, good_bugs, bad_bugs)
-        s_index = self.get_shannon_index(df[bacteria_columns])
-        pca_x, pca_y = self.get_pca_coordinates(df, bacteria_columns)
+        h_index = self.get_health_index(abundances, GOOD_BUGS, BAD_BUGS)
+        s_index = self.get_shannon_index(abundances)
+        pca_x, pca_y = self.get_pca_coordinates(abundances)
 
         # 3. Assemble Final Output
         return ProfilingOutput(
@@ -86,7 +89,8 @@ class PatientProfile:
 
 obj = PatientProfile()
 
-async def GetProfile(file: UploadFile = File(...)):
+@timed("microbiome", "read")
+def read_table(file: UploadFile):
     if not (file.filename.endswith(".csv") or file.filename.endswith(".tsv")):
         raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE, detail="Only CSV or TSV files allowed")
     
@@ -101,6 +105,9 @@ async def GetProfile(file: UploadFile = File(...)):
         
     if df.empty:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Uploaded file is empty")
+    return df
 
+async def GetProfile(file: UploadFile = File(...)):
+    df = read_table(file)
     results = obj.profile(df) 
     return results
\ No newline at end of file
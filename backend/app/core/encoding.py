@@ -0,0 +1,186 @@
+"""
+Response encodings chosen by the request's Accept header.
+
+JSON stays the default and goes through the endpoint's response_model as
+before. Clients that ask for one of the binary types get the same payload
+with every numeric array sent as a raw little-endian buffer taken straight
+from NumPy (float arrays as float32, integer arrays keep their dtype and
+integer lists become int64, missing values become NaN):
+
+- application/vnd.apache.arrow.stream: one-row Arrow IPC stream, one column
+  per field; nested dicts are flattened to dotted names ("signals.MLII") and
+  arrays are list<float32> (list<int64> for integers) columns built zero-copy from the NumPy buffers.
+- application/msgpack: the payload as a MessagePack map, each array as
+  {"dtype": "<f4", "shape": [n], "data": <bin>}.
+- application/x-base64-float32+json: JSON with each array as
+  {"dtype": "<f4", "shape": [n], "data": "<base64>"}; NaN and infinite
+  scalars outside arrays become null, as JSON has no literal for them.
+"""
+import base64
+import json
+import math
+from numbers import Number
+
+import msgpack
+import numpy as np
+import pyarrow as pa
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+JSON = "application/json"
+ARROW = "application/vnd.apache.arrow.stream"
+MSGPACK = "application/msgpack"
+BASE64 = "application/x-base64-float32+json"
+
+_MEDIA_TYPES = {
+    JSON: JSON,
+    ARROW: ARROW,
+    MSGPACK: MSGPACK,
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+    BASE64: BASE64,
+}
+
+
+def negotiate(accept):
+    """Best supported media type of an Accept header; JSON when nothing better matches."""
+    best, best_q = JSON, 0.0
+    for part in (accept or "").split(","):
+        media, *params = [item.strip() for item in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        chosen = _MEDIA_TYPES.get(media.lower())
+        # Ties keep the earlier entry; wildcards and unknown types fall back to JSON
+        if chosen is not None and q > best_q:
+            best, best_q = chosen, q
+    return best
+
+
+def _array(value):
+    """The value as a 1-D+ NumPy array if it is numeric data, else None."""
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind == 'f':
+            return value.astype('<f4', copy=False)
+        if value.dtype.kind in 'iu':
+            return value.astype(value.dtype.newbyteorder('<'), copy=False)
+        return None
+    if isinstance(value, (list, tuple)):
+        # Payload lists are homogeneous: the first non-None item tells numbers from the rest
+        first = next((item for item in value if item is not None), None)
+        if isinstance(first, Number) and not isinstance(first, bool):
+            array = np.array(value)
+            if array.dtype.kind == 'i':
+                return array.astype('<i8', copy=False)  # only integers, no None
+            return np.array(value, dtype='<f4')  # None -> NaN
+    return None
+
+
+def _fields(value):
+    if isinstance(value, BaseModel):
+        return {name: getattr(value, name) for name in type(value).model_fields}
+    return value
+
+
+_CONTAINERS = (dict, list, tuple, np.ndarray, BaseModel)
+
+
+def _walk(value, encode_array, encode_scalar=None):
+    """
+    Copy of the payload with every numeric array replaced by
+    encode_array(array), and every other scalar by encode_scalar(scalar).
+    """
+    value = _fields(value)
+    array = _array(value)
+    if array is not None:
+        return encode_array(array)
+    if isinstance(value, dict):
+        return {key: _walk(item, encode_array, encode_scalar) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and not isinstance(value[0], _CONTAINERS):
+            # strings and other plain scalars go out as they are
+            return value if encode_scalar is None else [encode_scalar(item) for item in value]
+        return [_walk(item, encode_array, encode_scalar) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    return value if encode_scalar is None else encode_scalar(value)
+
+
+def _describe(array, data):
+    return {"dtype": array.dtype.str, "shape": list(array.shape), "data": data}
+
+
+def to_msgpack(payload):
+    return msgpack.packb(_walk(payload, lambda a: _describe(a, a.tobytes())), use_bin_type=True)
+
+
+def _finite_or_none(value):
+    return None if isinstance(value, float) and not math.isfinite(value) else value
+
+
+def to_base64_json(payload):
+    encoded = _walk(payload, lambda a: _describe(a, base64.b64encode(a.tobytes()).decode("ascii")), _finite_or_none)
+    return json.dumps(encoded, ensure_ascii=False, allow_nan=False).encode("utf-8")
+
+
+def _flatten(value, prefix=""):
+    value = _fields(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _flatten(item, f"{prefix}{key}.")
+    else:
+        yield prefix[:-1], value
+
+
+def _arrow_column(value):
+    array = _array(value)
+    if array is not None:
+        flat = pa.array(array.ravel())  # zero-copy view of the NumPy buffer
+        return pa.ListArray.from_arrays(pa.array([0, len(flat)], type=pa.int32()), flat)
+    return pa.array([_walk(value, lambda a: a.tolist())])
+
+
+def to_arrow(payload):
+    names, columns = zip(*[(name, _arrow_column(value)) for name, value in _flatten(payload)])
+    batch = pa.RecordBatch.from_arrays(list(columns), names=list(names))
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+def to_jsonable(payload):
+    """NumPy arrays to plain lists (NaN -> None) so response_model validation sees what it always did."""
+    def as_list(value):
+        if isinstance(value, np.ndarray):
+            if value.dtype.kind == 'f' and np.isnan(value).any():
+                rows = value.astype(object)
+                rows[np.isnan(value)] = None
+                return rows.tolist()
+            return value.tolist()
+        if isinstance(value, dict):
+            return {key: as_list(item) for key, item in value.items()}
+        return value
+    return as_list(payload)
+
+
+ENCODERS = {ARROW: to_arrow, MSGPACK: to_msgpack, BASE64: to_base64_json}
+
+
+def encode_response(request: Request, payload, model=None):
+    """
+    The payload for JSON (left to FastAPI and the response_model), or a
+    binary Response when the client asked for one. Binary responses skip the
+    response_model, so `model` (usually the same class) picks their fields.
+    """
+    media_type = negotiate(request.headers.get("accept"))
+    if media_type == JSON:
+        return to_jsonable(payload)
+    if model is not None:
+        payload = _fields(payload)
+        payload = {name: payload[name] for name in model.model_fields if name in payload}
+    return Response(content=ENCODERS[media_type](payload), media_type=media_type, headers={"Vary": "Accept"})
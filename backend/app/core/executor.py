@@ -0,0 +1,505 @@
+"""
+Process pools for the CPU-bound analysis behind the async endpoints.
+
+NumPy, SciPy, torch, XGBoost and librosa work holds the GIL for most of a
+request, so running it in the event loop stalls every other request (health
+checks included) and threads would not run it in parallel either. Handlers
+await `run(workload, fn, *args)` instead: fn runs in the workload's process
+pool and the event loop stays free.
+
+- One spawn ProcessPoolExecutor per workload (see WORKLOADS), started at
+  launch. EXECUTOR_WORKERS_<WORKLOAD> sets its size; 0 keeps that workload
+  in a thread of the API process.
+- Each worker imports the workload's service modules and loads the
+  workload's models before taking tasks, so no request pays for a model
+  load. GET /ready waits for the workers too. Models only the workers use
+  (api_models()) are not loaded in the API process at all.
+- UploadFile arguments and NumPy arrays of SHARED_MIN_BYTES or more (in
+  either direction) go through shared memory instead of being pickled down
+  a pipe. The worker reads them in place; the API process writes an upload
+  once and copies a returned array out once.
+- HTTPExceptions raised in a worker are raised again in the API process,
+  and the stage timings and model calls a task records are merged into
+  the API process's /metrics.
+- fn may be a coroutine function; the worker runs it to completion.
+
+EXECUTOR_MODE=thread runs every workload in threads of the API process
+(e.g. under `uvicorn --reload`). Work from a profiled request
+(app.core.profiling) or from inside a worker also stays in its process.
+"""
+import asyncio
+import importlib
+import inspect
+import io
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile
+
+from app.core import metrics, profiling
+from app.core.models import model_registry
+
+CPU_COUNT = os.cpu_count() or 1
+MODE = os.environ.get("EXECUTOR_MODE", "process").lower()
+PRESTART = os.environ.get("EXECUTOR_PRESTART", "1").lower() not in ("0", "false", "no")
+SHARED_MIN_BYTES = int(os.environ.get("EXECUTOR_SHM_MIN_BYTES", str(1024 * 1024)))
+DEFAULT_WORKERS = max(1, min(4, CPU_COUNT // 2))
+
+
+class Workload:
+    def __init__(self, name, workers, preload=(), models=(), shared=True):
+        self.name = name
+        self.workers = int(os.environ.get(f"EXECUTOR_WORKERS_{name.upper()}", workers))
+        self.preload = preload  # modules each worker imports at start (they register `models`)
+        self.models = models  # loaded by each worker at start
+        self.shared = shared  # whether endpoints served by the API process itself use `models` too
+
+
+WORKLOADS = {
+    workload.name: workload
+    for workload in [
+        Workload("eeg", DEFAULT_WORKERS, ("app.EEG.api.endpoint",), ("eeg_predictor",), shared=False),
+        Workload("ecg", DEFAULT_WORKERS, ("app.ECG.services.service",), ("ecg_cnn", "ecg_classical"), shared=False),
+        # Batch and timeline detection run in the API process
+        Workload("acoustic", DEFAULT_WORKERS, ("app.Acoustic_Signals.services.get_prediction",), ("submarine_detector",)),
+        # Backtests and batch forecasts run in the API process
+        Workload("market", DEFAULT_WORKERS, ("app.Market.services.analyzer",), ("market_lstm", "market_lstm_step")),
+        # Cohorts, diversity and stored profiles run in the API process
+        Workload("microbiome", DEFAULT_WORKERS, ("app.MicroBiome.services.embedding",), ("microbiome_embedding",)),
+        # Column blocks of /compare/multi seasonal decompositions: no models, one task per core
+        Workload("season", min(8, CPU_COUNT)),
+    ]
+}
+
+_pools = {}
+_prestarted = {}  # workload -> futures of the tasks that brought its workers up
+_pools_lock = threading.Lock()
+_worker_of = None  # name of the workload this process serves, inside a worker
+_pinned = []  # releases that failed because something still pointed into the block; retried before each task
+
+
+# ---------------- SHARED MEMORY ----------------
+
+def _copy_into(block, source, size):
+    view = block.buf[:size]
+    try:
+        done = 0
+        while done < size:
+            read = source.readinto(view[done:])
+            if not read:
+                raise ValueError("Upload ended before its announced size")
+            done += read
+    finally:
+        view.release()
+
+
+def _close(release):
+    try:
+        release()
+    except BufferError:
+        _pinned.append(release)  # an array (or traceback) from the task still points into the block
+
+
+def _release_pinned():
+    """Retries the releases that failed after earlier tasks; keeps only those still blocked."""
+    if not _pinned:
+        return
+    blocked = []
+    for release in _pinned:
+        try:
+            release()
+        except BufferError:
+            blocked.append(release)
+    _pinned[:] = blocked
+
+
+class SharedArray:
+    """A NumPy array in a shared memory block; what crosses the pipe is its name, shape and dtype."""
+
+    def __init__(self, array):
+        array = np.ascontiguousarray(array)
+        self.shape = array.shape
+        self.dtype = array.dtype.str
+        self.block = SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, array.dtype, buffer=self.block.buf)[...] = array
+        self.name = self.block.name
+
+    def __getstate__(self):
+        return {"name": self.name, "shape": self.shape, "dtype": self.dtype}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.block = None
+
+    def attach(self, attached):
+        """The array itself, read in place (worker side)."""
+        self.block = SharedMemory(name=self.name)
+        attached.append(self.block)
+        # frombuffer keeps the buffer exported while the array or any view of it lives, so the block
+        # cannot be unmapped under them (close() raises BufferError instead); np.ndarray(buffer=) does not
+        count = int(np.prod(self.shape))
+        return np.frombuffer(self.block.buf, np.dtype(self.dtype), count=count).reshape(self.shape)
+
+    def copy_out(self):
+        """A private copy of the array; the block is freed (API process side)."""
+        block = SharedMemory(name=self.name)
+        try:
+            return np.ndarray(self.shape, np.dtype(self.dtype), buffer=block.buf).copy()
+        finally:
+            block.close()
+            block.unlink()
+
+    def unlink(self):
+        self.block.close()
+        self.block.unlink()
+
+
+class _MemoryReader(io.RawIOBase):
+    def __init__(self, view):
+        self.view = view
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = max(0, min(len(buffer), len(self.view) - self.position))
+        buffer[:count] = self.view[self.position:self.position + count]
+        self.position += count
+        return count
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: len(self.view)}[whence]
+        self.position = max(0, base + offset)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+
+class SharedUpload:
+    """
+    Stands in for an UploadFile inside a worker: same filename, a seekable
+    binary `file` and an async read(). Small uploads are carried inline,
+    larger ones in a shared memory block the worker reads in place.
+    """
+
+    def __init__(self, file: UploadFile):
+        self.filename = file.filename
+        self.content_type = file.content_type
+        source = file.file
+        source.seek(0, io.SEEK_END)
+        self.size = source.tell()
+        source.seek(0)
+        self.data, self.name, self.block = None, None, None
+        if self.size < SHARED_MIN_BYTES:
+            self.data = source.read()
+        else:
+            self.block = SharedMemory(create=True, size=self.size)
+            self.name = self.block.name
+            _copy_into(self.block, source, self.size)
+        source.seek(0)
+        self._file = None
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["block"], state["_file"] = None, None
+        return state
+
+    @property
+    def file(self):
+        if self._file is None:
+            if self.data is not None:
+                self._file = io.BytesIO(self.data)
+            else:
+                self.block = SharedMemory(name=self.name)
+                self._view = self.block.buf[:self.size]
+                self._file = io.BufferedReader(_MemoryReader(self._view))
+        return self._file
+
+    async def read(self, size=-1):
+        return self.file.read(size)
+
+    async def seek(self, offset):
+        self.file.seek(offset)
+
+    def close(self):
+        """Worker side: drops the mapping."""
+        if self._file is not None and self.block is not None:
+            self._file = None
+            _close(self._release)
+
+    def _release(self):
+        # Both steps are no-ops once done, so a release blocked by a leftover reference can be retried
+        self._view.release()
+        self.block.close()
+
+    def unlink(self):
+        """API process side: frees the block once the task is over."""
+        if self.block is not None:
+            self.block.close()
+            self.block.unlink()
+
+
+def _walk(value, convert):
+    if isinstance(value, (list, tuple)):
+        return type(value)(_walk(item, convert) for item in value)
+    if isinstance(value, dict):
+        return {key: _walk(item, convert) for key, item in value.items()}
+    return convert(value)
+
+
+def _export(value, shared):
+    def convert(item):
+        if isinstance(item, UploadFile):
+            shared.append(SharedUpload(item))
+            return shared[-1]
+        if isinstance(item, np.ndarray) and item.nbytes >= SHARED_MIN_BYTES and item.dtype != object:
+            shared.append(SharedArray(item))
+            return shared[-1]
+        return item
+    return _walk(value, convert)
+
+
+def _attach(value, attached):
+    def convert(item):
+        if isinstance(item, SharedArray):
+            return item.attach(attached)
+        if isinstance(item, SharedUpload):
+            attached.append(item)
+            return item
+        return item
+    return _walk(value, convert)
+
+
+def _share_result(value, shared):
+    def convert(item):
+        if isinstance(item, np.ndarray) and item.nbytes >= SHARED_MIN_BYTES and item.dtype != object:
+            shared.append(SharedArray(item))
+            return shared[-1]
+        return item
+    return _walk(value, convert)
+
+
+def _import_result(value):
+    return _walk(value, lambda item: item.copy_out() if isinstance(item, SharedArray) else item)
+
+
+# ---------------- WORKER SIDE ----------------
+
+class _Raised:
+    """An HTTPException from a worker (the exception itself does not survive pickling)."""
+
+    def __init__(self, error):
+        self.status_code, self.detail, self.headers = error.status_code, error.detail, error.headers
+
+
+def _invoke(fn, args, kwargs):
+    if inspect.iscoroutinefunction(fn):
+        return asyncio.run(fn(*args, **kwargs))
+    return fn(*args, **kwargs)
+
+
+def _initialize(workload, preload, models):
+    global _worker_of
+    _worker_of = workload
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C stops the server, which shuts the pools down
+    for module in preload:
+        importlib.import_module(module)
+    model_registry.warm_up(models)
+
+
+def _started():
+    return os.getpid()
+
+
+def _call(fn, args, kwargs):
+    _release_pinned()
+    attached = []
+    try:
+        args, kwargs = _attach(args, attached), _attach(kwargs, attached)
+        try:
+            result = _invoke(fn, args, kwargs)
+        except HTTPException as error:
+            result = _Raised(error)
+        del args, kwargs
+        shared = []
+        result = _share_result(result, shared)
+        for array in shared:
+            array.block.close()  # the API process copies it out and unlinks it
+        return result, metrics.drain()
+    finally:
+        for item in attached:
+            if isinstance(item, SharedUpload):
+                item.close()
+            else:
+                _close(item.close)
+
+
+# ---------------- API PROCESS SIDE ----------------
+
+def workers(name):
+    return WORKLOADS[name].workers
+
+
+def _inline(name):
+    return MODE == "thread" or workers(name) <= 0 or _worker_of is not None or profiling.active()
+
+
+def api_models():
+    """Registered models the API process warms up: all but those only worker processes use."""
+    worker_only = {
+        model for workload in WORKLOADS.values()
+        if not workload.shared and not _inline(workload.name) for model in workload.models
+    }
+    return [name for name in model_registry.names() if name not in worker_only]
+
+
+def _pool(name):
+    pool = _pools.get(name)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(name)
+            if pool is None:
+                workload = WORKLOADS[name]
+                # spawn: forking a process that already runs ONNX/uvicorn threads is unsafe
+                pool = _pools[name] = ProcessPoolExecutor(
+                    max_workers=workload.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_initialize,
+                    initargs=(name, workload.preload, workload.models),
+                )
+    return pool
+
+
+def _prestart(name):
+    workload = WORKLOADS[name]
+    if MODE == "thread" or not PRESTART or not workload.preload or workload.workers <= 0:
+        return
+    pool = _pool(name)
+    # Submitted before any worker is up, so every one of them is spawned
+    _prestarted[name] = [pool.submit(_started) for _ in range(workload.workers)]
+
+
+def _discard(name, pool):
+    with _pools_lock:
+        if _pools.get(name) is pool:
+            del _pools[name]
+            _prestarted.pop(name, None)
+    pool.shutdown(wait=False, cancel_futures=True)
+    _prestart(name)  # a fresh pool, up (and counted by ready()) before the next request needs it
+
+
+def restart(name):
+    """
+    Replaces the `name` workers with fresh ones, e.g. once a model they
+    loaded at start has a new version on disk. Tasks already submitted
+    finish on the old workers; later ones wait for the new workers.
+    """
+    if MODE == "thread" or workers(name) <= 0 or _worker_of is not None:
+        return  # the workload runs in this process, which already has the new model
+    with _pools_lock:
+        pool = _pools.pop(name, None)
+        _prestarted.pop(name, None)
+    if pool is not None:
+        pool.shutdown(wait=False)
+    _prestart(name)
+
+
+def start():
+    """Brings every worker of the workloads with models up now, so their models load before the first request."""
+    for name in WORKLOADS:
+        _prestart(name)
+
+
+def ready():
+    # A worker that died while starting (e.g. its initializer raised) is not ready
+    return all(future.done() and future.exception() is None for futures in _prestarted.values() for future in futures)
+
+
+def status_report():
+    report = {"mode": MODE, "workloads": {}}
+    for name, workload in WORKLOADS.items():
+        futures = _prestarted.get(name, [])
+        report["workloads"][name] = {
+            "workers": workload.workers,
+            "running": name in _pools,
+            "workers_ready": sum(future.done() and future.exception() is None for future in futures),
+        }
+    return report
+
+
+def _finish(name, outcome):
+    result, drained = outcome
+    metrics.merge(drained)
+    result = _import_result(result)
+    if isinstance(result, _Raised):
+        raise HTTPException(status_code=result.status_code, detail=result.detail, headers=result.headers)
+    return result
+
+
+def _broken(name, pool):
+    _discard(name, pool)  # the next request gets a fresh pool
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=f"The {name} worker stopped unexpectedly; please retry",
+    )
+
+
+async def run(name, fn, *args, **kwargs):
+    """fn(*args, **kwargs) in the `name` pool, awaited without blocking the event loop."""
+    if _inline(name):
+        return await run_in_threadpool(_invoke, fn, args, kwargs)
+
+    shared = []
+    try:
+        # Copying uploads into shared memory can mean reading a spooled temp file: not on the loop
+        args, kwargs = await run_in_threadpool(lambda: (_export(args, shared), _export(kwargs, shared)))
+        pool = _pool(name)
+        try:
+            outcome = await asyncio.wrap_future(pool.submit(_call, fn, args, kwargs))
+        except BrokenProcessPool:
+            raise _broken(name, pool)
+        return _finish(name, outcome)
+    finally:
+        for item in shared:
+            item.unlink()
+
+
+def map_blocking(name, fn, *iterables):
+    """Blocking counterpart of run() for sync code: fn over the iterables in the `name` pool, results in order."""
+    if _inline(name):
+        return [_invoke(fn, args, {}) for args in zip(*iterables)]
+
+    shared = []
+    try:
+        calls = [_export(args, shared) for args in zip(*iterables)]
+        pool = _pool(name)
+        futures = [pool.submit(_call, fn, args, {}) for args in calls]
+        try:
+            return [_finish(name, future.result()) for future in futures]
+        except BrokenProcessPool:
+            raise _broken(name, pool)
+    finally:
+        for item in shared:
+            item.unlink()
+
+
+def shutdown():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+        _prestarted.clear()
+    for pool in pools:
+        pool.shutdown(cancel_futures=True)
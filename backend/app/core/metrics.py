@@ -0,0 +1,257 @@
+"""
+Per-endpoint and per-stage metrics in the Prometheus text format.
+
+Everything lives in process memory and GET /metrics renders it:
+
+- http_request_duration_seconds{endpoint,method,status} and
+  http_request_bytes / http_response_bytes{endpoint}: one observation per
+  request, from MetricsMiddleware. The endpoint label is the route template
+  (/EEG/data/{file_id}), so the number of series stays bounded.
+- pipeline_stage_duration_seconds{pipeline,stage}: `with stage("eeg", "filters"):`
+  blocks and @timed functions inside the services, so a slow request can be
+  split into its steps.
+- model_calls_total{model}: one per inference call (count_model_call).
+
+Throughput is the rate of the histograms' _count series. METRICS_ENABLED=0
+turns all of it off: stage() hands back one shared no-op context manager,
+count_model_call returns at once, the middleware is not installed and
+/metrics answers 404.
+
+Work offloaded to worker processes (app.core.executor) records into the
+worker's copy of these metrics; each task hands back what it recorded
+(drain) and the API process adds it to its own (merge).
+"""
+import functools
+import inspect
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+
+ENABLED = os.environ.get("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(11))  # 1 KiB .. 1 GiB
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def drain(self):
+        """Series recorded since the last drain, which start over from zero."""
+        with self._lock:
+            series, self._series = self._series, {}
+        return series
+
+    def merge(self, series):
+        with self._lock:
+            for label_values, value in series.items():
+                self._series[label_values] = self._series.get(label_values, 0) + value
+
+    def samples(self):
+        with self._lock:
+            series = dict(self._series)
+        for label_values, value in series.items():
+            yield self.name, self.labels, label_values, value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [count per bucket..., count above the last, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        slot = bisect_left(self.buckets, value)  # upper bounds are inclusive ("le")
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[slot] += 1
+            series[-1] += value
+
+    def drain(self):
+        """Series recorded since the last drain, which start over from zero."""
+        with self._lock:
+            series, self._series = self._series, {}
+        return series
+
+    def merge(self, series):
+        with self._lock:
+            for label_values, values in series.items():
+                own = self._series.get(label_values)
+                if own is None:
+                    self._series[label_values] = list(values)
+                else:
+                    for slot, value in enumerate(values):
+                        own[slot] += value
+
+    def samples(self):
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        bucket_labels = self.labels + ("le",)
+        for label_values, series in snapshot.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                yield f"{self.name}_bucket", bucket_labels, label_values + (_number(bound),), cumulative
+            yield f"{self.name}_sum", self.labels, label_values, series[-1]
+            yield f"{self.name}_count", self.labels, label_values, cumulative
+
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time from request start to the last response byte.",
+    ("endpoint", "method", "status"),
+)
+REQUEST_BYTES = Histogram("http_request_bytes", "Request body size.", ("endpoint",), SIZE_BUCKETS)
+RESPONSE_BYTES = Histogram("http_response_bytes", "Response body size.", ("endpoint",), SIZE_BUCKETS)
+STAGE_SECONDS = Histogram(
+    "pipeline_stage_duration_seconds", "Time spent in one stage of an analysis pipeline.",
+    ("pipeline", "stage"),
+)
+MODEL_CALLS = Counter("model_calls_total", "Inference calls per model.", ("model",))
+
+METRICS = [REQUEST_SECONDS, REQUEST_BYTES, RESPONSE_BYTES, STAGE_SECONDS, MODEL_CALLS]
+
+
+class _Stage:
+    __slots__ = ("labels", "started")
+
+    def __init__(self, pipeline, name):
+        self.labels = (pipeline, name)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        STAGE_SECONDS.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+
+_NOOP = nullcontext()
+
+
+def stage(pipeline, name):
+    """Context manager timing one pipeline stage (failed runs included)."""
+    if not ENABLED:
+        return _NOOP
+    return _Stage(pipeline, name)
+
+
+def timed(pipeline, name):
+    """Decorator form of stage() for a function that is a whole stage; returns it untouched when disabled."""
+    def decorate(function):
+        if not ENABLED:
+            return function
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with _Stage(pipeline, name):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with _Stage(pipeline, name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count_model_call(model, calls=1):
+    if ENABLED:
+        MODEL_CALLS.inc(model, amount=calls)
+
+
+def drain():
+    """Everything recorded since the last drain, by metric name (for a worker process to hand back)."""
+    return {metric.name: series for metric in METRICS if (series := metric.drain())}
+
+
+def merge(drained):
+    """Adds what drain() returned in another process to this process's metrics."""
+    by_name = {metric.name: metric for metric in METRICS}
+    for name, series in drained.items():
+        by_name[name].merge(series)
+
+
+def render():
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, label_names, label_values, value in metric.samples():
+            lines.append(f"{name}{_labels(label_names, label_values)} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and body sizes of every HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        sizes = {"request": 0, "response": 0, "status": 500}
+
+        async def counted_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                sizes["request"] += len(message.get("body", b""))
+            return message
+
+        async def counted_send(message):
+            if message["type"] == "http.response.start":
+                sizes["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                sizes["response"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, counted_receive, counted_send)
+        finally:
+            # The router stores the matched route in the scope; raw paths would explode the label set
+            endpoint = getattr(scope.get("route"), "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint, scope["method"], str(sizes["status"]))
+            REQUEST_BYTES.observe(sizes["request"], endpoint)
+            RESPONSE_BYTES.observe(sizes["response"], endpoint)
@@ -0,0 +1,153 @@
+"""
+Registry of the models the API serves, loaded lazily.
+
+Modules register a loader per model at import time instead of building the
+model there, so importing app.main (and with it every router) stays cheap.
+A model is loaded on its first use, or earlier by the background warm-up the
+app starts at launch; concurrent first uses wait for the same load. A failed
+load is retried by the first use after a backoff (MODEL_RETRY_SECONDS,
+doubling per failure up to MODEL_RETRY_MAX_SECONDS), so a model file that
+shows up later, or a transient error, does not need a restart. GET /ready
+reports each model's state and load time, plus how long each router module
+took to import.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+RETRY_SECONDS = float(os.environ.get("MODEL_RETRY_SECONDS", "5"))
+MAX_RETRY_SECONDS = float(os.environ.get("MODEL_RETRY_MAX_SECONDS", "300"))
+
+
+class LazyModel:
+    """One registered model: built by `loader` once, then shared by every request."""
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.state = PENDING
+        self.error = None
+        self.load_seconds = None
+        self.failures = 0
+        self._retry_at = 0.0
+        self._value = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        The loaded model; loads it on first use. Until the backoff after a
+        failed load is over, the same error is raised again without a retry.
+        """
+        if self.state == READY:
+            return self._value
+        with self._lock:
+            if self.state == FAILED and time.monotonic() < self._retry_at:
+                raise RuntimeError(self.error)
+            if self.state != READY:
+                self.state = LOADING
+                started = time.perf_counter()
+                try:
+                    value = self.loader()
+                except Exception as error:
+                    self.load_seconds = time.perf_counter() - started
+                    self.error = str(error) or type(error).__name__
+                    self.failures += 1
+                    self._retry_at = time.monotonic() + min(RETRY_SECONDS * 2 ** (self.failures - 1), MAX_RETRY_SECONDS)
+                    self.state = FAILED
+                    raise
+                self.load_seconds = time.perf_counter() - started
+                self._value = value
+                self.error = None
+                self.state = READY
+        return self._value
+
+    def set(self, value):
+        """Swaps in a new version of the model (e.g. after a refit)."""
+        with self._lock:
+            self._value = value
+            self.error = None
+            self.state = READY
+
+    def status(self):
+        return {"state": self.state, "load_seconds": self.load_seconds, "error": self.error, "failures": self.failures}
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._models = {}
+        self.import_seconds = {}
+        self.warm_up_started = None
+        self.warm_up_seconds = None
+        self._warm_up_names = None  # what ready() waits for; every model until a warm-up narrows it
+
+    def register(self, name, loader):
+        if name in self._models:
+            raise ValueError(f"Model {name} is already registered")
+        model = LazyModel(name, loader)
+        self._models[name] = model
+        return model
+
+    def get(self, name):
+        return self._models[name].get()
+
+    def names(self):
+        return list(self._models)
+
+    def warm_up(self, names=None):
+        """
+        Loads the `names` models (default: every registered one) in turn;
+        failures are logged and left for /ready to report.
+        """
+        self._warm_up_names = self.names() if names is None else list(names)
+        started = time.perf_counter()
+        for model in [self._models[name] for name in self._warm_up_names]:
+            try:
+                model.get()
+            except Exception as error:
+                print(f"❌ Failed to load model {model.name}: {error}")
+            else:
+                print(f"✅ Model {model.name} ready ({model.load_seconds or 0.0:.2f}s).")
+        self.warm_up_seconds = time.perf_counter() - started
+
+    def start_warm_up(self, names=None):
+        """Warm-up in a daemon thread, so the server accepts requests (and health checks) right away."""
+        self.warm_up_started = time.time()
+        self._warm_up_names = self.names() if names is None else list(names)
+        thread = threading.Thread(target=self.warm_up, args=(names,), name="model-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    @contextmanager
+    def timed_import(self, module):
+        """Records how long the wrapped import of `module` took."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.import_seconds[module] = time.perf_counter() - started
+
+    def ready(self):
+        # Failed models count as settled: their endpoints answer 503 until a retry succeeds, the rest of the API works
+        names = self.names() if self._warm_up_names is None else self._warm_up_names
+        return all(self._models[name].state in (READY, FAILED) for name in names)
+
+    def status(self):
+        return {
+            "ready": self.ready(),
+            "models": {name: model.status() for name, model in self._models.items()},
+            "warm_up": self.names() if self._warm_up_names is None else list(self._warm_up_names),
+            "startup": {
+                "imports": dict(self.import_seconds),
+                "import_seconds": sum(self.import_seconds.values()),
+                "warm_up_seconds": self.warm_up_seconds,
+            },
+        }
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,289 @@
+"""
+Opt-in profiling of single requests.
+
+Start the server with PROFILING_TOKEN=<secret>. A request that carries the
+header `X-Profile: <secret>` (or the query parameter `profile=<secret>`) then
+runs under a sampling profiler and tracemalloc. Its report is saved under the
+ID returned in the X-Profile-Id response header, and GET /profiles/{id} (same
+token) downloads it:
+
+- stacks: every PROFILING_INTERVAL seconds the sampler records the stack of
+  every thread, so work Starlette hands to its thread pool (plain `def`
+  endpoints such as /extract_coef and /doppler_generation) is covered along
+  with the event loop. Work that app.core.executor would send to a worker
+  process runs in a thread of this process instead, so it is covered too.
+  Idle threads (waiting on a lock, a queue or the selector) are skipped.
+  Requests running at the same time show up too.
+- memory: peak traced memory during the request, and the top allocation
+  sites (by line) from a snapshot taken close to that peak. NumPy buffers
+  are traced; torch and onnxruntime allocations are not. Tracing slows
+  allocation-heavy code down several times, so read a report's durations as
+  proportions rather than as the request's normal latency.
+
+Without PROFILING_TOKEN the middleware is not installed and /profiles answers
+404; with it, a request without the flag costs one header lookup. tracemalloc
+is process wide, so one request is profiled at a time: a flagged request that
+arrives meanwhile runs unprofiled and gets X-Profile-Id: busy.
+"""
+import collections
+import contextvars
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.concurrency import run_in_threadpool
+
+TOKEN = os.environ.get("PROFILING_TOKEN") or None
+ENABLED = TOKEN is not None
+INTERVAL = float(os.environ.get("PROFILING_INTERVAL", "0.005"))
+PROFILE_DIR = os.environ.get("PROFILING_DIR", "temp_request_profiles")
+MAX_PROFILES = int(os.environ.get("PROFILING_KEEP", "100"))  # older reports are deleted
+
+HEADER = b"x-profile"
+QUERY_PARAMETER = "profile"
+TOP_FUNCTIONS = 50
+TOP_ALLOCATIONS = 25
+SNAPSHOT_GROWTH = 1.25  # new memory snapshot once traced memory grows by 25% over the last one
+
+# Leaf frames of a thread that is waiting rather than working
+_IDLE = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+}
+
+_session_lock = threading.Lock()
+_active = contextvars.ContextVar("profiling_active", default=False)
+
+
+def authorized(token):
+    return ENABLED and token is not None and hmac.compare_digest(token.encode(), TOKEN.encode())
+
+
+def active():
+    """True inside a profiled request (app.core.executor then keeps its work in this process)."""
+    return _active.get()
+
+
+def _requested(scope):
+    for name, value in scope["headers"]:
+        if name == HEADER:
+            return authorized(value.decode("latin-1"))
+    query = scope.get("query_string", b"")
+    if QUERY_PARAMETER.encode() + b"=" in query:
+        return authorized(dict(parse_qsl(query.decode("latin-1"))).get(QUERY_PARAMETER))
+    return False
+
+
+class _Sampler(threading.Thread):
+    """Collects the stacks of every other thread until stopped, plus memory snapshots on growth."""
+
+    def __init__(self, interval):
+        super().__init__(name="request-profiler", daemon=True)
+        self.interval = interval
+        self.stacks = collections.Counter()  # (thread name, outermost frame, ..., innermost frame) -> samples
+        self.samples = 0
+        self.snapshot = None
+        self.snapshot_bytes = 0
+        self._labels = {}  # code object -> "function (file:line)"
+        self._done = threading.Event()
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def _stack(self, frame):
+        code = frame.f_code
+        if (os.path.basename(code.co_filename), code.co_name) in _IDLE:
+            return None
+        stack = []
+        while frame is not None:
+            stack.append(self._label(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def _check_memory(self):
+        current, _ = tracemalloc.get_traced_memory()
+        if current > max(self.snapshot_bytes * SNAPSHOT_GROWTH, 1024 * 1024):
+            self.snapshot = tracemalloc.take_snapshot()
+            self.snapshot_bytes = current
+
+    def run(self):
+        own = threading.get_ident()
+        while not self._done.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = self._stack(frame)
+                if stack is not None:
+                    self.stacks[(names.get(ident, str(ident)),) + stack] += 1
+            self._check_memory()
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+class _Session:
+    def __init__(self, profile_id, scope):
+        self.profile_id = profile_id
+        self.scope = scope
+        self.status = None
+        self.sampler = _Sampler(INTERVAL)
+        self.started_tracemalloc = False
+
+    def start(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()  # started elsewhere (PYTHONTRACEMALLOC): leave it running
+        else:
+            tracemalloc.start()
+            self.started_tracemalloc = True
+        self.baseline_bytes, _ = tracemalloc.get_traced_memory()
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.sampler.start()
+
+    def stop(self):
+        duration = time.perf_counter() - self.started
+        self.sampler.stop()
+        current, peak = tracemalloc.get_traced_memory()
+        if self.sampler.snapshot is None or peak > self.sampler.snapshot_bytes:
+            snapshot = tracemalloc.take_snapshot()  # nothing closer to the peak was caught
+        else:
+            snapshot = self.sampler.snapshot
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+        return self._report(duration, current, peak, snapshot)
+
+    def _report(self, duration, current, peak, snapshot):
+        stacks = self.sampler.stacks
+        own, total, threads = collections.Counter(), collections.Counter(), collections.Counter()
+        for stack, count in stacks.items():
+            threads[stack[0]] += count
+            own[stack[-1]] += count
+            for label in set(stack[1:]):  # recursion counts once per sample
+                total[label] += count
+
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        allocations = snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+        query = [(key, value) for key, value in parse_qsl(self.scope.get("query_string", b"").decode("latin-1"))
+                 if key != QUERY_PARAMETER]  # never store the token
+
+        return {
+            "id": self.profile_id,
+            "method": self.scope["method"],
+            "path": self.scope["path"],
+            "query": urlencode(query),
+            "status": self.status,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self.started_at)),
+            "duration_seconds": duration,
+            "sampler": {"interval_seconds": INTERVAL, "samples": self.sampler.samples},
+            "threads": dict(threads.most_common()),
+            "functions": [  # hottest first: own samples (innermost frame), then total
+                {
+                    "function": label,
+                    "own_samples": own[label],
+                    "total_samples": count,
+                    "own_seconds": own[label] * INTERVAL,
+                    "total_seconds": count * INTERVAL,
+                }
+                for label, count in sorted(total.items(), key=lambda item: (own[item[0]], item[1]), reverse=True)[:TOP_FUNCTIONS]
+            ],
+            "stacks": {";".join(stack): count for stack, count in stacks.most_common()},
+            "memory": {
+                "peak_bytes": peak,
+                "peak_above_start_bytes": peak - self.baseline_bytes,
+                "retained_bytes": current - self.baseline_bytes,
+                "top_allocations": [
+                    {"location": str(stat.traceback), "bytes": stat.size, "blocks": stat.count}
+                    for stat in allocations
+                ],
+            },
+        }
+
+
+def profile_path(profile_id):
+    return os.path.join(PROFILE_DIR, f"{profile_id}.json")
+
+
+def _save(report):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(profile_path(report["id"]), "w") as f:
+        json.dump(report, f)
+
+    reports = sorted(
+        (entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith(".json")),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in reports[:max(len(reports) - MAX_PROFILES, 0)]:
+        os.remove(entry.path)
+
+
+def load_profile(profile_id):
+    """Saved report of `profile_id`, or None for an unknown (or malformed) ID."""
+    try:
+        uuid.UUID(hex=profile_id)  # also keeps the ID from escaping PROFILE_DIR
+    except ValueError:
+        return None
+    try:
+        with open(profile_path(profile_id)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def folded(report):
+    """Stacks in the folded format of flamegraph.pl and speedscope: "thread;outer;...;inner count" per line."""
+    return "".join(f"{stack} {count}\n" for stack, count in report["stacks"].items())
+
+
+def _with_profile_id(send, profile_id, session=None):
+    async def tagged_send(message):
+        if message["type"] == "http.response.start":
+            message = {**message, "headers": list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]}
+            if session is not None:
+                session.status = message["status"]
+        await send(message)
+    return tagged_send
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling the requests flagged with the profiling token."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        # Downloads carry the token too, but are never profiled themselves
+        if scope["type"] != "http" or not _requested(scope) or scope["path"].startswith("/profiles/"):
+            await self.app(scope, receive, send)
+            return
+
+        if not _session_lock.acquire(blocking=False):
+            await self.app(scope, receive, _with_profile_id(send, "busy"))
+            return
+
+        try:
+            session = _Session(uuid.uuid4().hex, scope)
+            session.start()
+            flag = _active.set(True)
+            try:
+                await self.app(scope, receive, _with_profile_id(send, session.profile_id, session))
+            finally:
+                _active.reset(flag)
+                report = session.stop()
+                await run_in_threadpool(_save, report)
+        finally:
+            _session_lock.release()
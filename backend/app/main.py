@@ -1,11 +1,36 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from typing import Literal, Optional
+from fastapi import FastAPI, Header, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from app.Acoustic_Signals.api.endpoints import acoustic_router
-from app.MicroBiome.api.endpoint import microbiome_rouuter
-from app.Market.api.endpoints import market_router
-from app.EEG.api.endpoint import EEG_Router
-from app.ECG.api.router import router as ECG_Router
-app = FastAPI(title="Biomedical Signal Viewer API")
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from app.core import executor, metrics, profiling
+from app.core.models import model_registry
+
+# Routers only register their models here; the timings show up in GET /ready
+with model_registry.timed_import("app.Acoustic_Signals.api.endpoints"):
+    from app.Acoustic_Signals.api.endpoints import acoustic_router
+with model_registry.timed_import("app.MicroBiome.api.endpoint"):
+    from app.MicroBiome.api.endpoint import microbiome_rouuter
+with model_registry.timed_import("app.Market.api.endpoints"):
+    from app.Market.api.endpoints import market_router
+with model_registry.timed_import("app.EEG.api.endpoint"):
+    from app.EEG.api.endpoint import EEG_Router
+with model_registry.timed_import("app.ECG.api.router"):
+    from app.ECG.api.router import router as ECG_Router
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Models load in the background: the worker serves (and answers /ready) right away,
+    # and a request that needs a model still loading waits for that one model only
+    model_registry.start_warm_up(executor.api_models())
+    # Worker processes of the offloaded endpoints start now and load their own models
+    executor.start()
+    yield
+    executor.shutdown()
+
+
+app = FastAPI(title="Biomedical Signal Viewer API", lifespan=lifespan)
 
 # --- CHANGE 1: Add specific IP addresses ---
 origins = [
@@ -26,6 +51,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if metrics.ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+if profiling.ENABLED:
+    app.add_middleware(profiling.ProfilingMiddleware)
+
 app.include_router(acoustic_router)
 app.include_router(microbiome_rouuter)
 app.include_router(market_router)
@@ -35,4 +66,42 @@ app.include_router(ECG_Router)
 def health_check():
     return {"status": "Biomedical API is running"}
 
+
+@app.get("/ready")
+def readiness():
+    # 503 until every model has loaded (or failed), in this process and in the workers;
+    # per-model state, worker counts and startup timings either way
+    report = model_registry.status()
+    report["ready"] = report["ready"] and executor.ready()
+    report["executor"] = executor.status_report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    # Prometheus text format; METRICS_ENABLED=0 switches collection and this endpoint off
+    if not metrics.ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/profiles/{profile_id}", include_in_schema=False)
+def request_profile(
+    profile_id: str,
+    format: Literal["json", "folded"] = "json",
+    x_profile: Optional[str] = Header(None),
+    profile: Optional[str] = Query(None),
+):
+    # Same token as the profiled request; without PROFILING_TOKEN the endpoint does not exist
+    if not profiling.ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not profiling.authorized(x_profile or profile):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+    report = profiling.load_profile(profile_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Unknown profile")
+    if format == "folded":
+        return PlainTextResponse(profiling.folded(report))
+    return report
+
 ##################################
\ No newline at end of file
@@ -0,0 +1,84 @@
+"""
+Per-clip feature cost of the submarine detector: the original per-feature
+librosa calls (four STFTs, a fresh mel filterbank per call) against the shared
+ClipSpectrum (one STFT, cached mel/DCT matrices).
+
+Also reports the largest deviation between the two feature sets so the
+tolerance stays visible.
+
+Run from the backend folder:
+    python -m benchmarks.acoustic_features --repeat 20
+"""
+import argparse
+import glob
+import os
+import time
+
+import librosa
+import numpy as np
+
+from app.Acoustic_Signals.services.audio_features import ClipSpectrum, decode_audio
+
+TEST_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "Acoustic_Signals", "test")
+SR = 16000
+MAX_LEN = SR * 4
+
+
+def _fit(y):
+    return np.pad(y, (0, MAX_LEN - len(y))) if len(y) < MAX_LEN else y[:MAX_LEN]
+
+
+def legacy_features(y, sr):
+    mfcc = np.mean(librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13).T, axis=0)
+    centroid = np.mean(librosa.feature.spectral_centroid(y=y, sr=sr).T, axis=0)
+    zcr = np.mean(librosa.feature.zero_crossing_rate(y).T, axis=0)
+    rolloff = np.mean(librosa.feature.spectral_rolloff(y=y, sr=sr).T, axis=0)
+    spec = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=128)
+    spec_db = librosa.power_to_db(spec, ref=np.max)
+    spec_db = (spec_db - spec_db.min()) / (spec_db.max() - spec_db.min() + 1e-6)
+    return np.hstack([mfcc, centroid, zcr, rolloff]), spec_db
+
+
+def shared_features(y, sr):
+    spectrum = ClipSpectrum(y, sr)
+    ml = np.hstack([
+        np.mean(spectrum.mfcc(), axis=1),
+        np.mean(spectrum.spectral_centroid()),
+        np.mean(spectrum.zero_crossing_rate()),
+        np.mean(spectrum.spectral_rolloff()),
+    ])
+    return ml, spectrum.normalized_mel_db()
+
+
+def _bench(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        out = fn()
+    return (time.perf_counter() - start) * 1000 / repeat, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'clip':<40} {'legacy ms':>10} {'shared ms':>10} {'speedup':>8} {'feat rel err':>13} {'mel abs err':>12}")
+    for path in sorted(glob.glob(os.path.join(TEST_DIR, "*.wav"))):
+        legacy_ms, (legacy_ml, legacy_mel) = _bench(
+            lambda: legacy_features(_fit(librosa.load(path, sr=SR)[0]), SR), args.repeat
+        )
+        shared_ms, (shared_ml, shared_mel) = _bench(
+            lambda: shared_features(_fit(decode_audio(path, target_sr=SR)[0]), SR), args.repeat
+        )
+        # Same decoded clip through both feature paths isolates the feature error from resampling
+        y = _fit(librosa.load(path, sr=SR)[0])
+        same_legacy_ml, same_legacy_mel = legacy_features(y, SR)
+        same_shared_ml, same_shared_mel = shared_features(y, SR)
+        rel_err = np.max(np.abs(same_shared_ml - same_legacy_ml) / (np.abs(same_legacy_ml) + 1e-6))
+        mel_err = np.max(np.abs(same_shared_mel - same_legacy_mel))
+        print(f"{os.path.basename(path)[:40]:<40} {legacy_ms:>10.1f} {shared_ms:>10.1f} "
+              f"{legacy_ms / shared_ms:>7.1f}x {rel_err:>13.2e} {mel_err:>12.2e}")
+
+
+if __name__ == "__main__":
+    main()
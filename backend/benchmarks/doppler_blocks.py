@@ -0,0 +1,81 @@
+"""
+Regression check for the streaming pass-by detector: the events found in a
+recording must not depend on how the audio is cut into blocks. One seeded
+multi-pass recording goes through extract_events at several block sizes
+(from much shorter to much longer than the detector's history ring) and
+through PassByDetector in uneven, PCM-message-sized pieces as /ws/doppler
+receives them; every run must report the same events.
+
+Run from the backend folder:
+    python -m benchmarks.doppler_blocks
+    python -m benchmarks.doppler_blocks --seconds 300 --blocks 1 7 60 400
+"""
+import argparse
+import io
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import soundfile as sf
+
+from benchmarks import generators
+
+
+def _recording(rng, seconds):
+    # A pass-by every ~11 s at varied speeds and engine tones, plus one close pair
+    times = list(np.arange(6.0, seconds - 4.0, 11.0)) + [seconds / 2 + 2.5]
+    passes = [(time, rng.uniform(10.0, 35.0), rng.uniform(200.0, 800.0)) for time in sorted(times)]
+    return generators.wav_recording(rng, seconds, passes), passes
+
+
+def _events_by_block(content, block_seconds):
+    from app.Acoustic_Signals.services.extract_coef import extract_events
+
+    upload = SimpleNamespace(filename="recording.wav", file=io.BytesIO(content))
+    return [event.model_dump() for event in extract_events(upload, block_seconds=block_seconds).events]
+
+
+def _events_by_message(content, rng):
+    from app.Acoustic_Signals.services.doppler_stream import PassByDetector
+
+    audio, sr = sf.read(io.BytesIO(content), dtype="float32")
+    detector = PassByDetector(sr)
+    events, start = [], 0
+    while start < len(audio):
+        stop = start + int(rng.integers(1, 40 * sr))  # up to 40 s per message
+        events.extend(detector.push(audio[start:stop]))
+        start = stop
+    events.extend(detector.flush())
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--blocks", type=float, nargs="+", default=[0.5, 5.0, 10.0, 60.0, 200.0],
+                        help="block_seconds values to compare")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    content, passes = _recording(rng, args.seconds)
+    print(f"{len(passes)} pass-bys at " + ", ".join(f"{time:.1f}s" for time, _, _ in passes))
+
+    runs = {f"block_seconds={block}": _events_by_block(content, block) for block in args.blocks}
+    runs["uneven messages"] = _events_by_message(content, rng)
+
+    reference_name, reference = next(iter(runs.items()))
+    print(f"{reference_name}: " + ", ".join(f"{event['time']:.2f}s" for event in reference))
+    mismatches = 0
+    for name, events in runs.items():
+        if events != reference:
+            mismatches += 1
+            print(f"❌ {name}: " + ", ".join(f"{event['time']:.2f}s" for event in events))
+    if mismatches:
+        print(f"{mismatches} run(s) differ from {reference_name}")
+        sys.exit(1)
+    print(f"✅ {len(runs)} runs, identical events")
+
+
+if __name__ == "__main__":
+    main()
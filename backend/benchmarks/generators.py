@@ -0,0 +1,152 @@
+"""
+Seeded synthetic inputs for the benchmarks, shaped like the files the API
+receives: ECG CSVs, EEG frames in the montage the models were trained on,
+Doppler pass-by wav clips, yfinance-style OHLC CSVs and microbiome taxa
+tables.
+
+Every generator takes a numpy Generator, so one seed reproduces a whole run.
+Nothing here touches the network or a GPU.
+"""
+import io
+
+import numpy as np
+import pandas as pd
+import soundfile as sf
+
+ECG_FS = 360
+EEG_FS = 200
+AUDIO_SR = 22050
+SPEED_OF_SOUND = 343.0
+
+
+def _heartbeat(t, bpm=72.0):
+    """QRS spike plus T wave at a fixed heart rate, in mV."""
+    phase = (t * bpm / 60.0) % 1.0
+    qrs = np.exp(-((phase - 0.3) / 0.012) ** 2)
+    t_wave = 0.3 * np.exp(-((phase - 0.6) / 0.05) ** 2)
+    return qrs + t_wave
+
+
+def ecg_csv(rng, n_samples, leads=("MLII", "V5"), fs=ECG_FS):
+    """CSV bytes as /ecg/upload receives them: a time column plus one column per lead."""
+    t = np.arange(n_samples) / fs
+    beat = _heartbeat(t)
+    frame = {"time": t}
+    for gain, lead in zip(np.linspace(1.0, 0.6, len(leads)), leads):
+        wander = 0.05 * np.sin(2 * np.pi * 0.3 * t + rng.uniform(0, 2 * np.pi))
+        frame[lead] = gain * beat + wander + rng.normal(scale=0.02, size=n_samples)
+    return pd.DataFrame(frame).to_csv(index=False).encode("utf-8")
+
+
+def ecg_signal(rng, n_samples, fs=ECG_FS):
+    """One lead as a float array, e.g. the 200-sample window the classifiers see."""
+    t = np.arange(n_samples) / fs
+    return (_heartbeat(t) + rng.normal(scale=0.02, size=n_samples)).astype(np.float32)
+
+
+def eeg_frame(rng, n_samples, fs=EEG_FS):
+    """
+    DataFrame with the FEATS columns (19 scalp electrodes + EKG) in microvolts:
+    alpha rhythm and drifting background activity per electrode.
+    """
+    from app.EEG.services.dl_feature_logic import FEATS
+
+    t = np.arange(n_samples) / fs
+    frame = {}
+    for name in FEATS:
+        if name == "EKG":
+            frame[name] = 500 * _heartbeat(t) + rng.normal(scale=20, size=n_samples)
+            continue
+        alpha = 20 * np.sin(2 * np.pi * rng.uniform(8, 12) * t + rng.uniform(0, 2 * np.pi))
+        background = np.cumsum(rng.normal(size=n_samples))
+        background -= np.convolve(background, np.ones(fs) / fs, mode="same")  # keep it zero-mean
+        frame[name] = alpha + 5 * background + rng.normal(scale=5, size=n_samples)
+    return pd.DataFrame(frame)
+
+
+def _pass_by(t, sr, velocity, frequency, distance):
+    """Tone of a source closest to the microphone at t = 0, with the Doppler shift and 1/r loudness."""
+    x = velocity * t
+    r = np.sqrt(x ** 2 + distance ** 2)
+    f_instant = frequency * SPEED_OF_SOUND / (SPEED_OF_SOUND + velocity * x / r)
+    return np.sin(2 * np.pi * np.cumsum(f_instant) / sr) * distance / r
+
+
+def _wav(audio, sr):
+    buffer = io.BytesIO()
+    sf.write(buffer, np.clip(audio, -1, 1), sr, format="WAV", subtype="PCM_16")
+    return buffer.getvalue()
+
+
+def wav_clip(rng, seconds, sr=AUDIO_SR, velocity=25.0, frequency=400.0, distance=10.0):
+    """
+    16-bit wav bytes of a tone passing by at `velocity` m/s, closest at mid
+    clip, with the Doppler shift and 1/r loudness, over background noise.
+    """
+    n = int(seconds * sr)
+    t = np.arange(n) / sr - seconds / 2
+    audio = 0.5 * _pass_by(t, sr, velocity, frequency, distance) + rng.normal(scale=0.02, size=n)
+    return _wav(audio, sr)
+
+
+def wav_recording(rng, seconds, passes, sr=AUDIO_SR, distance=10.0):
+    """
+    16-bit wav bytes of a long roadside recording: one wav_clip-style pass-by
+    per (time, velocity, frequency) in `passes`, closest at `time` seconds.
+    """
+    n = int(seconds * sr)
+    t = np.arange(n) / sr
+    audio = rng.normal(scale=0.02, size=n)
+    for time, velocity, frequency in passes:
+        audio += 0.5 * _pass_by(t - time, sr, velocity, frequency, distance)
+    return _wav(audio, sr)
+
+
+def ohlc_csv(rng, n_days, ticker="AAPL", start="1900-01-01"):
+    """
+    Business-day OHLCV history as yfinance exports it (the Price/Ticker/Date
+    header rows MarketAnalyzer skips), from a geometric random walk.
+    """
+    dates = pd.bdate_range(start, periods=n_days)
+    close = 100 * np.exp(np.cumsum(rng.normal(scale=0.015, size=n_days)))
+    open_ = close * np.exp(rng.normal(scale=0.005, size=n_days))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, size=n_days))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, size=n_days))
+    volume = rng.integers(1_000_000, 100_000_000, size=n_days)
+
+    frame = pd.DataFrame(
+        {"Close": close, "High": high, "Low": low, "Open": open_, "Volume": volume},
+        index=pd.Index(dates.strftime("%Y-%m-%d"), name="Price"),
+    )
+    body = frame.to_csv(header=False)
+    header = f"Price,Close,High,Low,Open,Volume\nTicker,{','.join([ticker] * 5)}\nDate,,,,,\n"
+    return (header + body).encode("utf-8")
+
+
+def taxa_table(rng, n_samples, n_taxa, density=0.05, participants=1, missing=0.001):
+    """
+    Stool samples x taxa relative abundances (each row sums to 100) with the
+    metadata columns of the IBDMDB exports. The protective and opportunistic
+    taxa the profiler reports are always present; `missing` of the entries are
+    NaN, as in real uploads.
+    """
+    from app.MicroBiome.services.profiling import BAD_BUGS, GOOD_BUGS
+
+    known = GOOD_BUGS + BAD_BUGS
+    taxa = known + [f"Taxon {i:05d}" for i in range(max(n_taxa - len(known), 0))]
+    present = rng.random((n_samples, len(taxa))) < density
+    present[:, :len(known)] |= rng.random((n_samples, len(known))) < 0.5
+    values = np.where(present, rng.gamma(0.5, size=present.shape), 0.0)
+    totals = values.sum(axis=1, keepdims=True)
+    values = np.divide(values, totals, out=np.zeros_like(values), where=totals > 0) * 100
+    values[rng.random(values.shape) < missing] = np.nan
+
+    ids = np.arange(n_samples)
+    metadata = pd.DataFrame({
+        "External ID": [f"S{i:06d}" for i in ids],
+        "Participant ID": [f"P{i % participants:04d}" for i in ids],
+        "week_num": ids // participants,
+        "diagnosis": rng.choice(["CD", "UC", "nonIBD"], size=n_samples),
+        "fecalcal": np.where(rng.random(n_samples) < 0.2, np.nan, rng.gamma(2.0, 50.0, size=n_samples)),
+    })
+    return pd.concat([metadata, pd.DataFrame(values, columns=taxa)], axis=1)
@@ -0,0 +1,76 @@
+"""
+Regression check for POST /indicators/{id}/append validation: every invalid
+batch must get a 400 and leave the instrument exactly as it was, and a valid
+batch (including timezone-aware dates) must give the same moving average as
+pandas over the whole history.
+
+Run from the backend folder:
+    python -m benchmarks.indicator_append
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+
+from app.Market.schemas.schema import Bar
+from app.Market.services.indicators import append_bars, indicator_store, seed_instrument
+
+WINDOW = 20
+
+INVALID = {
+    "out of order": [Bar(date="2031-01-02", close=100), Bar(date="2031-01-01", close=101)],
+    "unparsable date": [Bar(date="2031-01-02", close=100), Bar(date="not a date", close=101)],
+    "zero close": [Bar(date="2031-01-02", close=0)],
+    "negative close": [Bar(date="2031-01-02", close=-5)],
+    "NaN close": [Bar(date="2031-01-02", close=float("nan"))],
+    "duplicate date": [Bar(date="2031-01-02", close=100), Bar(date="2031-01-02", close=101)],
+    "not after the seed": [Bar(date="2030-01-01", close=100)],
+    "timezone-aware, not after the seed": [Bar(date="2031-01-01T03:00:00+05:00", close=100)],
+}
+
+VALID = [
+    Bar(date="2031-01-02T00:00:00+00:00", close=130.0),
+    Bar(date="2031-01-03", close=131.5),
+    Bar(date="2031-01-06T09:30:00-05:00", close=129.0),
+]
+
+
+def _state(engine):
+    return engine.last_date, engine.last_close, list(engine.prices.values), list(engine.returns.values)
+
+
+def main():
+    close = pd.Series(100 + np.arange(60.0), index=pd.bdate_range(end="2031-01-01", periods=60))
+    instrument_id = seed_instrument(close, WINDOW)["instrument_id"]
+    engine = indicator_store.get(instrument_id)
+
+    failures = 0
+    for name, bars in INVALID.items():
+        before = _state(engine)
+        try:
+            append_bars(instrument_id, bars)
+            outcome = "accepted"
+        except HTTPException as error:
+            outcome = error.status_code
+        if outcome != 400 or _state(engine) != before:
+            failures += 1
+            print(f"❌ {name}: {outcome}, instrument {'unchanged' if _state(engine) == before else 'changed'}")
+
+    tail = append_bars(instrument_id, VALID)
+    dates = [pd.Timestamp(bar.date, tz="UTC") if pd.Timestamp(bar.date).tzinfo is None
+             else pd.Timestamp(bar.date).tz_convert("UTC") for bar in VALID]
+    dates = pd.DatetimeIndex(dates).tz_convert(None)
+    expected = pd.concat([close, pd.Series([bar.close for bar in VALID], index=dates)]).rolling(WINDOW).mean()
+    if not np.allclose(tail["MA_overlay"], expected.iloc[-len(VALID):].to_numpy()):
+        failures += 1
+        print(f"❌ valid batch: {tail['MA_overlay']} != {expected.iloc[-len(VALID):].tolist()}")
+
+    if failures:
+        print(f"{failures} case(s) failed")
+        sys.exit(1)
+    print(f"✅ {len(INVALID)} invalid batches rejected, valid batch matches pandas")
+
+
+if __name__ == "__main__":
+    main()
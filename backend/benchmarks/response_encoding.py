@@ -0,0 +1,90 @@
+"""
+Encode time and payload size of each response format for large signal
+payloads: a 12-lead ECG record, a long OHLC history and a Doppler signal.
+
+"json" is what the endpoints did before (response_model validation of
+Python float lists, then JSONResponse rendering); the binary formats encode
+the same payload through app.core.encoding.
+
+Run from the backend folder:
+    python -m benchmarks.response_encoding --samples 500000 --repeat 5
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.core.encoding import to_arrow, to_base64_json, to_jsonable, to_msgpack
+from app.ECG.schemas.schema import ECGResponse
+from app.Market.schemas.schema import AnalysisOutput
+from app.Acoustic_Signals.schemas.schema import GeneratedSignal
+
+
+def ecg_payload(rng, n):
+    leads = ["i", "ii", "iii", "avr", "avl", "avf", "v1", "v2", "v3", "v4", "v5", "v6"]
+    return ECGResponse, {
+        "time": np.arange(n) / 360,
+        "channels": leads,
+        "signals": {lead: rng.normal(size=n).cumsum() * 1e-3 for lead in leads},
+        "num_samples": n,
+    }
+
+
+def market_payload(rng, n):
+    close = 100 * np.exp(rng.normal(scale=0.01, size=n).cumsum())
+    ma = np.convolve(close, np.ones(20) / 20)[:n]
+    ma[:19] = np.nan
+    return AnalysisOutput, {
+        "time_axis": [f"d{i}" for i in range(n)],
+        "open": close * 0.999, "high": close * 1.01, "low": close * 0.99, "close": close,
+        "MA_overlay": ma,
+        "Bollinger_Bands": {"Moving average": ma, "upper": ma * 1.02, "lower": ma * 0.98},
+        "volatility": ma / 100,
+        "prediction_dates": [f"p{i}" for i in range(30)],
+        "prediction_values": close[-30:],
+    }
+
+
+def doppler_payload(rng, n):
+    signal = (np.sin(np.arange(n) * 0.05) * 32767).astype(np.int16)
+    return GeneratedSignal, {"Signal": signal, "Time": np.linspace(0, n / 4000, n)}
+
+
+def legacy_json(model, payload):
+    # What FastAPI does with a response_model: validate, dump in JSON mode, render like JSONResponse
+    content = model.model_validate(to_jsonable(payload)).model_dump(mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+FORMATS = {
+    "json": legacy_json,
+    "base64": lambda model, payload: to_base64_json(payload),
+    "msgpack": lambda model, payload: to_msgpack(payload),
+    "arrow": lambda model, payload: to_arrow(payload),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=200_000, help="Samples per array")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'payload':<8} {'format':<8} {'encode ms':>10} {'size MB':>9} {'vs json':>8}")
+    for name, build in (("ecg", ecg_payload), ("market", market_payload), ("doppler", doppler_payload)):
+        model, payload = build(rng, args.samples)
+        json_ms = None
+        for fmt, encode in FORMATS.items():
+            encode(model, payload)  # warm-up: pyarrow loads its IPC modules on first use
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                body = encode(model, payload)
+            ms = (time.perf_counter() - start) * 1000 / args.repeat
+            json_ms = json_ms or ms
+            print(f"{name:<8} {fmt:<8} {ms:>10.1f} {len(body) / 1e6:>9.2f} {json_ms / ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Cold vs warm latency of the submarine detector.
+
+Cold = what every request used to pay: build UnifiedSubmarineDetector (ONNX
+session + joblib.load of the forest) and then predict.
+Warm = the shared, pre-warmed detector returned by get_detector().
+
+Run from the backend folder:
+    python -m benchmarks.submarine_latency --repeat 10
+"""
+import argparse
+import glob
+import os
+import statistics
+import time
+
+from app.Acoustic_Signals.services.get_prediction import UnifiedSubmarineDetector, get_detector
+
+TEST_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "Acoustic_Signals", "test")
+
+
+def _time_ms(fn):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--clip", default=None, help="wav file to score (defaults to every clip in the test folder)")
+    args = parser.parse_args()
+
+    clips = [args.clip] if args.clip else sorted(glob.glob(os.path.join(TEST_DIR, "*.wav")))
+
+    cold, warm = [], []
+    detector = get_detector()
+    for _ in range(args.repeat):
+        for clip in clips:
+            cold.append(_time_ms(lambda: UnifiedSubmarineDetector().predict(clip)))
+            warm.append(_time_ms(lambda: detector.predict(clip)))
+
+    print(f"{'mode':<6} {'n':>4} {'median ms':>10} {'p95 ms':>10}")
+    for name, samples in (("cold", cold), ("warm", warm)):
+        p95 = sorted(samples)[int(0.95 * (len(samples) - 1))]
+        print(f"{name:<6} {len(samples):>4} {statistics.median(samples):>10.1f} {p95:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
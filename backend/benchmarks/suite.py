@@ -0,0 +1,265 @@
+"""
+Micro-benchmarks of the hot paths of every sector, over several input sizes,
+on seeded synthetic inputs (benchmarks/generators.py).
+
+Each case/size gets one untimed warm-up call, then `--repeat` timed calls;
+building the input (file buffers, DataFrame copies) is not timed. Results go
+to a JSON file (by default benchmarks/results/<commit>.json) so two commits
+can be compared. Runs offline and on CPU only; model files are not needed.
+
+Stage metrics are switched off (METRICS_ENABLED=0) unless already set, so
+the numbers are those of the functions themselves.
+
+Run from the backend folder:
+    python -m benchmarks.suite                       # every case, every size
+    python -m benchmarks.suite --quick --filter eeg  # smallest size of the matching cases
+    python -m benchmarks.suite --compare results/OLD.json results/NEW.json --threshold 0.15
+"""
+import os
+
+os.environ.setdefault("METRICS_ENABLED", "0")
+
+import argparse
+import asyncio
+import io
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import zlib
+from types import SimpleNamespace
+
+import numpy as np
+
+from benchmarks import generators
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Upload:
+    """Just enough of fastapi.UploadFile for the services: filename, file and async read()."""
+
+    def __init__(self, filename, content):
+        self.filename = filename
+        self.file = io.BytesIO(content)
+
+    async def read(self):
+        return self.file.read()
+
+
+# ---------------- CASES ----------------
+# Every case maps a size to a `make` function; each make() call prepares fresh
+# inputs and returns the zero-argument call that is timed.
+
+def parse_ecg_case(rng, n_samples):
+    from app.ECG.services.service import parse_ecg
+
+    content = generators.ecg_csv(rng, n_samples)
+    loop = asyncio.new_event_loop()
+
+    def make():
+        upload = Upload("ecg.csv", content)
+        return lambda: loop.run_until_complete(parse_ecg(upload))
+    return make
+
+
+def extract_features_case(rng, n_samples):
+    from app.ECG.services.service import extract_features
+
+    signal = generators.ecg_signal(rng, n_samples)
+    return lambda: lambda: extract_features(signal)
+
+
+def feature_extractor_case(rng, n_samples):
+    from app.EEG.services.extract_info import FeatureExtractor
+
+    frame = generators.eeg_frame(rng, n_samples)
+    extractor = FeatureExtractor()
+
+    def make():
+        df = frame.copy()
+        return lambda: extractor.extract(df)
+    return make
+
+
+def ml_features_case(rng, n_samples):
+    from app.EEG.services.ml_feature_logic import preprocess_uploaded_eeg
+
+    frame = generators.eeg_frame(rng, n_samples)
+    return lambda: lambda: preprocess_uploaded_eeg(frame)
+
+
+def dl_features_case(rng, n_samples):
+    from app.EEG.services.dl_feature_logic import preprocess_eeg_for_dl
+
+    frame = generators.eeg_frame(rng, n_samples)
+    return lambda: lambda: preprocess_eeg_for_dl(frame)
+
+
+def extract_coef_case(rng, seconds):
+    from app.Acoustic_Signals.services.extract_coef import extract_coef
+
+    content = generators.wav_clip(rng, seconds)
+
+    def make():
+        upload = SimpleNamespace(filename="pass_by.wav", file=io.BytesIO(content))
+        return lambda: extract_coef(upload)
+    return make
+
+
+def generate_signal_case(rng, seconds):
+    from app.Acoustic_Signals.services.generate_signal import generate_signal
+
+    # A new velocity per call, or every call after the first would be a SignalCache hit
+    velocities = iter(np.arange(10.0, 1e6, 0.5))
+    return lambda: lambda: generate_signal(next(velocities), 400, seconds, 44100)
+
+
+def market_indicators_case(rng, n_days):
+    from app.Market.services.analyzer import MarketAnalyzer
+
+    analyzer = MarketAnalyzer()
+    close = analyzer._clean(Upload("ohlc.csv", generators.ohlc_csv(rng, n_days)))["Close"]
+    return lambda: lambda: analyzer.get_indicators(close, 20)
+
+
+def profile_case(rng, size):
+    from app.MicroBiome.services.profiling import PatientProfile
+
+    n_samples, n_taxa = size
+    table = generators.taxa_table(rng, n_samples, n_taxa)
+    profiler = PatientProfile()
+
+    def make():
+        df = table.copy()  # profile() fills the metadata columns in place
+        return lambda: profiler.profile(df)
+    return make
+
+
+CASES = {
+    "ecg.parse_ecg": (parse_ecg_case, [10_000, 100_000, 500_000]),
+    "ecg.extract_features": (extract_features_case, [200, 3_600, 36_000]),
+    "eeg.FeatureExtractor.extract": (feature_extractor_case, [2_000, 10_000, 50_000]),
+    "eeg.preprocess_uploaded_eeg": (ml_features_case, [2_000, 10_000, 50_000]),
+    "eeg.preprocess_eeg_for_dl": (dl_features_case, [2_000, 10_000, 50_000]),
+    "acoustic.extract_coef": (extract_coef_case, [4, 30, 120]),
+    "acoustic.generate_signal": (generate_signal_case, [1, 10, 60]),
+    "market.MarketAnalyzer.get_indicators": (market_indicators_case, [1_000, 10_000, 50_000]),
+    "microbiome.PatientProfile.profile": (profile_case, [(50, 500), (200, 2_000), (1_000, 10_000)]),
+}
+
+
+def _size_label(size):
+    return "x".join(map(str, size)) if isinstance(size, tuple) else str(size)
+
+
+def _time_ms(make, repeat):
+    make()()  # warm-up: first-use imports, lazy models, allocator
+    timings = []
+    for _ in range(repeat):
+        call = make()
+        start = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _meta(args):
+    return {
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeat": args.repeat,
+        "seed": args.seed,
+    }
+
+
+def run(args):
+    results = {}
+    print(f"{'case':<48} {'size':>12} {'median ms':>10} {'min ms':>10} {'max ms':>10}")
+    for name, (setup, sizes) in CASES.items():
+        if args.filter and args.filter not in name:
+            continue
+        for size in sizes[:1] if args.quick else sizes:
+            key = f"{name}[{_size_label(size)}]"
+            # Seeded per case and size, so a filtered run sees the same inputs as a full one
+            rng = np.random.default_rng([args.seed, zlib.crc32(key.encode())])
+            timings = _time_ms(setup(rng, size), args.repeat)
+            results[key] = {
+                "median_ms": statistics.median(timings),
+                "min_ms": min(timings),
+                "max_ms": max(timings),
+            }
+            print(f"{name:<48} {_size_label(size):>12} {results[key]['median_ms']:>10.2f} "
+                  f"{results[key]['min_ms']:>10.2f} {results[key]['max_ms']:>10.2f}")
+    return {"meta": _meta(args), "results": results}
+
+
+def compare(old_path, new_path, threshold):
+    """Prints new/old median ratios; returns the number of cases slower by more than `threshold`."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    print(f"{old['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    print(f"{'case':<62} {'old ms':>10} {'new ms':>10} {'ratio':>7}")
+    regressions = 0
+    for key in sorted(set(old["results"]) & set(new["results"])):
+        old_ms = old["results"][key]["median_ms"]
+        new_ms = new["results"][key]["median_ms"]
+        ratio = new_ms / old_ms if old_ms else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  slower"
+            regressions += 1
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print(f"{key:<62} {old_ms:>10.2f} {new_ms:>10.2f} {ratio:>6.2f}x{flag}")
+    for key in sorted(set(old["results"]) ^ set(new["results"])):
+        print(f"{key:<62} only in {'old' if key in old['results'] else 'new'}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--quick", action="store_true", help="smallest size of each case only")
+    parser.add_argument("--filter", default=None, help="only cases whose name contains this text")
+    parser.add_argument("--out", default=None, help="results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two results files instead of running")
+    parser.add_argument("--threshold", type=float, default=0.15, help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        regressions = compare(*args.compare, args.threshold)
+        print(f"{regressions} regression(s) above {args.threshold:.0%}")
+        sys.exit(1 if regressions else 0)
+
+    report = run(args)
+    out = args.out
+    if out is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out = os.path.join(RESULTS_DIR, f"{report['meta']['commit'] or 'results'}.json")
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()